@@ -0,0 +1,210 @@
+"""
+Ocena wielu pozycji naraz w NumPy - do analizy zapisanych partii.
+
+Pozycje pakowane są jako tablica (N, 12) bitboardów uint64 (kolor * 6 + typ figury). Materiał i
+tablice figura-pole liczone są na rozpakowanych płaszczyznach bitów, a ruchliwość figur
+przesunięciami bitboardów (wypełnianie promieni z blokadami) - wszystko w jednym wywołaniu dla
+całej tablicy. Materiał z tablicami figura-pole daje dokładnie ocenę engine.evaluate.
+
+Użycie:
+    python analysis.py games.pgn             # ocena wszystkich pozycji z pliku, pozycje na sekundę
+    python analysis.py --bench 100000        # porównanie z oceną pozycja po pozycji
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from engine import PIECE_VALUES, PIECE_SQUARE, PIECE_SQUARE_ENDGAME, evaluate
+from pgn import read_games
+from position import Position, WHITE, BLACK, KNIGHT, BISHOP, ROOK, QUEEN, BB_FILE_A, BB_FILE_H, BB_ALL
+
+MOBILITY_WEIGHTS = (0, 4, 5, 2, 1, 0)  # Punkty za każde pole osiągalne dla figury danego typu
+CHUNK = 16384  # Tyle pozycji rozpakowywanych jest naraz (12 * 64 bajty na pozycję)
+
+_NOT_A = np.uint64(BB_ALL & ~BB_FILE_A)
+_NOT_H = np.uint64(BB_ALL & ~BB_FILE_H)
+_NOT_AB = np.uint64(BB_ALL & ~BB_FILE_A & ~(BB_FILE_A << 1))
+_NOT_GH = np.uint64(BB_ALL & ~BB_FILE_H & ~(BB_FILE_H >> 1))
+_ALL = np.uint64(BB_ALL)
+# (przesunięcie, maska pól, na które można trafić bez przejścia przez krawędź)
+ROOK_SHIFTS = ((8, _ALL), (-8, _ALL), (1, _NOT_A), (-1, _NOT_H))
+BISHOP_SHIFTS = ((9, _NOT_A), (7, _NOT_H), (-7, _NOT_A), (-9, _NOT_H))
+KNIGHT_SHIFTS = ((17, _NOT_A), (15, _NOT_H), (10, _NOT_AB), (6, _NOT_GH),
+                 (-6, _NOT_AB), (-10, _NOT_GH), (-15, _NOT_A), (-17, _NOT_H))
+
+# Tablice figura-pole bez wartości materiału: [etap partii, płaszczyzna, pole]
+_PST = np.array([[[tables[color][piece_type][sq] - PIECE_VALUES[piece_type] for sq in range(64)]
+                  for color in (WHITE, BLACK) for piece_type in range(6)]
+                 for tables in (PIECE_SQUARE, PIECE_SQUARE_ENDGAME)], dtype=np.int32)
+_SIGN = np.array([1] * 6 + [-1] * 6, dtype=np.int32)
+# Kolumny (środkowa gra, końcówka) dla mnożenia macierzy; float32 liczy sumy tej wielkości dokładnie
+_PST_COLUMNS = (_PST * _SIGN[:, None]).reshape(2, -1).T.astype(np.float32)
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:  # NumPy < 2.0
+    def _popcount(bitboards):
+        bytes_view = np.ascontiguousarray(bitboards).view(np.uint8).reshape(bitboards.shape + (8,))
+        return np.unpackbits(bytes_view, axis=-1).sum(axis=-1)
+
+
+def pack_positions(positions):
+    """
+    Tablica (N, 12) bitboardów dla listy pozycji.
+    """
+    packed = np.zeros((len(positions), 12), dtype=np.uint64)
+    for index, position in enumerate(positions):
+        packed[index] = position.pieces[WHITE] + position.pieces[BLACK]
+    return packed
+
+
+def pack_game(moves, initial_position=None):
+    """
+    Pozycje partii: początkowa i po każdym ruchu (len(moves) + 1 wierszy).
+    """
+    position = initial_position.copy() if initial_position is not None else Position.starting()
+    packed = np.zeros((len(moves) + 1, 12), dtype=np.uint64)
+    packed[0] = position.pieces[WHITE] + position.pieces[BLACK]
+    for index, move in enumerate(moves, 1):
+        position.make_move(move)
+        packed[index] = position.pieces[WHITE] + position.pieces[BLACK]
+    return packed
+
+
+def _shift(bitboards, shift, mask):
+    if shift > 0:
+        return (bitboards << np.uint64(shift)) & mask
+    return (bitboards >> np.uint64(-shift)) & mask
+
+
+def _slider_mobility(sliders, empty, not_own, shifts):
+    """
+    Pola osiągalne dla wszystkich figur z sliders. Promienie w jednym kierunku od różnych figur
+    nie nachodzą na siebie (tylny zatrzymuje się na przednim), więc suma po kierunkach jest dokładna.
+    """
+    total = np.zeros(sliders.shape, dtype=np.int32)
+    for shift, mask in shifts:
+        ray = sliders
+        attacks = np.zeros_like(sliders)
+        for _ in range(7):
+            ray = _shift(ray, shift, mask)
+            attacks |= ray
+            ray = ray & empty
+        total += _popcount(attacks & not_own)
+    return total
+
+
+def mobility(packed):
+    """
+    Ruchliwość skoczków, gońców, wież i hetmanów (ważona MOBILITY_WEIGHTS), białe minus czarne.
+    """
+    white = np.bitwise_or.reduce(packed[:, :6], axis=1)
+    black = np.bitwise_or.reduce(packed[:, 6:], axis=1)
+    empty = ~(white | black)
+    score = np.zeros(len(packed), dtype=np.int32)
+    for offset, own, sign in ((0, white, 1), (6, black, -1)):
+        not_own = ~own
+        knights = packed[:, offset + KNIGHT]
+        knight_moves = np.zeros(len(packed), dtype=np.int32)
+        for shift, mask in KNIGHT_SHIFTS:  # Każde przesunięcie jest różnowartościowe - skoki się nie dublują
+            knight_moves += _popcount(_shift(knights, shift, mask) & not_own)
+        score += sign * MOBILITY_WEIGHTS[KNIGHT] * knight_moves
+        for piece_type, shifts in ((BISHOP, BISHOP_SHIFTS), (ROOK, ROOK_SHIFTS), (QUEEN, ROOK_SHIFTS + BISHOP_SHIFTS)):
+            moves = _slider_mobility(packed[:, offset + piece_type], empty, not_own, shifts)
+            score += sign * MOBILITY_WEIGHTS[piece_type] * moves
+    return score
+
+
+def features(packed):
+    """
+    Składowe oceny z punktu widzenia białych: słownik material, piece_square, mobility (tablice int32).
+    """
+    counts = _popcount(packed).astype(np.int32)
+    values = np.array(PIECE_VALUES * 2, dtype=np.int32) * _SIGN
+    material = counts @ values
+    queens = packed[:, QUEEN] | packed[:, 6 + QUEEN]
+    heavy = queens | packed[:, ROOK] | packed[:, 6 + ROOK]
+    endgame = (queens == 0) | (_popcount(heavy) <= 2)  # Ten sam warunek co w engine.evaluate
+
+    piece_square = np.zeros(len(packed), dtype=np.int32)
+    little_endian = packed.astype('<u8')
+    for start in range(0, len(packed), CHUNK):
+        chunk = little_endian[start:start + CHUNK]
+        planes = np.unpackbits(chunk.view(np.uint8).reshape(len(chunk), 12, 8), axis=-1, bitorder='little')
+        scores = planes.reshape(len(chunk), 12 * 64).astype(np.float32) @ _PST_COLUMNS
+        piece_square[start:start + CHUNK] = np.where(endgame[start:start + CHUNK], scores[:, 1], scores[:, 0])
+    return {'material': material, 'piece_square': piece_square, 'mobility': mobility(packed)}
+
+
+def evaluate_batch(packed, use_mobility=True):
+    """
+    Ocena każdej pozycji (w centypionach, z punktu widzenia białych) jednym wywołaniem.
+    """
+    parts = features(packed)
+    scores = parts['material'] + parts['piece_square']
+    if use_mobility:
+        scores += parts['mobility']
+    return scores
+
+
+def _random_positions(count, seed=1):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.starting()
+        for _ in range(rng.randint(0, 80)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def run_benchmark(count):
+    positions = _random_positions(count)
+    start = time.perf_counter()
+    expected = [evaluate(position) if position.side_to_move == WHITE else -evaluate(position) for position in positions]
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    packed = pack_positions(positions)
+    packing = time.perf_counter() - start
+    start = time.perf_counter()
+    parts = features(packed)
+    batch = time.perf_counter() - start
+    mismatches = int(np.count_nonzero(parts['material'] + parts['piece_square'] != np.array(expected)))
+    print(f"{count} positions  one by one {count / single:10.0f} pos/s  packing {count / packing:10.0f} pos/s  "
+          f"batch {count / batch:10.0f} pos/s  mismatches {mismatches}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ocena pozycji z partii w NumPy")
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--bench', type=int, metavar='N', help="porównaj z engine.evaluate na N losowych pozycjach")
+    args = parser.parse_args(argv)
+    if args.bench:
+        run_benchmark(args.bench)
+        return 0
+    if not args.path:
+        parser.error("podaj plik PGN albo --bench")
+
+    positions = games = 0
+    start = time.perf_counter()
+    with open(args.path, encoding='utf-8', errors='replace') as stream:
+        for game in read_games(stream):
+            try:
+                scores = evaluate_batch(pack_game(game.moves(), game.initial_position()))
+            except ValueError:
+                continue
+            games += 1
+            positions += len(scores)
+    elapsed = time.perf_counter() - start
+    print(f"{games} games, {positions} positions in {elapsed:.2f}s ({positions / elapsed if elapsed else 0:.0f} pos/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Indeks pozycji dla archiwów partii PGN: "które partie doszły do tej pozycji".
+
+Indeks to posortowane rekordy (klucz Zobrista, numer partii, półruch) w jednym pliku mapowanym
+w pamięć; wyszukanie pozycji to wyszukiwanie binarne po kolumnie kluczy (kilka stron pamięci
+nawet przy dziesiątkach milionów pozycji). Plik PGN dzielony jest na fragmenty, każdy proces
+z puli zapisuje posortowany przebieg do pliku tymczasowego, a przebiegi są łączone blokami.
+
+Dla każdej partii indeks pamięta jej wynik i przesunięcie w pliku PGN, więc statystyki
+wyników liczone są bez czytania archiwum, a nagłówki partii - tylko dla wyświetlanych partii.
+
+Użycie:
+    python archive.py build games.pgn --output games.idx --workers 8
+    python archive.py query games.idx --fen "<FEN>"      # partie z tą pozycją i wyniki
+    python archive.py query games.idx --bench 10000      # czas wyszukania pozycji
+"""
+import argparse
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy as np
+
+from game import RESULTS
+from pgn import read_games, parse_san, _chunk_offsets, HEADER_RE, ESCAPE_RE
+from position import Position, ZOBRIST_SIDE
+
+MAGIC = b'CGIX'
+VERSION = 2  # Od wersji 2 rekordy o równym kluczu są uporządkowane po (partia, półruch)
+# Sygnatura, wersja, odcisk tablic Zobrista, liczba partii, liczba rekordów, długość ścieżki archiwum
+HEADER = struct.Struct('<4sHQQQH')
+MERGE_BLOCK = 1 << 20  # Rekordów z każdego przebiegu na jeden krok łączenia
+HEADER_CACHE = 4096  # Tyle nagłówków partii PositionIndex trzyma w pamięci
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(path_bytes, games, records):
+    """
+    Przesunięcia sekcji pliku: przesunięcia partii w PGN (u8), wyniki partii (u1), klucze (u8),
+    numery partii (u4), półruchy (u2); zwraca też rozmiar pliku.
+    """
+    game_offsets = _align(HEADER.size + path_bytes)
+    game_results = game_offsets + 8 * games
+    keys = _align(game_results + games)
+    game_ids = keys + 8 * records
+    plies = game_ids + 4 * records
+    return game_offsets, game_results, keys, game_ids, plies, plies + 2 * records
+
+
+def _column(path, dtype, offset, count, mode='r'):
+    if count == 0:  # Pustej sekcji nie da się zmapować
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(count,))
+
+
+def create_index_file(path, archive_path, game_offsets, game_results, records):
+    """
+    Zapisuje nagłówek i tabelę partii; zwraca kolumny (klucze, numery partii, półruchy) zmapowane
+    do zapisu, które wypełnia wywołujący.
+    """
+    archive = os.path.abspath(archive_path).encode()
+    sections = _layout(len(archive), len(game_offsets), records)
+    with open(path, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, VERSION, ZOBRIST_SIDE, len(game_offsets), records, len(archive)))
+        stream.write(archive)
+        stream.seek(sections[0])
+        stream.write(np.asarray(game_offsets, dtype='<u8').tobytes())
+        stream.write(np.asarray(game_results, dtype='u1').tobytes())
+        stream.truncate(sections[5])
+    return (_column(path, '<u8', sections[2], records, 'r+'), _column(path, '<u4', sections[3], records, 'r+'),
+            _column(path, '<u2', sections[4], records, 'r+'))
+
+
+def _split_games(data):
+    """
+    (przesunięcie, bajty) kolejnych partii we fragmencie - ta sama reguła podziału co pgn.read_games.
+    """
+    start = offset = 0
+    in_movetext = False
+    for line in data.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith(b'[') and in_movetext:
+            yield start, data[start:offset]
+            start, in_movetext = offset, False
+        elif stripped and not stripped.startswith((b'[', b'%')):
+            in_movetext = True
+        offset += len(line)
+    if data[start:].strip():
+        yield start, data[start:]
+
+
+def _index_chunk(task):
+    """
+    Indeksuje fragment pliku PGN i zapisuje posortowany przebieg (klucze, numery partii we
+    fragmencie, półruchy); zwraca (prefiks plików przebiegu, przesunięcia partii, wyniki partii).
+    """
+    path, start, end, run_prefix = task
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        data = stream.read(end - start)
+    keys, game_ids, plies = array('Q'), array('I'), array('H')
+    offsets, results = [], []
+    for game_start, text in _split_games(data):
+        game = next(read_games(io.StringIO(text.decode('utf-8', errors='replace'))), None)
+        if game is None:
+            continue
+        number = len(offsets)
+        offsets.append(start + game_start)
+        results.append(RESULTS.index(game.result) if game.result in RESULTS else 0)
+        try:
+            position = game.initial_position()
+            keys.append(position.key)
+            game_ids.append(number)
+            plies.append(0)
+            for ply, san_move in enumerate(game.san_moves, 1):
+                position.make_move(parse_san(position, san_move))
+                keys.append(position.key)
+                game_ids.append(number)
+                plies.append(ply)
+        except ValueError:  # Nielegalny ruch - indeksowane są pozycje do tego miejsca
+            pass
+    keys = np.frombuffer(keys, dtype=np.uint64)
+    order = np.argsort(keys, kind='stable')  # Przy równych kluczach zostaje kolejność partii i półruchów
+    np.save(run_prefix + '.keys.npy', keys[order])
+    np.save(run_prefix + '.games.npy', np.frombuffer(game_ids, dtype=np.uint32)[order])
+    np.save(run_prefix + '.plies.npy', np.frombuffer(plies, dtype=np.uint16)[order])
+    return run_prefix, offsets, results
+
+
+def merge_runs(runs, keys_out, game_ids_out, plies_out, block=MERGE_BLOCK):
+    """
+    Łączy posortowane przebiegi (klucze, numery partii, półruchy, pierwszy numer partii przebiegu)
+    do kolumn wynikowych. W każdym kroku granicą jest najmniejszy z ostatnich kluczy bloków
+    przebiegów; z każdego przebiegu wypisywane są wszystkie rekordy do granicy włącznie (także
+    za końcem bloku), więc rekordy o równym kluczu zostają w kolejności partii i półruchów.
+    """
+    positions = [0] * len(runs)
+    out = 0
+    while True:
+        active = [index for index, run in enumerate(runs) if positions[index] < len(run[0])]
+        if not active:
+            return
+        limit = min(runs[index][0][min(positions[index] + block, len(runs[index][0])) - 1] for index in active)
+        parts = []
+        for index in active:
+            keys, game_ids, plies, base = runs[index]
+            begin = positions[index]
+            end = begin + int(np.searchsorted(keys[begin:], limit, side='right'))
+            parts.append((keys[begin:end], game_ids[begin:end] + np.uint32(base), plies[begin:end]))
+            positions[index] = end
+        keys = np.concatenate([part[0] for part in parts])
+        order = np.argsort(keys, kind='stable')
+        count = len(keys)
+        keys_out[out:out + count] = keys[order]
+        game_ids_out[out:out + count] = np.concatenate([part[1] for part in parts])[order]
+        plies_out[out:out + count] = np.concatenate([part[2] for part in parts])[order]
+        out += count
+
+
+def build_index(pgn_path, index_path, workers=None, chunk_bytes=8 * 1024 * 1024):
+    """
+    Buduje indeks pozycji dla pliku PGN; zwraca (liczba partii, liczba rekordów).
+    """
+    run_dir = tempfile.mkdtemp(prefix='index-', dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        tasks = [(pgn_path, start, end, os.path.join(run_dir, f'run{number:05d}'))
+                 for number, (start, end) in enumerate(_chunk_offsets(pgn_path, chunk_bytes))]
+        with Pool(workers) as pool:
+            chunks = pool.map(_index_chunk, tasks)
+
+        game_offsets, game_results, runs = [], [], []
+        for run_prefix, offsets, results in chunks:
+            keys = np.load(run_prefix + '.keys.npy', mmap_mode='r')
+            runs.append((keys, np.load(run_prefix + '.games.npy', mmap_mode='r'),
+                         np.load(run_prefix + '.plies.npy', mmap_mode='r'), len(game_offsets)))
+            game_offsets += offsets
+            game_results += results
+        records = sum(len(run[0]) for run in runs)
+        columns = create_index_file(index_path, pgn_path, game_offsets, game_results, records)
+        merge_runs(runs, *columns)
+        for column in columns:
+            if isinstance(column, np.memmap):
+                column.flush()
+        del runs, columns  # Zamknięcie map przed usunięciem plików przebiegów
+        return len(game_offsets), records
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+class PositionIndex:
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            magic, version, fingerprint, games, records, path_length = HEADER.unpack(stream.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Niepoprawny plik indeksu: {path}")
+            if fingerprint != ZOBRIST_SIDE:
+                raise ValueError(f"Indeks zbudowany z innymi kluczami Zobrista: {path}")
+            self.archive_path = stream.read(path_length).decode()
+        sections = _layout(path_length, games, records)
+        self.game_offsets = _column(path, '<u8', sections[0], games)
+        self.game_results = _column(path, 'u1', sections[1], games)
+        self.keys = _column(path, '<u8', sections[2], records)
+        self.game_ids = _column(path, '<u4', sections[3], records)
+        self.plies = _column(path, '<u2', sections[4], records)
+        self.header_cache = OrderedDict()  # Numer partii -> nagłówki, ostatnio używane na końcu
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def game_count(self):
+        return len(self.game_offsets)
+
+    def lookup(self, key):
+        """
+        (numery partii, półruchy) wszystkich wystąpień pozycji o danym kluczu.
+        """
+        key = np.uint64(key)
+        left = int(np.searchsorted(self.keys, key, side='left'))
+        right = int(np.searchsorted(self.keys, key, side='right'))
+        return self.game_ids[left:right], self.plies[left:right]
+
+    def query(self, position):
+        """
+        (partie, statystyka): partie jako tablice (numery partii, pierwszy półruch z tą pozycją)
+        posortowane po numerze partii; statystyka - słownik wynik -> liczba partii.
+        """
+        game_ids, plies = self.lookup(position.key)  # Już uporządkowane po (partia, półruch)
+        first = np.ones(len(game_ids), dtype=bool)
+        first[1:] = game_ids[1:] != game_ids[:-1]  # Powtórzenie pozycji w jednej partii liczy się raz
+        game_ids, plies = game_ids[first], plies[first]
+        counts = np.bincount(self.game_results[game_ids], minlength=len(RESULTS))
+        return (game_ids, plies), {result: int(count) for result, count in zip(RESULTS, counts)}
+
+    def read_headers(self, game_id):
+        """
+        Nagłówki partii - czytane są tylko linie nagłówków, a wynik trafia do pamięci podręcznej.
+        """
+        headers = self.header_cache.get(game_id)
+        if headers is not None:
+            self.header_cache.move_to_end(game_id)
+            return headers
+        headers = {}
+        with open(self.archive_path, 'rb') as stream:
+            stream.seek(int(self.game_offsets[game_id]))
+            for line in stream:
+                stripped = line.strip()
+                if stripped.startswith(b'['):
+                    match = HEADER_RE.match(stripped.decode('utf-8', errors='replace'))
+                    if match:
+                        headers[match.group(1)] = ESCAPE_RE.sub(r'\1', match.group(2))
+                elif stripped:  # Początek ruchów
+                    break
+        self.header_cache[game_id] = headers
+        if len(self.header_cache) > HEADER_CACHE:
+            self.header_cache.popitem(last=False)
+        return headers
+
+    def read_game(self, game_id):
+        """
+        Partia (pgn.PgnGame) z archiwum, czytana od jej przesunięcia w pliku.
+        """
+        with open(self.archive_path, 'rb') as stream:
+            stream.seek(int(self.game_offsets[game_id]))
+            return next(read_games(io.TextIOWrapper(stream, encoding='utf-8', errors='replace')))
+
+
+def run_query(index, fen, bench):
+    if bench:
+        rng = np.random.default_rng(1)
+        keys = index.keys[rng.integers(0, len(index), bench)] if len(index) else np.zeros(0, dtype=np.uint64)
+        start = time.perf_counter()
+        for key in keys:
+            index.lookup(key)
+        elapsed = time.perf_counter() - start
+        print(f"{bench} lookups over {len(index)} positions: {elapsed / max(bench, 1) * 1e6:.1f} µs per lookup")
+        return
+    position = Position.from_fen(fen) if fen else Position.starting()
+    start = time.perf_counter()
+    (game_ids, plies), statistics = index.query(position)
+    elapsed = time.perf_counter() - start
+    print(f"{len(game_ids)} games in {elapsed * 1000:.2f} ms: " +
+          ', '.join(f"{result} {count}" for result, count in statistics.items()))
+    for game_id, ply in list(zip(game_ids, plies))[:20]:
+        headers = index.read_headers(game_id)
+        print(f"  #{game_id} {headers.get('White', '?')} - {headers.get('Black', '?')} "
+              f"{headers.get('Result', '*')} (ply {ply})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indeks pozycji dla archiwów partii PGN")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="zbuduj indeks pliku PGN")
+    build.add_argument('pgn')
+    build.add_argument('--output', help="plik indeksu (domyślnie obok pliku PGN, z rozszerzeniem .idx)")
+    build.add_argument('--workers', type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    build.add_argument('--chunk-mb', type=int, default=8, help="rozmiar fragmentu pliku dla jednego procesu")
+    query = commands.add_parser('query', help="wyszukaj pozycję w indeksie")
+    query.add_argument('index')
+    query.add_argument('--fen', help="pozycja (domyślnie początkowa)")
+    query.add_argument('--bench', type=int, metavar='N', help="zmierz czas N wyszukań losowych pozycji z indeksu")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        output = args.output or os.path.splitext(args.pgn)[0] + '.idx'
+        start = time.perf_counter()
+        games, records = build_index(args.pgn, output, args.workers, args.chunk_mb * 1024 * 1024)
+        elapsed = time.perf_counter() - start
+        print(f"{games} games, {records} positions indexed in {elapsed:.2f}s -> {output}")
+    else:
+        run_query(PositionIndex(args.index), args.fen, args.bench)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
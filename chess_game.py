@@ -1,8 +1,92 @@
+import argparse
+import logging
+import os
+import shlex
 import sys
+import time
+from array import array
+from collections import OrderedDict, deque
 from PyQt5.QtWidgets import QApplication, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QLabel, QVBoxLayout, \
-    QWidget, QMenu, QListWidget, QMainWindow, QGraphicsTextItem, QTextEdit, QDialog, QPushButton, QComboBox, QLineEdit
-from PyQt5.QtGui import QPixmap, QColor, QPen
-from PyQt5.QtCore import Qt, QRectF, QPointF, QSizeF, pyqtSignal, QObject, QTimer
+    QHBoxLayout, QWidget, QListView, QDialog, QPushButton, QComboBox, QLineEdit, \
+    QFileDialog, QInputDialog
+from PyQt5.QtGui import QPixmap, QColor, QPen, QPainter, QPolygonF, QKeySequence
+from PyQt5.QtCore import Qt, QRectF, QPointF, pyqtSignal, pyqtSlot, QObject, QTimer, QThread, QAbstractListModel, QModelIndex, \
+    QProcess
+from PyQt5.QtNetwork import QTcpSocket, QAbstractSocket
+from position import Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, COLOR_NAMES, PIECE_NAMES, \
+    PROMOTION, EN_PASSANT, CASTLING, CASTLING_MOVES, square_from_row_col, row_col_from_square, \
+    move_from, move_to, move_flag, move_promotion, move_uci, move_squares
+from game import Game, CHECKMATE, STALEMATE, THREEFOLD_REPETITION, FIFTY_MOVES, INSUFFICIENT_MATERIAL, TIME_FORFEIT, \
+    TABLEBASE, RESIGNATION, IllegalMoveError
+from tablebase import load_default as load_tablebases
+from engine import Search, SearchLimits
+from parallel import ParallelSearch
+from pgn import san, read_games, write_position_game, root_position
+from analysis import pack_game, evaluate_batch
+from uci import parse_info, position_command, go_command
+from archive import PositionIndex
+from instrument import METRICS, configure_from_environment
+
+ENGINE_HASH_MB = 32
+ENGINE_WORKERS = 1  # Liczba procesów wyszukiwania; więcej niż 1 włącza równoległe wyszukiwanie Lazy SMP
+# Analiza (F4) bez zewnętrznego silnika: wbudowany silnik uruchomiony jako silnik UCI
+DEFAULT_ANALYSER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uci.py')]
+
+DRAW_MESSAGES = {
+    STALEMATE: "Pat! Remis!",
+    THREEFOLD_REPETITION: "Trzykrotne powtórzenie pozycji! Remis!",
+    FIFTY_MOVES: "Zasada 50 ruchów! Remis!",
+    INSUFFICIENT_MATERIAL: "Niewystarczający materiał! Remis!",
+    TABLEBASE: "Tablice końcówek: pozycja remisowa! Remis!",
+}
+
+BOARD_COLORS = [QColor(255, 206, 158), QColor(209, 139, 71)]
+HIGHLIGHT_COLOR = QColor(40, 120, 40, 110)
+GRAPH_COLORS = {'background': QColor(40, 40, 40), 'axis': QColor(120, 120, 120), 'line': QColor(255, 255, 255),
+                'current': QColor(255, 206, 158)}
+GRAPH_SCALE = 1000  # Ocena (w centypionach), przy której wykres dochodzi do krawędzi
+ARCHIVE_REFRESH_MS = 150  # Zapytanie do indeksu archiwum po serii szybkich zmian pozycji wykonywane jest raz
+
+log = logging.getLogger('chess')
+
+PIECE_IMAGES = {
+    WHITE: {PAWN: 'chess_figures/pa_wh.png', KNIGHT: 'chess_figures/kni_wh.png', BISHOP: 'chess_figures/bis_wh.png',
+            ROOK: 'chess_figures/ro_wh.png', QUEEN: 'chess_figures/q_wh.png', KING: 'chess_figures/king_wh.png'},
+    BLACK: {PAWN: 'chess_figures/pa_bl.png', KNIGHT: 'chess_figures/kni_bl.png', BISHOP: 'chess_figures/bis_bl.png',
+            ROOK: 'chess_figures/ro_bl.png', QUEEN: 'chess_figures/q_bl.png', KING: 'chess_figures/king_bl.png'},
+}
+
+
+class SpriteCache:  # Obrazy figur wczytywane z dysku raz; przeskalowane kopie trzymane dla ostatnio używanych rozmiarów pola
+    def __init__(self, max_entries=48):
+        self.max_entries = max_entries
+        self.images = {}
+        self.scaled = OrderedDict()  # (ścieżka obrazu, rozmiar pola) -> QPixmap, od najdawniej używanego
+
+    def load(self):
+        for images in PIECE_IMAGES.values():
+            for path in images.values():
+                if path not in self.images:
+                    self.images[path] = QPixmap(path)
+
+    def pixmap(self, path, square_size):
+        key = (path, int(square_size))
+        pixmap = self.scaled.get(key)
+        if pixmap is not None:
+            self.scaled.move_to_end(key)
+            return pixmap
+        if path not in self.images:
+            self.images[path] = QPixmap(path)
+        image = self.images[path]
+        scale_factor = square_size / 60
+        pixmap = image.scaled(int(image.width() * scale_factor), int(image.height() * scale_factor))
+        self.scaled[key] = pixmap
+        if len(self.scaled) > self.max_entries:
+            self.scaled.popitem(last=False)
+        return pixmap
+
+
+SPRITES = SpriteCache()
 
 
 def cell_name_from_row_col(row, col):
@@ -11,31 +95,341 @@ def cell_name_from_row_col(row, col):
     return f"{column_letter}{row_number}"
 
 
+class MoveListModel(QAbstractListModel):  # Jeden wiersz na półruch; tekst SAN liczony jest tylko dla wierszy, które widok rysuje
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.moves = array('H')  # Ruchy zakodowane na 16 bitach (pole startowe, docelowe, promocja)
+        self.cursor = Position.starting()  # Pozycja robocza przesuwana do wiersza, o który pyta widok
+
+    def reset(self, root, moves=()):
+        self.beginResetModel()
+        self.cursor = root_position(root)
+        self.moves = array('H', moves)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.moves)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        ply = index.row()
+        cursor = self.cursor
+        while len(cursor.move_stack) > ply:  # Widoczne wiersze są obok siebie, więc kursor przesuwa się o kilka ruchów
+            cursor.unmake_move()
+        while len(cursor.move_stack) < ply:
+            cursor.make_move(self.moves[len(cursor.move_stack)])
+        number = f"{cursor.fullmove_number}." if cursor.side_to_move == WHITE else f"{cursor.fullmove_number}..."
+        return f"{number} {san(cursor, self.moves[ply])}"
+
+    def append_move(self, move):
+        row = len(self.moves)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.moves.append(move)
+        self.endInsertRows()
+
+    def truncate(self, ply):  # Usuwa ruchy od półruchu ply (nowy ruch po cofnięciu zastępuje dalszą historię)
+        if ply >= len(self.moves):
+            return
+        self.beginRemoveRows(QModelIndex(), ply, len(self.moves) - 1)
+        while len(self.cursor.move_stack) > ply:
+            self.cursor.unmake_move()
+        del self.moves[ply:]
+        self.endRemoveRows()
+
+
+class EvaluationGraph(QWidget):  # Ocena każdej pozycji partii (analysis.evaluate_batch); kliknięcie wybiera półruch
+    ply_selected = pyqtSignal(int)
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.position = Position.starting()  # Pozycja po ostatnim ocenionym ruchu
+        self.scores = []  # Ocena z punktu widzenia białych dla pozycji po 0, 1, 2... półruchach
+        self.current_ply = 0
+        self.setMinimumSize(200, 120)
+        model.modelReset.connect(self.rebuild)
+        model.rowsInserted.connect(self.extend)
+        model.rowsRemoved.connect(self.shrink)
+        self.rebuild()
+
+    def rebuild(self):  # Nowa partia - cała historia oceniana jednym wywołaniem
+        self.position = root_position(self.model.cursor)
+        self.scores = evaluate_batch(pack_game(self.model.moves, self.position)).tolist()
+        for move in self.model.moves:
+            self.position.make_move(move)
+        self.update()
+
+    def extend(self, parent, first, last):  # Dopisane ruchy - oceniane są tylko nowe pozycje
+        moves = self.model.moves[first:last + 1]
+        self.scores += evaluate_batch(pack_game(moves, self.position)[1:]).tolist()
+        for move in moves:
+            self.position.make_move(move)
+        self.update()
+
+    def shrink(self, parent, first, last):
+        del self.scores[first + 1:]
+        while len(self.position.move_stack) > first:
+            self.position.unmake_move()
+        self.current_ply = min(self.current_ply, first)
+        self.update()
+
+    def set_current_ply(self, ply):
+        self.current_ply = ply
+        self.update()
+
+    def ply_step(self):
+        return self.width() / max(len(self.scores) - 1, 1)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), GRAPH_COLORS['background'])
+        width, middle, step = self.width(), self.height() / 2, self.ply_step()
+        painter.setPen(QPen(GRAPH_COLORS['axis']))
+        painter.drawLine(QPointF(0, middle), QPointF(width, middle))
+        points = [QPointF(ply * step, middle - max(-GRAPH_SCALE, min(GRAPH_SCALE, score)) * middle / GRAPH_SCALE)
+                  for ply, score in enumerate(self.scores)]
+        painter.setPen(QPen(GRAPH_COLORS['line'], 2))
+        painter.drawPolyline(QPolygonF(points))
+        if self.current_ply < len(self.scores):
+            painter.setPen(QPen(GRAPH_COLORS['current']))
+            x = min(self.current_ply * step, width - 1)
+            painter.drawLine(QPointF(x, 0), QPointF(x, self.height()))
+            painter.drawText(4, 14, f"{self.scores[self.current_ply] / 100:+.2f}")
+
+    def mousePressEvent(self, event):
+        ply = round(event.x() / self.ply_step())
+        self.ply_selected.emit(max(0, min(ply, len(self.scores) - 1)))
+
+
 class MoveHistoryWindow(QDialog):
-    update_signal = pyqtSignal()
+    ply_selected = pyqtSignal(int)
 
     def __init__(self):
         super().__init__()
-        self.move_history = []
         self.setWindowTitle("Move History")
-        self.setGeometry(100, 100, 300, 400)
+        self.setGeometry(100, 100, 600, 400)
 
-        layout = QVBoxLayout()
-        self.history_text_edit = QTextEdit()
-        layout.addWidget(self.history_text_edit)
+        layout = QHBoxLayout()
+        self.model = MoveListModel(self)
+        self.history_view = QListView()
+        self.history_view.setModel(self.model)
+        self.history_view.setUniformItemSizes(True)  # Widok nie musi mierzyć każdego wiersza
+        self.history_view.clicked.connect(lambda index: self.ply_selected.emit(index.row() + 1))
+        self.evaluation_graph = EvaluationGraph(self.model)
+        self.evaluation_graph.ply_selected.connect(self.ply_selected)
+        layout.addWidget(self.history_view)
+        layout.addWidget(self.evaluation_graph, 1)
         self.setLayout(layout)
 
-        self.update_signal.connect(self.update_history_text)
+    @property
+    def move_history(self):
+        return self.model.moves
 
     def add_move(self, move):
-        self.move_history.append(move)
-        self.update_signal.emit()
+        self.model.append_move(move)
+        self.select_ply(len(self.model.moves))
+
+    def reset(self, root, moves=()):
+        self.model.reset(root, moves)
+        self.select_ply(len(self.model.moves))
+
+    def truncate(self, ply):
+        self.model.truncate(ply)
+
+    def select_ply(self, ply):  # Zaznacza ruch prowadzący do pozycji po ply półruchach
+        self.evaluation_graph.set_current_ply(ply)
+        if ply == 0:
+            self.history_view.clearSelection()
+            self.history_view.scrollToTop()
+            return
+        index = self.model.index(ply - 1)
+        self.history_view.setCurrentIndex(index)
+        self.history_view.scrollTo(index)
+
+
+class EngineWorker(QObject):  # Wyszukiwanie działa w osobnym wątku, żeby plansza nie przestawała odpowiadać
+    info_signal = pyqtSignal(dict)
+    bestmove_signal = pyqtSignal(int, object)
+
+    def __init__(self, hash_mb=ENGINE_HASH_MB, workers=ENGINE_WORKERS):
+        super().__init__()
+        if workers > 1:
+            self.search = ParallelSearch(workers, hash_mb)
+        else:
+            self.search = Search(hash_mb=hash_mb)
+
+    @pyqtSlot(object, object)
+    def start_search(self, position, limits):
+        key = position.key
+        self.search.stop_event.clear()
+        move, score = self.search.search(position, limits, self.info_signal.emit)
+        self.bestmove_signal.emit(move, key)
+
+    def stop(self):
+        self.search.stop()
+
+    def close(self):
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+
+
+class UciEngineProcess(QObject):  # Zewnętrzny silnik UCI w QProcess; jego wyjście czytane jest w pętli zdarzeń Qt, plansza nigdy nie czeka
+    info_signal = pyqtSignal(dict)
+    bestmove_signal = pyqtSignal(int, object)
+
+    def __init__(self, command, ponder=False, parent=None, limits_provider=None):
+        super().__init__(parent)
+        self.name = command[0]
+        self.ponder = ponder
+        self.limits_provider = limits_provider  # Funkcja zwracająca SearchLimits z bieżących zegarów (do go ponder)
+        self.state = 'idle'  # idle, searching, pondering albo analysing
+        self.search_position = None  # Pozycja, dla której silnik liczy
+        self.ponder_key = None  # Klucz pozycji po przewidzianym ruchu przeciwnika
+        self.limits = SearchLimits()
+        self.discarded = 0  # Tyle najbliższych bestmove pochodzi z przerwanych wyszukiwań
+        self.process = QProcess(self)
+        self.process.readyReadStandardOutput.connect(self.read_lines)
+        self.process.errorOccurred.connect(lambda _: print(f"Silnik UCI: {self.process.errorString()}"))
+        self.process.start(command[0], command[1:])
+        self.send('uci')  # Silnik czyta komendy po kolei, więc nie trzeba czekać na uciok
+        if ponder:
+            self.send('setoption name Ponder value true')
+        self.send('isready')
+
+    def send(self, line):
+        self.process.write(line.encode() + b'\n')
+
+    def start_search(self, position, limits):
+        if self.state == 'pondering' and position.key == self.ponder_key:
+            self.send('ponderhit')  # Przeciwnik zagrał przewidziany ruch - silnik liczy dalej, już na swoim czasie
+            self.state = 'searching'
+            return
+        self.stop()
+        self.search_position = position.copy()
+        self.limits = limits
+        self.send(position_command(position))
+        self.send(go_command(limits))
+        self.state = 'searching'
 
-    def update_history_text(self):
-        text = ""
-        for move in self.move_history:
-            text += f"{move[1]} {move[2]} moved to {move[0]}\n"
-        self.history_text_edit.setPlainText(text)
+    def analyse(self, position):
+        self.stop()
+        self.search_position = position.copy()
+        self.send(position_command(position))
+        self.send(go_command(SearchLimits(), infinite=True))
+        self.state = 'analysing'
+
+    def stop(self):
+        if self.state != 'idle':
+            self.send('stop')
+            self.discarded += 1
+            self.state = 'idle'
+
+    def close(self):
+        self.stop()
+        self.send('quit')
+        if not self.process.waitForFinished(1000):
+            self.process.kill()
+            self.process.waitForFinished(1000)
+
+    def read_lines(self):
+        while self.process.canReadLine():
+            line = bytes(self.process.readLine()).decode('utf-8', errors='replace').strip()
+            if line.startswith('bestmove'):
+                self.handle_bestmove(line.split())
+            elif line.startswith('info') and ' pv ' in line and self.state in ('searching', 'analysing') and \
+                    not self.discarded:
+                self.info_signal.emit(parse_info(line))
+            elif line.startswith('id name '):
+                self.name = line[8:]
+
+    def handle_bestmove(self, words):
+        if self.discarded:
+            self.discarded -= 1
+            return
+        self.state = 'idle'
+        position = self.search_position
+        move = position.parse_uci(words[1]) if len(words) > 1 else None
+        if move is None:
+            return
+        self.bestmove_signal.emit(move, position.key)
+        if self.ponder and self.state == 'idle' and len(words) > 3 and words[2] == 'ponder':
+            position.make_move(move)
+            reply = position.parse_uci(words[3])
+            if reply is not None:  # Liczenie na czasie przeciwnika
+                position.make_move(reply)
+                self.ponder_key = position.key
+                self.send(position_command(position))
+                # Zegary zmieniły się od ostatniego go - po ponderhit silnik liczy na bieżącym czasie
+                limits = self.limits_provider() if self.limits_provider is not None else self.limits
+                self.send(go_command(limits, ponder=True))
+                self.state = 'pondering'
+
+
+class ServerConnection(QObject):  # Klient protokołu server.py na QTcpSocket - odpowiedzi czytane w pętli zdarzeń Qt
+    started = pyqtSignal(int, int, str)  # Czas białych i czarnych w ms, FEN pozycji początkowej
+    moved = pyqtSignal(str, int, int)  # Ruch UCI potwierdzony przez serwer, czasy po ruchu
+    over = pyqtSignal(str, str)  # Wynik, sposób zakończenia
+    error = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.socket = QTcpSocket(self)
+        self.socket.connected.connect(self.flush)
+        self.socket.readyRead.connect(self.read_lines)
+        self.socket.errorOccurred.connect(lambda _: self.error.emit(self.socket.errorString()))
+        self.game_id = None
+        self.seat = None
+        self.queued = []  # Komendy wysłane przed nawiązaniem połączenia
+
+    def connect_to(self, host, port):
+        self.socket.connectToHost(host, port)
+
+    def send(self, line):
+        if self.socket.state() == QAbstractSocket.ConnectedState:
+            self.socket.write(line.encode() + b'\n')
+        else:
+            self.queued.append(line)
+
+    def flush(self):
+        queued, self.queued = self.queued, []
+        for line in queued:
+            self.send(line)
+
+    def new_game(self, base_time, increment=0, seat='both'):
+        self.send(f"NEW {base_time} {increment} {seat}")
+
+    def join(self, game_id):
+        self.send(f"JOIN {game_id}")
+
+    def send_move(self, text):
+        self.send(f"MOVE {self.game_id} {text}")
+
+    def resign(self):
+        self.send(f"RESIGN {self.game_id}")
+
+    def close(self):
+        self.socket.disconnectFromHost()
+
+    def read_lines(self):
+        while self.socket.canReadLine():
+            words = bytes(self.socket.readLine()).decode('utf-8', errors='replace').split()
+            if len(words) < 2:
+                continue
+            kind = words[0]
+            if kind == 'ERROR':
+                self.error.emit(' '.join(words[2:]))
+            elif kind == 'GAME':
+                self.game_id, self.seat = int(words[1]), words[2]
+            elif words[1] != str(self.game_id):
+                continue
+            elif kind == 'START':
+                self.started.emit(int(words[2]), int(words[3]), ' '.join(words[4:]))
+            elif kind == 'MOVED':
+                self.moved.emit(words[2], int(words[3]), int(words[4]))
+            elif kind == 'OVER':
+                self.over.emit(words[2], ' '.join(words[3:]))
 
 
 class DraggableChessPiece(QGraphicsPixmapItem):
@@ -53,59 +447,35 @@ class DraggableChessPiece(QGraphicsPixmapItem):
 
         self.row = None  
         self.col = None  
+        self.targets = set()  # Pola docelowe legalnych ruchów, liczone raz przy podniesieniu figury
 
     def set_row_col(self, row, col):
         self.row = row
         self.col = col
 
     def mousePressEvent(self, event):
-        if self.color != self.board.current_player:  # Sprawdzanie czy kolor pionka zgadza się z aktualnym graczem
+        if (self.board.game_over or self.color != self.board.current_player
+                or not self.board.is_local_side(self.color)):  # Po końcu partii i dla figur przeciwnika nic się nie podnosi
             event.ignore()  
             return
         self.setCursor(Qt.ClosedHandCursor)
         self.setScale(1.3)  
+        self.targets = self.board.legal_targets(self.row, self.col)
+        self.board.show_highlights(self.targets)
         super().mousePressEvent(event)
 
     def mouseReleaseEvent(self, event):
         self.setCursor(Qt.OpenHandCursor)
         self.setScale(1.0) 
         pos = event.scenePos()
-        new_x = int(pos.x() / self.square_size) * self.square_size
-        new_y = int(pos.y() / self.square_size) * self.square_size
-        new_x = max(0, min(self.board_size - self.square_size, new_x))
-        new_y = max(0, min(self.board_size - self.square_size, new_y))
-        new_pos = QPointF(new_x, new_y)
-
-       
-        if self.can_move_to_position(new_x, new_y):  # Sprawdzanie czy figura może się poruszyć na daną pozycję
-            items = self.scene().items(QRectF(new_pos, QSizeF(self.square_size, self.square_size)))
-            for item in items:
-                if isinstance(item, DraggableChessPiece) and item != self:
-                    if item.color != self.color:
-                        if self.can_capture_piece(item):
-                            self.scene().removeItem(item)
-                            del item
-                        else:
-                            return self.setPos(self.col * self.square_size, self.row * self.square_size)  # W innym przypadku ruch nie jest dozwolony, więc figura nie może być przesunięta
-                    else:
-                        return self.setPos(self.col * self.square_size, self.row * self.square_size) # Jeśli figura tego samego koloru stoi na docelowym polu, nie rób nic
-                    break
-
-            self.setPos(new_pos)
-
-            self.row = int(new_y / self.square_size)
-            self.col = int(new_x / self.square_size)
-
-            cell_name = cell_name_from_row_col(self.row, self.col)
-            print(f"Position of {self.color} {self.piece_type}: {cell_name}")
-
-            
-            self.board.move_history_window.add_move((cell_name, self.color, self.piece_type)) # Dodanie ruchu do historii
-
-            self.board.change_turn()
-            self.board.update_turn_label()
-        else:
+        new_col = max(0, min(7, int(pos.x() / self.square_size)))
+        new_row = max(0, min(7, int(pos.y() / self.square_size)))
+        self.board.clear_highlights()
 
+        if square_from_row_col(new_row, new_col) in self.targets:  # Sprawdzanie czy figura może się poruszyć na daną pozycję
+            self.board.request_move(self, new_row, new_col)
+            log.debug("Position of %s %s: %s", self.color, self.piece_type, cell_name_from_row_col(self.row, self.col))
+        else:
             self.setPos(self.col * self.square_size, self.row * self.square_size) # Jeśli ruch jest nieprawidłowy, figury nie zostaną przesunięte
 
         super().mouseReleaseEvent(event)
@@ -114,88 +484,71 @@ class DraggableChessPiece(QGraphicsPixmapItem):
         """
         Sprawdza, czy figura może zbijać daną figurę.
         """
-        if self.piece_type == 'Pawn':
-            return abs(piece.col - self.col) == 1 and abs(piece.row - self.row) == 1 # Pionek może bić tylko po skosie
-        elif self.piece_type == 'King':
-            return abs(piece.col - self.col) <= 1 and abs(piece.row - self.row) <= 1 # Król może bić figurę, która jest na jednym z sąsiednich pól
-        elif self.piece_type == 'Knight':
-            return (abs(piece.col - self.col) == 2 and abs(piece.row - self.row) == 1) or \ # Skoczek może bić figurę na polach, które są dostępne dla jego ruchu
-                (abs(piece.col - self.col) == 1 and abs(piece.row - self.row) == 2)
-        else:
-            if self.can_move_to_position(piece.col * self.square_size, piece.row * self.square_size): # Dla pozostałych typów figurek, sprawdzamy czy docelowe pole jest w zasięgu ruchu
-                return True
-            else:
-                return False
-
-    def can_move_to_position(self, x, y): # Sprawdzenie czy docelowe pole jest puste lub zajęte przez przeciwnika
-        for item in self.scene().items():
-            if isinstance(item, DraggableChessPiece):
-                if item != self and item.row is not None and item.col is not None: 
-                    if item.row == int(y / self.square_size) and item.col == int(x / self.square_size): 
-                        if item.color != self.color:
-                            return True  
-                        else:
-                            return False 
-                    if item.row == self.row and item.col == self.col:
-                        continue
-                    if item.row == int(y / self.square_size) or item.col == int(x / self.square_size): # Jeśli figura jest na tej samej linii pionowej lub poziomej co docelowa pozycja
-                        if self.piece_type in ('Rook', 'Queen') or item.piece_type in ('Rook', 'Queen'): # Jeśli figura jest wieżą lub hetmanem  
-                            if self.row == item.row: # Jeśli figura jest na tej samej linii poziomej co docelowa pozycja
-                                if min(self.col, int(x / self.square_size)) < item.col < max(self.col,
-                                                                                             int(x / self.square_size)):
-                                    return False  # Droga figury jest przecięta przez inną figurę
-                            elif self.col == item.col:
-                                if min(self.row, int(y / self.square_size)) < item.row < max(self.row,
-                                                                                             int(y / self.square_size)):  # Jeśli figura jest na tej samej linii pionowej co docelowa pozycja
-                                    return False  # Droga figury jest przecięta przez inną figurę
-                    if abs(item.row - int(y / self.square_size)) == abs(item.col - int(x / self.square_size)): # Jeśli figura jest na tej samej linii po skosie co docelowa pozycja
-                        if self.piece_type in ('Bishop', 'Queen') or item.piece_type in ('Bishop', 'Queen'): # Jeśli figura jest gońcem lub hetmanem
-                            min_row = min(self.row, int(y / self.square_size))
-                            max_row = max(self.row, int(y / self.square_size))
-                            min_col = min(self.col, int(x / self.square_size))
-                            max_col = max(self.col, int(x / self.square_size))
-                            for i in range(min_row + 1, max_row): # Sprawdzenie czy droga figury jest przecięta przez inną figurę
-                                for j in range(min_col + 1, max_col):
-                                    if item.row == i and item.col == j:
-                                        return False  # Droga figury jest przecięta przez inną figurę
-                                        
-        # Warunki sprawdzające czy figura może się poruszyć na daną pozycję
-        if self.piece_type == 'Pawn':
-            if self.color == 'White':
-                if y == self.row * self.square_size + self.square_size and x == self.col * self.square_size:
-                    return True
-                elif y == self.row * self.square_size + self.square_size * 2 and x == self.col * self.square_size and self.row == 1:
-                    return True
-            else:
-                if y == self.row * self.square_size - self.square_size and x == self.col * self.square_size:
-                    return True
-                elif y == self.row * self.square_size - self.square_size * 2 and x == self.col * self.square_size and self.row == 6:
-                    return True
-                    
-        elif self.piece_type == 'Rook':
-            return x == self.col * self.square_size or y == self.row * self.square_size
-            
-        elif self.piece_type == 'Knight':
-            return (abs(x - self.col * self.square_size) == 2 * self.square_size and abs(
-                y - self.row * self.square_size) == self.square_size) or \
-                (abs(x - self.col * self.square_size) == self.square_size and abs(
-                    y - self.row * self.square_size) == 2 * self.square_size)
-            
-        elif self.piece_type == 'Bishop':
-            return abs(x - self.col * self.square_size) == abs(y - self.row * self.square_size)
-            
-        elif self.piece_type == 'Queen':
-            return (x == self.col * self.square_size or y == self.row * self.square_size) or abs(
-                x - self.col * self.square_size) == abs(y - self.row * self.square_size)
-            
-        elif self.piece_type == 'King':
-            return abs(x - self.col * self.square_size) <= self.square_size and abs(
-                y - self.row * self.square_size) <= self.square_size
-        else:
-            return True
+        return piece.color != self.color and self.can_move_to_position(piece.col * self.square_size,
+                                                                       piece.row * self.square_size)
+
+    def can_move_to_position(self, x, y): # Sprawdzenie zasad ruchu figury na modelu pozycji (bez sprawdzania szacha)
+        target = square_from_row_col(int(y / self.square_size), int(x / self.square_size))
+        return self.board.position.can_reach(square_from_row_col(self.row, self.col), target)
+
+
+class ArchiveGamesModel(QAbstractListModel):  # Jeden wiersz na partię; nagłówki czytane są z archiwum tylko dla wierszy, które widok rysuje
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.archive = None  # archive.PositionIndex
+        self.game_ids = []
+        self.plies = []
+
+    def reset(self, archive, game_ids, plies):
+        self.beginResetModel()
+        self.archive, self.game_ids, self.plies = archive, game_ids, plies
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.game_ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        headers = self.archive.read_headers(int(self.game_ids[index.row()]))
+        return (f"{headers.get('White', '?')} - {headers.get('Black', '?')}  {headers.get('Result', '*')}  "
+                f"(ply {self.plies[index.row()]})")
+
+
+class ArchiveGamesWindow(QDialog):  # Partie z archiwum (archive.PositionIndex), które doszły do bieżącej pozycji
+    game_selected = pyqtSignal(int, int)  # Numer partii w indeksie, półruch z tą pozycją
+    refresh_requested = pyqtSignal()  # Panel pojawił się na ekranie - lista mogła się zdezaktualizować
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Archive Games")
+        layout = QVBoxLayout()
+        self.summary_label = QLabel("")
+        self.model = ArchiveGamesModel(self)
+        self.games_view = QListView()
+        self.games_view.setModel(self.model)
+        self.games_view.setUniformItemSizes(True)  # Widok nie musi mierzyć (ani czytać) każdego wiersza
+        self.games_view.clicked.connect(self.emit_game)
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.games_view)
+        self.setLayout(layout)
+
+    def show_games(self, archive, game_ids, plies, statistics):
+        white, black, draws = statistics['1-0'], statistics['0-1'], statistics['1/2-1/2']
+        self.summary_label.setText(f"Games: {len(game_ids)}  White wins {white}  Draws {draws}  Black wins {black}")
+        self.model.reset(archive, game_ids, plies)
+
+    def emit_game(self, index):
+        self.game_selected.emit(int(self.model.game_ids[index.row()]), int(self.model.plies[index.row()]))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_requested.emit()
 
 
 class ChessBoard(QGraphicsView):
+    search_requested = pyqtSignal(object, object)
+
     def __init__(self, move_history_window):
         super().__init__()
         self.scene = QGraphicsScene(self)
@@ -204,115 +557,522 @@ class ChessBoard(QGraphicsView):
         self.setMinimumSize(600, 600)
         self.board_size = 600 
         self.square_size = self.board_size / 8
+        self.tablebases = load_tablebases()  # None, jeśli tablebases.bin nie został wygenerowany (retrograde.py)
+        # Cała logika partii jest w module game, plansza tylko ją wyświetla
+        self.game = Game(base_time=60, tablebases=self.tablebases)
+        SPRITES.load()
+        self.square_items = [None] * 64  # Pole -> figura na scenie, aktualizowane przy każdym ruchu i biciu
+        self.highlight_squares = []  # Podświetlone pola rysowane w warstwie tła: (pole, czy zbicie)
+        self.setCacheMode(QGraphicsView.CacheBackground)  # Plansza z opisami rysowana raz i trzymana jako bufor widoku
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.DontAdjustForAntialiasing)
+        self.setSceneRect(0, 0, self.board_size, self.board_size)
+        self.paint_count = 0
+        self.frame_times = deque(maxlen=240)  # (początek, czas rysowania) ostatnich klatek
+        self.stats_label = QLabel(self.viewport())  # Nakładka z czasem klatki, przełączana klawiszem F3
+        self.stats_label.setAutoFillBackground(True)  # Nieprzezroczysta - jej odświeżanie nie przerysowuje planszy
+        self.stats_label.setStyleSheet("background-color: black; color: lime; padding: 2px;")
+        self.stats_label.move(4, 4)
+        self.stats_label.hide()
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_render_stats)
         self.draw_board()
         self.draw_pieces()
-        self.current_player = 'White' 
         self.move_history_window = move_history_window  
+        self.move_history_window.ply_selected.connect(self.jump_to_ply)
         self.timer = QTimer(self)  
         self.timer.timeout.connect(self.update_time) 
         self.time_options = {'1 minuta': 60, '5 minut': 300, '10 minut': 600} 
-        self.white_time = 60 
-        self.black_time = 60 
         self.turn_label = QLabel("Current Turn: White (60 sec)") 
         self.time_combobox = QComboBox()  
         self.time_combobox.addItems(self.time_options.keys())  
         self.start_button = QPushButton("Start Game")  
         self.start_button.clicked.connect(self.start_game) 
+        self.save_pgn_button = QPushButton("Save PGN")
+        self.save_pgn_button.clicked.connect(self.save_pgn)
+        self.load_pgn_button = QPushButton("Load PGN")
+        self.load_pgn_button.clicked.connect(self.load_pgn)
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.clicked.connect(self.undo_move)
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.clicked.connect(self.redo_move)
+        self.copy_fen_button = QPushButton("Copy FEN")
+        self.copy_fen_button.clicked.connect(self.copy_fen)
+        self.load_fen_button = QPushButton("Load FEN")
+        self.load_fen_button.clicked.connect(self.ask_fen)
+        self.load_index_button = QPushButton("Load Index")
+        self.load_index_button.clicked.connect(self.load_index)
+        self.archive = None  # archive.PositionIndex - partie z archiwum dla bieżącej pozycji
+        self.archive_window = ArchiveGamesWindow()
+        self.archive_window.game_selected.connect(self.open_archive_game)
+        self.archive_window.refresh_requested.connect(self.update_archive_games)
+        self.archive_window.hide()
+        self.archive_timer = QTimer(self)
+        self.archive_timer.setSingleShot(True)
+        self.archive_timer.setInterval(ARCHIVE_REFRESH_MS)
+        self.archive_timer.timeout.connect(self.refresh_archive_games)
+
+        self.engine_color = None  # Kolor, którym gra komputer (None - gra dwóch ludzi)
+        self.opponent_options = {'Human vs Human': None, 'Computer plays Black': 'Black', 'Computer plays White': 'White'}
+        self.opponent_combobox = QComboBox()
+        self.opponent_combobox.addItems(self.opponent_options.keys())
+        self.opponent_combobox.currentTextChanged.connect(self.change_opponent)
+        self.engine_label = QLabel("")
+        self.engine_thread = QThread(self)
+        self.engine_worker = EngineWorker()
+        self.engine_worker.moveToThread(self.engine_thread)
+        self.search_requested.connect(self.engine_worker.start_search)
+        self.engine_worker.info_signal.connect(self.update_engine_info)
+        self.engine_worker.bestmove_signal.connect(self.play_engine_move)
+        self.engine_thread.start()
+        self.engine = self.engine_worker  # Przeciwnik: wbudowany silnik albo UciEngineProcess
+        self.uci_command = None
+        self.analyser = None  # UciEngineProcess analizujący bieżącą pozycję (F4)
+        self.connection = None  # ServerConnection, gdy partia toczy się na serwerze (server.py)
+
+    @property
+    def position(self):
+        return self.game.position
+
+    @property
+    def legal_moves(self):
+        return self.game.legal_moves
+
+    @property
+    def current_player(self):
+        return COLOR_NAMES[self.position.side_to_move]
+
+    @property
+    def white_time(self):
+        return self.game.clock[WHITE]
+
+    @property
+    def black_time(self):
+        return self.game.clock[BLACK]
+
+    @property
+    def game_over(self):
+        return self.game.is_over()
 
     def is_king_under_attack(self, color):
-        king_row, king_col = None, None
-        print("Szach")
-        for item in self.scene.items(): # Znajdź pozycję króla danego koloru
-            if isinstance(item, DraggableChessPiece) and item.color == color and item.piece_type == 'King':
-                king_row, king_col = item.row, item.col
-                break
-        for item in self.scene.items(): # Sprawdź, czy król jest atakowany przez jakąkolwiek figurę przeciwnika
-            if isinstance(item, DraggableChessPiece) and item.color != color:
-                if item.can_capture_piece((king_row, king_col)):
-                    return True
-        return False
-
-    def is_checkmate(self, color):  # Sprawdź, czy król jest pod biciem   
-        if not self.is_king_under_attack(color):
+        return self.position.in_check(COLOR_NAMES.index(color))
+
+    def is_checkmate(self, color):  # Mat: król jest szachowany i nie ma żadnego legalnego ruchu (albo mat wymuszony według tablic końcówek)
+        if self.game.termination == TABLEBASE:
+            return self.game.result == ('0-1' if color == 'White' else '1-0')
+        return self.game.termination == CHECKMATE and self.current_player == color
+
+    def is_stalemate(self):
+        return self.game.termination == STALEMATE
+
+    def is_valid_move(self, row, col, target_row, target_col, color):  # Sprawdź, czy ruch jest zgodny z zasadami i nie zostawia króla pod szachem
+        from_sq = square_from_row_col(row, col)
+        piece = self.position.piece_at(from_sq)
+        if piece is None or COLOR_NAMES[piece[0]] != color:
+            return False
+        return self.position.find_move(from_sq, square_from_row_col(target_row, target_col),
+                                       legal_moves=self.legal_moves) is not None
+
+    def piece_item_at(self, row, col):
+        return self.square_items[square_from_row_col(row, col)]
+
+    def place_item(self, item, row, col):
+        if item.row is not None and self.square_items[square_from_row_col(item.row, item.col)] is item:
+            self.square_items[square_from_row_col(item.row, item.col)] = None
+        self.square_items[square_from_row_col(row, col)] = item
+        item.set_row_col(row, col)
+        item.setPos(col * self.square_size, row * self.square_size)
+
+    def remove_item(self, item):
+        self.square_items[square_from_row_col(item.row, item.col)] = None
+        self.scene.removeItem(item)
+
+    def legal_targets(self, row, col):
+        if self.game_over:  # Po końcu partii (np. po upływie czasu) legalne ruchy pozycji nie są już dozwolone
+            return set()
+        from_sq = square_from_row_col(row, col)
+        return {move_to(move) for move in self.legal_moves if move_from(move) == from_sq}
+
+    def square_rect(self, sq):
+        row, col = row_col_from_square(sq)
+        return QRectF(col * self.square_size, row * self.square_size, self.square_size, self.square_size)
+
+    def show_highlights(self, squares):
+        self.clear_highlights()
+        self.highlight_squares = [(sq, self.square_items[sq] is not None) for sq in squares]
+        for sq, _ in self.highlight_squares:
+            self.scene.invalidate(self.square_rect(sq), QGraphicsScene.BackgroundLayer)
+
+    def clear_highlights(self):  # Z bufora tła przerysowywane są tylko pola, które były podświetlone
+        for sq, _ in self.highlight_squares:
+            self.scene.invalidate(self.square_rect(sq), QGraphicsScene.BackgroundLayer)
+        self.highlight_squares = []
+
+    def request_move(self, item, target_row, target_col, promotion=QUEEN):  # Przy grze przez serwer ruch wykonywany jest dopiero po jego potwierdzeniu
+        if self.connection is None:
+            self.apply_move(item, target_row, target_col, promotion)
+            return
+        item.setPos(item.col * self.square_size, item.row * self.square_size)
+        self.connection.send_move(move_uci(self.game.find_move(square_from_row_col(item.row, item.col),
+                                                               square_from_row_col(target_row, target_col), promotion)))
+
+    def apply_move(self, item, target_row, target_col, promotion=QUEEN):  # Wykonaj ruch w modelu pozycji i odzwierciedl go na scenie
+        move = self.game.find_move(square_from_row_col(item.row, item.col),
+                                   square_from_row_col(target_row, target_col), promotion)
+        ply = len(self.game.moves)
+        self.game.play(move)  # Najpierw model - odrzucony ruch nie zmienia sceny
+        flag = move_flag(move)
+        captured_row, captured_col = target_row, target_col
+        if flag == EN_PASSANT:  # Bity pionek stoi obok pola docelowego
+            captured_row = item.row
+        captured_item = self.piece_item_at(captured_row, captured_col)
+        if captured_item is not None:
+            self.remove_item(captured_item)
+        if flag == CASTLING:  # Przy roszadzie przesuwamy również wieżę
+            rook_from, rook_to = CASTLING_MOVES[move_to(move)][1]
+            self.place_item(self.piece_item_at(*row_col_from_square(rook_from)), *row_col_from_square(rook_to))
+        self.move_history_window.truncate(ply)
+        self.place_item(item, target_row, target_col)
+        if flag == PROMOTION:
+            color, piece_type = self.position.piece_at(move_to(move))
+            item.piece_type = PIECE_NAMES[piece_type]
+            item.setPixmap(self.piece_pixmap(color, piece_type))
+
+        self.move_history_window.add_move(move) # Dodanie ruchu do historii
+        self.update_turn_label()
+
+        if self.game_over:  # Sprawdź, czy wykonany ruch kończy partię (mat, pat, remis)
+            self.end_game()
+        elif self.is_king_under_attack(self.current_player):
+            print(f"{self.current_player} jest szachowany!")
+        self.start_engine_if_needed()
+        self.position_changed()
+
+    def end_game(self):
+        termination = self.game.termination
+        if termination == CHECKMATE:
+            print(f"{self.current_player} jest szachowany matem!")
+        elif termination == TIME_FORFEIT:
+            print("Czas minął! Czarny gracz wygrywa!" if self.game.result == '0-1' else "Czas minął! Biały gracz wygrywa!")
+        elif termination == RESIGNATION:
+            print("Czarny gracz się poddał! Biały gracz wygrywa!" if self.game.result == '1-0' else
+                  "Biały gracz się poddał! Czarny gracz wygrywa!")
+        elif termination == TABLEBASE and self.game.result != '1/2-1/2':
+            winner = "Biały" if self.game.result == '1-0' else "Czarny"
+            print(f"Tablice końcówek: {winner} gracz daje mata w {(self.game.tablebase_hit[1] + 1) // 2} ruchach!")
+        else:
+            print(DRAW_MESSAGES[termination])
+        self.stop_timer()
+        self.engine.stop()  # Np. silnik UCI liczący na czasie przeciwnika
+
+    def change_opponent(self, text):
+        self.engine_color = self.opponent_options[text]
+        self.start_engine_if_needed()
+
+    def engine_limits(self):  # Silnik gospodaruje rzeczywistym pozostałym czasem z zegara
+        if self.timer.isActive():
+            return SearchLimits(white_time=self.white_time, black_time=self.black_time)
+        selected_time = self.time_options[self.time_combobox.currentText()]
+        return SearchLimits(white_time=selected_time, black_time=selected_time)
+
+    def start_engine_if_needed(self):
+        if not self.game_over and self.current_player == self.engine_color:
+            self.engine_label.setText("Engine thinking...")
+            self.search_requested.emit(self.position.copy(), self.engine_limits())
+
+    def update_engine_info(self, info):  # Informacje z silnika UCI mogą nie mieć wszystkich pól
+        if 'mate' in info:
+            score = f"mate {info['mate']}"
+        else:
+            score = f"{info.get('score', 0) / 100:+.2f}"
+        self.engine_label.setText(f"Depth {info.get('depth', 0)}  Score {score}  NPS {info.get('nps', 0)}  "
+                                  f"PV {' '.join(info.get('pv', []))}")
+
+    def use_uci_engine(self, command, ponder=False):  # Przeciwnikiem jest zewnętrzny silnik UCI zamiast wbudowanego
+        self.uci_command = command
+        self.search_requested.disconnect(self.engine_worker.start_search)
+        self.engine = UciEngineProcess(command, ponder, self, limits_provider=self.engine_limits)
+        self.search_requested.connect(self.engine.start_search)
+        self.engine.info_signal.connect(self.update_engine_info)
+        self.engine.bestmove_signal.connect(self.play_engine_move)
+
+    def toggle_analysis(self):  # F4: silnik UCI analizuje bieżącą pozycję, nie wykonując ruchów
+        if self.analyser is None:
+            self.analyser = UciEngineProcess(self.uci_command or DEFAULT_ANALYSER, parent=self)
+            self.analyser.info_signal.connect(self.update_engine_info)
+            self.update_analysis()
+        else:
+            self.analyser.close()
+            self.analyser = None
+            self.engine_label.setText("")
+
+    def position_changed(self):  # Po każdej zmianie pozycji na planszy (ruch, skok w historii, nowa partia)
+        self.update_analysis()
+        self.update_archive_games()
+
+    def update_analysis(self):
+        if self.analyser is None:
+            return
+        if self.game_over:
+            self.analyser.stop()
+        else:
+            self.analyser.analyse(self.position)
+
+    def play_engine_move(self, move, key):
+        if self.game_over or key != self.position.key or self.current_player != self.engine_color:
+            return  # Pozycja zmieniła się w trakcie wyszukiwania
+        row, col = row_col_from_square(move_from(move))
+        target_row, target_col = row_col_from_square(move_to(move))
+        item = self.piece_item_at(row, col)
+        self.request_move(item, target_row, target_col, move_promotion(move))
+
+    def connect_server(self, host, port, game_id=None, seat='both'):  # Nowa partia (albo dołączenie do partii game_id) na serwerze
+        self.connection = ServerConnection(self)
+        self.connection.started.connect(self.start_server_game)
+        self.connection.moved.connect(self.apply_server_move)
+        self.connection.over.connect(self.finish_server_game)
+        self.connection.error.connect(lambda message: print(f"Serwer: {message}"))
+        self.connection.connect_to(host, port)
+        if game_id is None:
+            self.connection.new_game(self.time_options[self.time_combobox.currentText()], 0, seat)
+        else:
+            self.connection.join(game_id)
+        self.start_button.setEnabled(False)  # Partia i zegary startują na sygnał serwera
+
+    def start_server_game(self, white_ms, black_ms, fen):
+        self.set_game(Game(Position.from_fen(fen)))  # Wynik rozstrzyga serwer, także tablicami końcówek
+        self.game.clock = [round(white_ms / 1000), round(black_ms / 1000)]
+        self.start_button.setEnabled(False)
+        self.update_turn_label()
+        self.start_timer()
+        self.start_engine_if_needed()
+
+    def apply_server_move(self, text, white_ms, black_ms):
+        move = self.position.parse_uci(text)
+        if move is None:
+            print(f"Serwer przysłał nielegalny ruch: {text}")
+            return
+        row, col = row_col_from_square(move_from(move))
+        target_row, target_col = row_col_from_square(move_to(move))
+        self.apply_move(self.piece_item_at(row, col), target_row, target_col, move_promotion(move))
+        self.game.clock = [round(white_ms / 1000), round(black_ms / 1000)]  # Dodatek czasu liczy serwer
+        self.update_turn_label()
+
+    def finish_server_game(self, result, termination):
+        if self.game_over:
+            return
+        self.game.finish(termination, None if result == '1/2-1/2' else WHITE if result == '1-0' else BLACK)
+        self.end_game()
+
+    def shutdown_engine(self):
+        self.engine_worker.stop()
+        self.engine_thread.quit()
+        self.engine_thread.wait()
+        self.engine_worker.close()
+        for process in (self.engine, self.analyser):
+            if isinstance(process, UciEngineProcess):
+                process.close()
+
+    def is_local_side(self, color):  # Czy ten gracz przy planszy prowadzi figury koloru color
+        if color == self.engine_color:
             return False
-        for item in self.scene.items():  # Sprawdź, czy król może się obronić lub zablokować atakującą figurę
-            if isinstance(item, DraggableChessPiece) and item.color == color:
-                for row in range(8):
-                    for col in range(8):
-                        if item.is_valid_move(item.row, item.col, row, col, color):
-                            if not self.is_king_under_attack(color):
-                                return False
+        if self.connection is not None:  # Przy grze przez serwer tylko kolor z przydzielonego miejsca
+            return self.connection.seat in ('both', color.lower())
         return True
 
-    def is_valid_move(self, row, col, target_row, target_col, color):  # Sprawdź, czy król jest szachowany po wykonaniu ruchu
-        king_is_under_attack = self.is_king_under_attack(color)
-        
-        for item in self.scene.items():  # Sprawdź, czy ruch figury na dane pole jest prawidłowy
-            if isinstance(item, DraggableChessPiece) and item.row == row and item.col == col and item.color == color:
-                if not king_is_under_attack:
-                    if not item.can_move_to_position(target_col * self.square_size, target_row * self.square_size):
-                        return False
-               
-                original_row, original_col = item.row, item.col
-                item.set_row_col(target_row, target_col)
-                for piece in self.scene.items():
-                    if isinstance(piece, DraggableChessPiece) and piece.color != color:
-                        if piece.can_capture_piece((target_row, target_col)): # Sprawdź, czy tymczasowy ruch wystawia króla na szach
-                            item.set_row_col(original_row, original_col)  # Przywróć oryginalną pozycję
-                            return False
-                item.set_row_col(original_row, original_col)  # Przywróć oryginalną pozycję
-                return True
-        return False
+    def handle_move_input(self, move_text):  # Zapis ruchu jak w polu tekstowym ("Pawn E2 E4") albo UCI, sprawdzany przez Game.parse_text
+        if not move_text or self.game_over:
+            return
+        if not self.is_local_side(self.current_player):
+            print("Teraz ruch komputera!" if self.current_player == self.engine_color else "Teraz ruch przeciwnika!")
+            return
+        try:
+            move = self.game.parse_text(move_text)
+        except IllegalMoveError as error:
+            print(error)
+            return
+        row, col = row_col_from_square(move_from(move))
+        target_row, target_col = row_col_from_square(move_to(move))
+        log.debug("Position of %s: %s moved to %s", move_text.split()[0], cell_name_from_row_col(row, col),
+                  cell_name_from_row_col(target_row, target_col))
+        self.request_move(self.piece_item_at(row, col), target_row, target_col, move_promotion(move))
+
+    def save_pgn(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save PGN", "", "PGN (*.pgn)",
+                                              options=QFileDialog.DontConfirmOverwrite)  # Partia jest dopisywana, nie nadpisuje pliku
+        if path:
+            self.write_pgn(path)
 
-    def handle_move_input(self):
-        move_text = self.move_input.text()
-        self.move_input.clear()  
-        if move_text:
-            parts = move_text.split()
-            if len(parts) == 3:
-                piece_type = parts[0]  
-                current_position = parts[1]  
-                target_position = parts[2] 
-                if len(current_position) == 2 and len(target_position) == 2:
-                    current_col = ord(current_position[0].upper()) - ord('A')  
-                    current_row = 8 - int(current_position[1])  
-                    target_col = ord(target_position[0].upper()) - ord('A') 
-                    target_row = 8 - int(target_position[1])  
-                    
-                    # Sprawdź, czy ruch jest możliwy dla danej figury
-                    if self.is_valid_move(current_row, current_col, target_row, target_col, self.current_player):
-                        for item in self.scene.items():
-                            if isinstance(item,
-                                          DraggableChessPiece) and item.row == current_row and item.col == current_col:
-                                item.set_row_col(target_row, target_col)
-                                item.setPos(target_col * self.square_size, target_row * self.square_size)
-                                break
-                       
-                        if self.is_checkmate(self.current_player):  # Sprawdź, czy wykonany ruch prowadzi do szacha lub szach-matu
-                            print(f"{self.current_player} jest szachowany matem!")
-                            self.stop_timer() 
-                        elif self.is_king_under_attack(self.current_player):
-                            print(f"{self.current_player} jest szachowany!")
-
-                        self.change_turn()
-                        self.update_turn_label()
-
-                        cell_name_current = cell_name_from_row_col(current_row, current_col)
-                        cell_name_target = cell_name_from_row_col(target_row, target_col)
-                        self.move_history_window.add_move((cell_name_target, item.color, piece_type))
-                        print(f"Position of {item.color} {piece_type}: {cell_name_current} moved to {cell_name_target}")
-                    else:
-                        print("Nieprawidłowy ruch!")
-                else:
-                    print("Nieprawidłowy format pozycji!")
-        print("Wykonano ruch!")
+    def write_pgn(self, path):
+        players = {'White': 'Human', 'Black': 'Human'}
+        if self.engine_color is not None:
+            players[self.engine_color] = 'Computer'
+        with open(path, 'a', encoding='utf-8') as stream:  # Kolejne partie dopisywane są na końcu pliku
+            write_position_game(stream, self.position, {'Event': 'Chess Game', **players}, self.game.result)
+        print(f"Zapisano partię do {path}")
+
+    def load_pgn(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load PGN", "", "PGN (*.pgn)")
+        if path:
+            self.read_pgn(path)
+
+    def read_pgn(self, path, index=0):  # Wczytuje partię numer index i rozgrywa jej ruchy na planszy
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            pgn_game = next((game for number, game in enumerate(read_games(stream)) if number == index), None)
+        if pgn_game is None:
+            print("Brak partii w pliku PGN!")
+            return
+        self.play_pgn_game(pgn_game)
+
+    def play_pgn_game(self, pgn_game):  # False, gdy partia ma nielegalny ruch
+        try:
+            moves = pgn_game.moves()
+        except ValueError as error:
+            print(f"Niepoprawna partia PGN: {error}")
+            return False
+        self.set_game(Game(pgn_game.initial_position(), self.time_options[self.time_combobox.currentText()],
+                           tablebases=self.tablebases), moves)
+        return True
+
+    def load_index(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Index", "", "Position index (*.idx)")
+        if path:
+            self.open_index(path)
+
+    def open_index(self, path):  # Indeks zbudowany przez archive.py build
+        try:
+            self.archive = PositionIndex(path)
+        except (OSError, ValueError) as error:
+            print(f"Nie można wczytać indeksu: {error}")
+            return
+        print(f"Wczytano indeks: {self.archive.game_count} partii, {len(self.archive)} pozycji")
+        self.archive_window.show()
+        self.refresh_archive_games()
+
+    def update_archive_games(self):  # Zapytanie odkładane jest do chwili, gdy pozycja przestanie się zmieniać
+        if self.archive is not None:
+            self.archive_timer.start()
+
+    def refresh_archive_games(self):
+        if self.archive is None or not self.archive_window.isVisible():
+            return  # Po pokazaniu panelu showEvent poprosi o odświeżenie
+        (game_ids, plies), statistics = self.archive.query(self.position)
+        self.archive_window.show_games(self.archive, game_ids, plies, statistics)
+
+    def open_archive_game(self, game_id, ply):  # Partia z archiwum na planszy, ustawiona na pozycji z zapytania
+        if self.connection is not None:
+            print("Partii na serwerze nie można zmienić!")
+            return
+        if self.play_pgn_game(self.archive.read_game(game_id)):
+            self.jump_to_ply(ply)
+
+    def set_game(self, game, moves=()):  # Nowa partia na planszy; ruchy są rozgrywane od jej pozycji początkowej
+        self.stop_timer()
+        self.engine.stop()
+        self.game = game
+        self.move_history_window.reset(game.position, list(game.moves) + list(moves))
+        for move in moves:
+            self.game.play(move)
+        self.redraw_pieces()
+        self.start_button.setEnabled(not self.game_over)
+        self.update_turn_label()
+        self.position_changed()
+        if self.game_over:
+            self.end_game()
+
+    def jump_to_ply(self, ply):  # Pozycja po ply półruchach zapisanej historii; przestawiane są tylko figury z pól zmienionych ruchami pomiędzy
+        history = self.move_history_window.move_history
+        if not 0 <= ply <= len(history) or ply == len(self.game.moves) or self.connection is not None:
+            return  # Partii na serwerze nie można cofać
+        self.engine.stop()
+        changed = set()
+        for move in self.game.seek(ply, history):
+            changed.update(move_squares(move))
+        self.clear_highlights()
+        self.sync_squares(changed)
+        self.move_history_window.select_ply(ply)
+        self.update_turn_label()
+        self.position_changed()
+        if self.game_over:
+            self.end_game()
+        else:
+            self.start_engine_if_needed()
+
+    def side_at_ply(self, ply):
+        return self.position.side_to_move ^ ((len(self.game.moves) - ply) & 1)
+
+    def undo_move(self):  # Przy grze z komputerem cofany jest też jego ruch, żeby znów był ruch człowieka
+        ply = len(self.game.moves) - 1
+        if self.engine_color is not None and ply > 0 and COLOR_NAMES[self.side_at_ply(ply)] == self.engine_color:
+            ply -= 1
+        self.jump_to_ply(ply)
+
+    def redo_move(self):
+        ply = len(self.game.moves) + 1
+        if self.engine_color is not None and ply < len(self.move_history_window.move_history) and \
+                COLOR_NAMES[self.side_at_ply(ply)] == self.engine_color:
+            ply += 1
+        self.jump_to_ply(ply)
+
+    def copy_fen(self):
+        fen = self.position.fen()
+        QApplication.clipboard().setText(fen)
+        print(f"FEN: {fen}")
+
+    def ask_fen(self):
+        fen, accepted = QInputDialog.getText(self, "Load FEN", "FEN:", text=QApplication.clipboard().text().strip() or
+                                             self.position.fen())
+        if accepted and fen.strip():
+            self.load_fen(fen.strip())
+
+    def load_fen(self, fen):  # Ustawia dowolną pozycję; figury na scenie są przestawiane, nie tworzone od nowa
+        if self.connection is not None:
+            print("Partii na serwerze nie można zmienić!")
+            return
+        try:
+            position = Position.from_fen(fen)
+        except ValueError as error:
+            print(error)
+            return
+        self.set_game(Game(position, self.time_options[self.time_combobox.currentText()], tablebases=self.tablebases))
+
+    def redraw_pieces(self):
+        self.clear_highlights()
+        self.draw_pieces()
+
+    def sync_squares(self, squares):  # Dopasowuje figury na podanych polach do modelu pozycji, używając ponownie zdjętych figur
+        mailbox = self.position.mailbox
+        spare = {}  # (kolor, typ) -> figury zdjęte z pól, które się zmieniły
+        wanted = []
+        for sq in squares:
+            piece = mailbox[sq]
+            item = self.square_items[sq]
+            name = (COLOR_NAMES[piece[0]], PIECE_NAMES[piece[1]]) if piece is not None else None
+            if item is not None and (item.color, item.piece_type) == name:
+                continue
+            if item is not None:
+                self.square_items[sq] = None
+                spare.setdefault((item.color, item.piece_type), []).append(item)
+            if piece is not None:
+                wanted.append((sq, piece, name))
+        for sq, (color, piece_type), name in wanted:
+            if spare.get(name):
+                item = spare[name].pop()
+            else:
+                item = DraggableChessPiece(self.piece_pixmap(color, piece_type), self.square_size, self.board_size,
+                                           name[0], name[1], self)
+                self.scene.addItem(item)
+            self.place_item(item, *row_col_from_square(sq))
+        for items in spare.values():
+            for item in items:
+                self.scene.removeItem(item)
 
     def start_game(self):
         self.start_button.setEnabled(False) 
         selected_time = self.time_options[self.time_combobox.currentText()]  
-        self.white_time = selected_time 
-        self.black_time = selected_time 
+        self.game.clock = [selected_time, selected_time] 
         self.start_timer() 
+        self.start_engine_if_needed()
 
     def start_timer(self):
         self.timer.start(1000)  
@@ -321,19 +1081,15 @@ class ChessBoard(QGraphicsView):
         self.timer.stop()  
 
     def update_time(self):
-        if self.current_player == 'White':
-            self.white_time -= 1
-            self.update_turn_label()
-        else:
-            self.black_time -= 1
+        if self.connection is not None:  # Zegary prowadzi serwer - tu tylko odliczanie do jego następnej wiadomości
+            side = self.position.side_to_move
+            self.game.clock[side] = max(0, self.game.clock[side] - 1)
             self.update_turn_label()
-
-        if self.white_time <= 0:
-            print("Czas minął! Czarny gracz wygrywa!")
-            self.stop_timer()
-        elif self.black_time <= 0:
-            print("Czas minął! Biały gracz wygrywa!")
-            self.stop_timer()
+            return
+        flagged = self.game.tick(1)
+        self.update_turn_label()
+        if flagged:
+            self.end_game()
 
     def update_turn_label(self):
         if self.current_player == 'White':
@@ -341,87 +1097,75 @@ class ChessBoard(QGraphicsView):
         else:
             self.turn_label.setText(f"Current Turn: White ({self.white_time} sec), Black ({self.black_time})sec")
 
-    def draw_board(self):
-        colors = [QColor(255, 206, 158), QColor(209, 139, 71)]
-        font = self.font()
-        font.setPixelSize(20) 
+    def draw_board(self):  # Plansza jest warstwą tła (drawBackground) - wystarczy unieważnić jej bufor
+        self.resetCachedContent()
+        self.viewport().update()
 
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+        size = self.square_size
+        painter.setPen(QPen(Qt.black))
         for row in range(8):
             for col in range(8):
-                color = colors[(row + col) % 2]
-                square = QRectF(col * self.square_size, row * self.square_size, self.square_size, self.square_size)
-                self.scene.addRect(square, pen=QPen(Qt.black), brush=color)
+                painter.setBrush(BOARD_COLORS[(row + col) % 2])
+                painter.drawRect(QRectF(col * size, row * size, size, size))
 
-        for col in range(8):
-            col_label = QGraphicsTextItem(chr(ord('A') + col))
-            col_label.setFont(font)
-            col_label.setDefaultTextColor(Qt.black)
-            col_label.setPos(col * self.square_size + self.square_size / 2 - col_label.boundingRect().width() / 2,
-                             -col_label.boundingRect().height() + 5)
-            self.scene.addItem(col_label)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(HIGHLIGHT_COLOR)
+        for sq, capture in self.highlight_squares:
+            square = self.square_rect(sq)
+            if capture:  # Pole z figurą do zbicia - podświetlone całe pole
+                painter.drawRect(square)
+            else:
+                painter.drawEllipse(square.center(), size / 6, size / 6)
 
+        font = self.font()
+        font.setPixelSize(20)
+        painter.setFont(font)
+        painter.setPen(QPen(Qt.black))
+        for col in range(8):
+            painter.drawText(QRectF(col * size, -30, size, 28), Qt.AlignHCenter | Qt.AlignBottom, chr(ord('A') + col))
         for row in range(8):
-            row_label = QGraphicsTextItem(str(8 - row))
-            row_label.setFont(font)
-            row_label.setDefaultTextColor(Qt.black)
-            row_label.setPos(8 * self.square_size + 5,
-                             row * self.square_size + self.square_size / 2 - row_label.boundingRect().height() / 2)
-            self.scene.addItem(row_label)
-
-    def draw_pieces(self):
-        scale_factor = self.square_size / 60 
-        pieces = {
-            (0, 0): ('chess_figures/ro_wh.png', 'White', 'Rook'),
-            (1, 0): ('chess_figures/kni_wh.png', 'White', 'Knight'),
-            (2, 0): ('chess_figures/bis_wh.png', 'White', 'Bishop'),
-            (3, 0): ('chess_figures/q_wh.png', 'White', 'Queen'),
-            (4, 0): ('chess_figures/king_wh.png', 'White', 'King'),
-            (5, 0): ('chess_figures/bis_wh.png', 'White', 'Bishop'),
-            (6, 0): ('chess_figures/kni_wh.png', 'White', 'Knight'),
-            (7, 0): ('chess_figures/ro_wh.png', 'White', 'Rook'),
-
-            (0, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (1, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (2, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (3, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (4, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (5, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (6, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-            (7, 1): ('chess_figures/pa_wh.png', 'White', 'Pawn'),
-
-            (0, 7): ('chess_figures/ro_bl.png', 'Black', 'Rook'),
-            (1, 7): ('chess_figures/kni_bl.png', 'Black', 'Knight'),
-            (2, 7): ('chess_figures/bis_bl.png', 'Black', 'Bishop'),
-            (3, 7): ('chess_figures/q_bl.png', 'Black', 'Queen'),
-            (4, 7): ('chess_figures/king_bl.png', 'Black', 'King'),
-            (5, 7): ('chess_figures/bis_bl.png', 'Black', 'Bishop'),
-            (6, 7): ('chess_figures/kni_bl.png', 'Black', 'Knight'),
-            (7, 7): ('chess_figures/ro_bl.png', 'Black', 'Rook'),
-
-            (0, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (1, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (2, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (3, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (4, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (5, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (6, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-            (7, 6): ('chess_figures/pa_bl.png', 'Black', 'Pawn'),
-        }
-
-        for (col, row), (img_file, color, piece_type) in pieces.items():
-            pixmap = QPixmap(img_file)
-            pixmap = pixmap.scaled(int(pixmap.width() * scale_factor), int(pixmap.height() * scale_factor))
-            item = DraggableChessPiece(pixmap, self.square_size, self.board_size, color, piece_type,
-                                       self) 
-            self.scene.addItem(item)
-            item.setPos(col * self.square_size, row * self.square_size)
-            item.set_row_col(row, col)
-
-    def change_turn(self):
-        if self.current_player == 'White':
-            self.current_player = 'Black'
-        else:
-            self.current_player = 'White'
+            painter.drawText(QRectF(8 * size + 9, row * size, 30, size), Qt.AlignLeft | Qt.AlignVCenter, str(8 - row))
+
+    def paintEvent(self, event):  # Licznik klatek i czas rysowania dla nakładki F3
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paint_count += 1
+        self.frame_times.append((start, time.perf_counter() - start))
+
+    def toggle_render_stats(self):
+        if self.stats_label.isVisible():
+            self.stats_timer.stop()
+            self.stats_label.hide()
+            return
+        self.paint_count = 0
+        self.frame_times.clear()
+        self.update_render_stats()
+        self.stats_label.show()
+        self.stats_timer.start(250)
+
+    def toggle_metrics(self):  # F5: pomiary czasu (instrument.py); raport JSON zapisywany przy wyjściu
+        print("Pomiary czasu włączone" if METRICS.toggle() else "Pomiary czasu wyłączone")
+
+    def toggle_profile(self):  # F6: profilowanie wyłączone -> cProfile -> próbkowanie stosu -> wyłączone
+        mode = METRICS.next_profile_mode()
+        print(f"Profilowanie: {mode}" if mode else "Profilowanie wyłączone")
+
+    def update_render_stats(self):
+        now = time.perf_counter()
+        recent = [duration for start, duration in self.frame_times if now - start <= 1.0]
+        average = sum(recent) / len(recent) * 1000 if recent else 0.0
+        worst = max(recent) * 1000 if recent else 0.0
+        self.stats_label.setText(f"paints {self.paint_count}  fps {len(recent)}  "
+                                 f"frame {average:.2f} ms (max {worst:.2f} ms)")
+        self.stats_label.adjustSize()
+
+    def piece_pixmap(self, color, piece_type):
+        return SPRITES.pixmap(PIECE_IMAGES[color][piece_type], self.square_size)
+
+    def draw_pieces(self):  # Figury na scenie odzwierciedlają aktualny model pozycji
+        self.sync_squares(range(64))
 
     #def update_turn_label(self):
      #   self.turn_label.setText(f"Current Turn: {self.current_player}")
@@ -432,9 +1176,17 @@ class ChessBoard(QGraphicsView):
         self.board_size = min_dimension - 50  # Rozmiar planszy pomniejszony o 50 pikseli
         self.square_size = self.board_size / 8
         self.setSceneRect(0, 0, self.board_size, self.board_size)
-        self.scene.clear()
         self.draw_board()
-        self.draw_pieces()
+        self.relayout_pieces()
+
+    def relayout_pieces(self):  # Istniejące figury dostają nowy rozmiar i pozycję - bez czytania obrazów z dysku
+        self.clear_highlights()
+        for item in self.square_items:
+            if item is not None:
+                item.square_size = self.square_size
+                item.board_size = self.board_size
+                item.setPixmap(self.piece_pixmap(COLOR_NAMES.index(item.color), PIECE_NAMES.index(item.piece_type)))
+                self.place_item(item, item.row, item.col)
 
 
 class ChessGame(QWidget):
@@ -446,51 +1198,90 @@ class ChessGame(QWidget):
         self.move_input = QLineEdit()  
         self.move_input.returnPressed.connect(self.handle_move_input) 
         layout.addWidget(self.move_history_window)
+        layout.addWidget(self.board.archive_window)
         layout.addWidget(self.board.turn_label)
         layout.addWidget(self.board.start_button)
+        layout.addWidget(self.board.save_pgn_button)
+        layout.addWidget(self.board.load_pgn_button)
+        layout.addWidget(self.board.undo_button)
+        layout.addWidget(self.board.redo_button)
+        layout.addWidget(self.board.copy_fen_button)
+        layout.addWidget(self.board.load_fen_button)
+        layout.addWidget(self.board.load_index_button)
         layout.addWidget(self.board.time_combobox)
+        layout.addWidget(self.board.opponent_combobox)
+        layout.addWidget(self.board.engine_label)
         layout.addWidget(self.board)
         layout.addWidget(self.move_input) 
         self.setLayout(layout)
         self.show()
 
+    def closeEvent(self, event):
+        self.board.shutdown_engine()
+        if self.board.connection is not None:
+            self.board.connection.close()
+        super().closeEvent(event)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
             self.handle_move_input()
+        elif event.key() == Qt.Key_F3:
+            self.board.toggle_render_stats()
+        elif event.key() == Qt.Key_F4:
+            self.board.toggle_analysis()
+        elif event.key() == Qt.Key_F5:
+            self.board.toggle_metrics()
+        elif event.key() == Qt.Key_F6:
+            self.board.toggle_profile()
+        elif event.matches(QKeySequence.Undo):
+            self.board.undo_move()
+        elif event.matches(QKeySequence.Redo):
+            self.board.redo_move()
         else:
             super().keyPressEvent(event)
 
     def handle_move_input(self):
         move_text = self.move_input.text()
         self.move_input.clear() 
-        if move_text:
-            parts = move_text.split()
-            if len(parts) == 3:
-                piece_type = parts[0]  
-                current_position = parts[1]  
-                target_position = parts[2]  
-                if len(current_position) == 2 and len(target_position) == 2:
-                    current_col = ord(current_position[0].upper()) - ord('A')  
-                    current_row = 8 - int(current_position[1]) 
-                    target_col = ord(target_position[0].upper()) - ord('A')  
-                    target_row = 8 - int(target_position[1])  
-                    
-                    for item in self.board.scene.items(): # Znajdź pionek na podanej pozycji
-                        if isinstance(item, DraggableChessPiece) and item.row == current_row and item.col == current_col:
-                            item.set_row_col(target_row, target_col) # Jeśli znaleziono pionka na danej pozycji, wykonaj ruch
-                            item.setPos(target_col * self.board.square_size, target_row * self.board.square_size)
-                            self.board.change_turn()
-                            self.board.update_turn_label()
-                            cell_name_current = cell_name_from_row_col(current_row, current_col)
-                            cell_name_target = cell_name_from_row_col(target_row, target_col)
-                            self.move_history_window.add_move((cell_name_target, item.color, piece_type))
-                            print(f"Position of {item.color} {piece_type}: {cell_name_current} moved to {cell_name_target}")
-                            return
-        print("Wykonano ruch!")
+        self.board.handle_move_input(move_text)
+
 
+# Funkcje mierzone przez instrument.METRICS; bez włączonych pomiarów wywoływane są oryginały. Mierzone są
+# tylko wywołania z wątku GUI (Game i plansza) - silnik woła Position bezpośrednio i nie płaci za pomiary
+METRICS.hook(Game, 'update_legal_moves', 'movegen.legal_moves')
+METRICS.hook(Game, 'find_move', 'legality.find_move')
+METRICS.hook(Game, 'parse_text', 'legality.parse_text')
+METRICS.hook(ChessBoard, 'legal_targets', 'legality.legal_targets')
+METRICS.hook(Game, 'update_result', 'check.game_result')
+METRICS.hook(ChessBoard, 'is_king_under_attack', 'check.is_king_under_attack')
+METRICS.hook(ChessBoard, 'paintEvent', 'render.board')
+METRICS.hook(ChessBoard, 'sync_squares', 'render.sync_squares')
+METRICS.hook(EvaluationGraph, 'paintEvent', 'render.evaluation_graph')
+METRICS.hook(DraggableChessPiece, 'mousePressEvent', 'event.mouse_press')
+METRICS.hook(DraggableChessPiece, 'mouseReleaseEvent', 'event.mouse_release')
+METRICS.hook(ChessGame, 'keyPressEvent', 'event.key_press')
+METRICS.hook(ChessBoard, 'handle_move_input', 'event.move_input')
+METRICS.hook(ChessBoard, 'apply_move', 'event.apply_move')
+METRICS.hook(ChessBoard, 'jump_to_ply', 'event.jump_to_ply')
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Szachy z planszą PyQt5")
+    parser.add_argument('--connect', metavar='HOST:PORT', help="graj przez serwer partii (server.py)")
+    parser.add_argument('--join', type=int, metavar='ID', help="dołącz do partii czekającej na serwerze")
+    parser.add_argument('--color', choices=('white', 'black', 'both'), default='both', help="kolor w nowej partii na serwerze")
+    parser.add_argument('--uci', metavar='COMMAND', help="zewnętrzny silnik UCI jako przeciwnik i do analizy (F4)")
+    parser.add_argument('--ponder', action='store_true', help="silnik UCI liczy także na czasie przeciwnika")
+    parser.add_argument('--index', metavar='PATH', help="indeks pozycji archiwum partii (archive.py build)")
+    args, qt_args = parser.parse_known_args()
+    configure_from_environment()
+    app = QApplication(sys.argv[:1] + qt_args)
     window = ChessGame()
+    if args.uci:
+        window.board.use_uci_engine(shlex.split(args.uci), args.ponder)
+    if args.index:
+        window.board.open_index(args.index)
+    if args.connect:
+        host, _, port = args.connect.rpartition(':')
+        window.board.connect_server(host or 'localhost', int(port), args.join, args.color)
     sys.exit(app.exec_())
@@ -0,0 +1,421 @@
+"""
+Wbudowany silnik szachowy: iteracyjne pogłębianie, alfa-beta (PVS) z tablicą transpozycji,
+porządkowanie ruchów (ruch z tablicy, MVV-LVA, ruchy zabójcze) i przeszukiwanie spoczynkowe.
+W prostych końcówkach (tablebase.py) gra idealnie według tablic końcówek.
+
+Moduł nie zależy od PyQt5 - GUI uruchamia wyszukiwanie w osobnym wątku.
+"""
+import threading
+import time
+
+from position import WHITE, BLACK, PAWN, ROOK, QUEEN, PROMOTION, EN_PASSANT, iter_squares, popcount, move_uci, \
+    move_promotion
+from tablebase import WIN, LOSS, load_default
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 30000
+MATE_BOUND = MATE_SCORE - 1000  # Oceny powyżej tej wartości oznaczają mata w znanej liczbie ruchów
+INFINITE = 31000
+MAX_PLY = 100
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Tablice figura-pole (Simplified Evaluation Function), zapisane od strony białych: pierwszy wiersz to ósmy rząd
+PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+
+def _piece_square_tables(king_table):
+    tables = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, king_table)
+    # Dla białych pole sq odpowiada wierszowi sq ^ 56 w zapisie powyżej, dla czarnych tablica jest odbita
+    return ([[PIECE_VALUES[pt] + tables[pt][sq ^ 56] for sq in range(64)] for pt in range(6)],
+            [[PIECE_VALUES[pt] + tables[pt][sq] for sq in range(64)] for pt in range(6)])
+
+
+PIECE_SQUARE = _piece_square_tables(KING_TABLE)
+PIECE_SQUARE_ENDGAME = _piece_square_tables(KING_ENDGAME_TABLE)
+
+
+def evaluate(position):
+    """
+    Ocena statyczna (materiał + tablice figura-pole) z punktu widzenia strony na posunięciu.
+    """
+    white, black = position.pieces
+    endgame = not (white[QUEEN] or black[QUEEN]) or \
+        popcount(white[QUEEN] | white[ROOK] | black[QUEEN] | black[ROOK]) <= 2
+    tables = PIECE_SQUARE_ENDGAME if endgame else PIECE_SQUARE
+    score = 0
+    for piece_type in range(6):
+        table = tables[WHITE][piece_type]
+        for sq in iter_squares(white[piece_type]):
+            score += table[sq]
+        table = tables[BLACK][piece_type]
+        for sq in iter_squares(black[piece_type]):
+            score -= table[sq]
+    return score if position.side_to_move == WHITE else -score
+
+
+def allocate_time(remaining, increment=0.0, moves_to_go=None):
+    """
+    Zwraca (miękki, twardy) limit czasu w sekundach na jeden ruch.
+    Bez kontroli co N ruchów zakładamy, że do końca partii zostało około 30 ruchów.
+    """
+    moves_to_go = moves_to_go or 30
+    reserve = min(1.0, remaining * 0.05)  # Zapas na opóźnienia GUI, żeby nie przegrać na czas
+    usable = max(remaining - reserve, 0.01)
+    soft = usable / moves_to_go + increment * 0.75
+    hard = min(usable * 0.5, soft * 4)
+    return min(soft, hard), hard
+
+
+class SearchLimits:
+    def __init__(self, depth=None, movetime=None, white_time=None, black_time=None, white_increment=0.0,
+                 black_increment=0.0, moves_to_go=None, nodes=None):
+        self.depth = depth
+        self.movetime = movetime
+        self.white_time = white_time
+        self.black_time = black_time
+        self.white_increment = white_increment
+        self.black_increment = black_increment
+        self.moves_to_go = moves_to_go
+        self.nodes = nodes
+
+    def time_budget(self, side):
+        """
+        (miękki, twardy) limit czasu dla strony side albo (None, None) gdy czas nie jest ograniczony.
+        """
+        if self.movetime is not None:
+            return self.movetime, self.movetime
+        remaining = self.white_time if side == WHITE else self.black_time
+        if remaining is None:
+            return None, None
+        increment = self.white_increment if side == WHITE else self.black_increment
+        return allocate_time(remaining, increment, self.moves_to_go)
+
+
+def tablebase_score(result, plies, ply):  # Wynik z tablic końcówek w skali ocen mata liczonych od korzenia
+    if result == WIN:
+        return MATE_SCORE - ply - plies
+    if result == LOSS:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+class SearchStopped(Exception):
+    pass
+
+
+class Search:
+    def __init__(self, transposition_table=None, hash_mb=16, stop_event=None, tablebases=None):
+        """
+        stop_event można przekazać z zewnątrz (np. multiprocessing.Event wspólny dla kilku procesów).
+        Wyszukiwanie nigdy go nie czyści - robi to wywołujący przed search, zanim stop może nadejść
+        z innego wątku (inaczej wcześniejszy stop zostałby zgubiony). Domyślnie używane są tablice końcówek
+        z tablebases.bin, jeśli plik został wygenerowany.
+        """
+        self.tt = transposition_table if transposition_table is not None else TranspositionTable(hash_mb)
+        self.tablebases = tablebases if tablebases is not None else load_default()
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.completed_depth = 0
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.pv = [[] for _ in range(MAX_PLY + 1)]
+        self.deadline = None
+        self.soft_deadline = None  # Po tej chwili nie zaczynamy kolejnej iteracji
+        self.pending_limits = None  # (SearchLimits, strona) z innego wątku, np. po ponderhit; czyści właściciel przed search
+        self.node_limit = None
+        self.start_time = 0.0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def set_limits(self, limits, side):
+        """
+        Nowe limity czasu liczone od teraz - można wywołać z innego wątku, także zanim wyszukiwanie
+        wystartuje; wyszukiwanie odczytuje je w pętli pogłębiania i przy sprawdzaniu limitów.
+        """
+        self.pending_limits = (limits, side)
+
+    def apply_pending_limits(self):
+        pending, self.pending_limits = self.pending_limits, None
+        if pending is None:
+            return
+        limits, side = pending
+        now = time.perf_counter()
+        soft_limit, hard_limit = limits.time_budget(side)
+        self.deadline = now + hard_limit if hard_limit is not None else None
+        self.soft_deadline = now + soft_limit * 0.6 if soft_limit is not None else None
+
+    def search(self, position, limits, info_callback=None, start_depth=1):
+        """
+        Iteracyjne pogłębianie. Zwraca (najlepszy ruch, ocena); info_callback dostaje słownik
+        z głębokością, oceną, liczbą węzłów, szybkością i główną wariantą po każdej iteracji.
+        """
+        self.nodes = 0
+        self.completed_depth = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.tt.new_search()
+        self.start_time = time.perf_counter()
+        soft_limit, hard_limit = limits.time_budget(position.side_to_move)
+        self.deadline = self.start_time + hard_limit if hard_limit is not None else None
+        # Następna iteracja po 60% miękkiego limitu i tak by się nie zmieściła
+        self.soft_deadline = self.start_time + soft_limit * 0.6 if soft_limit is not None else None
+        self.apply_pending_limits()
+        self.node_limit = limits.nodes
+        max_depth = min(limits.depth or MAX_PLY, MAX_PLY)
+
+        root_moves = position.legal_moves()
+        if not root_moves:
+            return 0, (-MATE_SCORE if position.checkers else 0)
+        if self.tablebases is not None:
+            hit = self.tablebases.best_move(position)
+            if hit is not None:  # Pozycja z tablic końcówek - ruch idealny bez przeszukiwania
+                move, result, plies = hit
+                score = tablebase_score(result, plies, 0)
+                self.pv[0] = [move]
+                self.completed_depth = 1
+                if info_callback is not None:
+                    info_callback(self.info(1, score, time.perf_counter() - self.start_time))
+                return move, score
+        best_move, best_score = root_moves[0], 0
+        root_depth = len(position.move_stack)
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self.negamax(position, depth, -INFINITE, INFINITE, 0)
+            except SearchStopped:
+                while len(position.move_stack) > root_depth:
+                    position.unmake_move()
+                if self.pv[0] and self.pv[0][0] in root_moves:  # Częściowo przeszukana iteracja też może poprawić ruch
+                    best_move = self.pv[0][0]
+                break
+            best_move, best_score = self.pv[0][0], score
+            self.completed_depth = depth
+            elapsed = time.perf_counter() - self.start_time
+            if info_callback is not None:
+                info_callback(self.info(depth, score, elapsed))
+            if abs(score) >= MATE_BOUND and depth > MATE_SCORE - abs(score):
+                break
+            self.apply_pending_limits()
+            if self.soft_deadline is not None and time.perf_counter() > self.soft_deadline:
+                break
+            if self.stop_event.is_set():
+                break
+        return best_move, best_score
+
+    def info(self, depth, score, elapsed):
+        info = {'depth': depth, 'score': score, 'nodes': self.nodes, 'time': elapsed,
+                'nps': int(self.nodes / elapsed) if elapsed > 0 else 0, 'pv': [move_uci(m) for m in self.pv[0]],
+                'hashfull': self.tt.hashfull()}
+        if abs(score) >= MATE_BOUND:
+            info['mate'] = (MATE_SCORE - abs(score) + 1) // 2 * (1 if score > 0 else -1)
+        return info
+
+    def check_limits(self):
+        if self.pending_limits is not None:
+            self.apply_pending_limits()
+        if self.stop_event.is_set() or (self.deadline is not None and time.perf_counter() > self.deadline) or \
+                (self.node_limit is not None and self.nodes >= self.node_limit):
+            self.stop_event.set()
+            raise SearchStopped()
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self.check_limits()
+        self.pv[ply] = []
+        if ply and (position.halfmove_clock >= 100 or position.repetition_count() >= 2):
+            return 0
+        if ply and self.tablebases is not None and popcount(position.all_occupied) <= 4:
+            hit = self.tablebases.probe(position)
+            if hit is not None:
+                return tablebase_score(hit[0], hit[1], ply)
+        in_check = position.checkers != 0
+        if in_check:
+            depth += 1  # Przedłużenie przy szachu
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(position, alpha, beta, ply)
+
+        key = position.key
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, bound, tt_score = entry
+            if ply and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if bound == EXACT or (bound == LOWER_BOUND and tt_score >= beta) or \
+                        (bound == UPPER_BOUND and tt_score <= alpha):
+                    return tt_score
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        self.order_moves(position, moves, tt_move, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITE
+        best_move = 0
+        for index, move in enumerate(moves):
+            position.make_move(move)
+            if index == 0:
+                score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:  # Główna warianta już znaleziona - pozostałe ruchy sprawdzamy wąskim oknem
+                score = -self.negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        if position.mailbox[(move >> 6) & 63] is None and move >> 14 != PROMOTION:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                        break
+
+        if best_score >= beta:
+            bound = LOWER_BOUND
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        self.tt.store(key, best_move, depth, bound, score_to_tt(best_score, ply))
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self.check_limits()
+        self.pv[ply] = []
+        in_check = position.checkers != 0
+        if not in_check:
+            stand_pat = evaluate(position)
+            if stand_pat >= beta or ply >= MAX_PLY:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        moves = position.legal_moves()
+        if in_check:
+            if not moves:
+                return -MATE_SCORE + ply
+            if ply >= MAX_PLY:
+                return evaluate(position)
+        else:
+            mailbox = position.mailbox
+            moves = [move for move in moves if mailbox[(move >> 6) & 63] is not None or move >> 14 in (PROMOTION, EN_PASSANT)]
+        self.order_moves(position, moves, 0, ply)
+        best_score = alpha if not in_check else -INFINITE
+        for move in moves:
+            position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        break
+        return best_score
+
+    def order_moves(self, position, moves, tt_move, ply):
+        mailbox = position.mailbox
+        killer_1, killer_2 = self.killers[ply]
+
+        def move_score(move):
+            if move == tt_move:
+                return 1000000
+            victim = mailbox[(move >> 6) & 63]
+            flag = move >> 14
+            if victim is not None or flag == EN_PASSANT:  # MVV-LVA: najcenniejsza ofiara, najtańszy napastnik
+                victim_value = PIECE_VALUES[victim[1]] if victim is not None else PIECE_VALUES[PAWN]
+                return 100000 + victim_value * 10 - PIECE_VALUES[mailbox[move & 63][1]] // 100
+            if flag == PROMOTION:
+                return 90000 + PIECE_VALUES[move_promotion(move)]
+            if move == killer_1:
+                return 80000
+            if move == killer_2:
+                return 70000
+            return 0
+
+        moves.sort(key=move_score, reverse=True)
+
+
+def score_to_tt(score, ply):  # Oceny matowe zapisujemy względem bieżącej pozycji, a nie korzenia
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
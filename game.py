@@ -0,0 +1,185 @@
+"""
+Partia szachów bez GUI: pozycja, zegary i wynik.
+
+Moduł nie importuje PyQt5, więc można go używać w procesach roboczych i skryptach
+(np. selfplay.py); okno ChessGame jest tylko cienką nakładką na tę klasę.
+"""
+from position import Position, WHITE, PAWN, QUEEN, KING, PIECE_NAMES, parse_square
+from tablebase import WIN, DRAW
+
+CHECKMATE = 'checkmate'
+STALEMATE = 'stalemate'
+THREEFOLD_REPETITION = 'threefold repetition'
+FIFTY_MOVES = 'fifty-move rule'
+INSUFFICIENT_MATERIAL = 'insufficient material'
+TIME_FORFEIT = 'time forfeit'
+TABLEBASE = 'tablebase'  # Wynik rozstrzygnięty tablicami końcówek (wymuszony mat albo remis)
+RESIGNATION = 'resignation'
+
+TERMINATIONS = (None, CHECKMATE, STALEMATE, THREEFOLD_REPETITION, FIFTY_MOVES, INSUFFICIENT_MATERIAL, TIME_FORFEIT,
+                TABLEBASE, RESIGNATION)
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+
+
+class IllegalMoveError(ValueError):
+    pass
+
+
+class Game:
+    def __init__(self, position=None, base_time=None, increment=0, tablebases=None):
+        """
+        base_time - czas każdego gracza w sekundach (None oznacza partię bez zegara); z tablicami
+        końcówek (tablebase.Tablebases) partia kończy się od razu, gdy wynik jest przesądzony.
+        """
+        self.tablebases = tablebases
+        self.tablebase_hit = None  # (wynik, półruchy do mata) z ostatniego rozstrzygnięcia tablicami
+        self.position = position if position is not None else Position.starting()
+        self.legal_moves = None  # Legalne ruchy liczone raz na pozycję
+        self.update_legal_moves()
+        self.clock = [base_time, base_time]
+        self.increment = increment
+        self.result = '*'
+        self.termination = None
+        self.update_result()
+
+    @property
+    def side_to_move(self):
+        return self.position.side_to_move
+
+    @property
+    def moves(self):
+        return self.position.move_stack
+
+    def is_over(self):
+        return self.result != '*'
+
+    def update_legal_moves(self):
+        self.legal_moves = self.position.legal_moves()
+
+    def find_move(self, from_sq, to_sq, promotion=QUEEN):
+        return self.position.find_move(from_sq, to_sq, promotion, self.legal_moves)
+
+    def play(self, move):
+        if self.is_over():
+            raise IllegalMoveError("Partia jest już zakończona")
+        if move not in self.legal_moves:
+            raise IllegalMoveError(f"Nielegalny ruch: {move}")
+        mover = self.position.side_to_move
+        self.position.make_move(move)
+        if self.clock[mover] is not None:
+            self.clock[mover] += self.increment
+        self.update_legal_moves()
+        self.update_result()
+        return move
+
+    def undo(self):
+        """
+        Cofa ostatni ruch (zegary nie są cofane); zwraca cofnięty ruch.
+        """
+        move = self.position.unmake_move()
+        self.update_legal_moves()
+        self.result = '*'
+        self.termination = None
+        self.tablebase_hit = None
+        self.update_result()
+        return move
+
+    def seek(self, ply, history):
+        """
+        Przechodzi do pozycji po ply półruchach partii history (wszystkie ruchy od pozycji początkowej,
+        także dalsze niż bieżąca pozycja) cofając i wykonując tylko ruchy pomiędzy. Legalne ruchy i wynik
+        liczone są raz, zegary się nie zmieniają; zwraca cofnięte i wykonane ruchy.
+        """
+        position = self.position
+        changed = []
+        while len(position.move_stack) > ply:
+            changed.append(position.unmake_move())
+        while len(position.move_stack) < ply:
+            move = history[len(position.move_stack)]
+            position.make_move(move)
+            changed.append(move)
+        self.update_legal_moves()
+        self.result = '*'
+        self.termination = None
+        self.tablebase_hit = None
+        self.update_result()
+        return changed
+
+    def play_uci(self, text):
+        move = self.position.parse_uci(text)
+        if move is None:
+            raise IllegalMoveError(f"Nielegalny ruch: {text}")
+        return self.play(move)
+
+    def parse_text(self, text):
+        """
+        Ruch zapisany w UCI ("e2e4", "e7e8n") albo jak w polu tekstowym GUI ("Pawn E2 E4", "Pawn E7 E8 Knight").
+        """
+        parts = text.split()
+        if len(parts) == 1:
+            move = self.position.parse_uci(parts[0])
+        elif len(parts) in (3, 4) and parts[0].capitalize() in PIECE_NAMES:
+            from_sq, to_sq = parse_square(parts[1]), parse_square(parts[2])
+            promotion = parts[3].capitalize() if len(parts) == 4 else PIECE_NAMES[QUEEN]
+            if from_sq is None or to_sq is None or promotion not in PIECE_NAMES[PAWN + 1:KING]:
+                raise IllegalMoveError(f"Niepoprawny zapis ruchu: {text}")
+            piece = self.position.mailbox[from_sq]
+            if piece is None or PIECE_NAMES[piece[1]] != parts[0].capitalize():  # Nazwa figury musi zgadzać się z planszą
+                raise IllegalMoveError(f"Na polu {parts[1].upper()} nie ma figury {parts[0]}")
+            move = self.find_move(from_sq, to_sq, PIECE_NAMES.index(promotion))
+        else:
+            raise IllegalMoveError(f"Niepoprawny zapis ruchu: {text}")
+        if move is None or move not in self.legal_moves:
+            raise IllegalMoveError(f"Nielegalny ruch: {text}")
+        return move
+
+    def play_text(self, text):
+        return self.play(self.parse_text(text))
+
+    def resign(self, color):
+        if self.is_over():
+            raise IllegalMoveError("Partia jest już zakończona")
+        self.finish(RESIGNATION, color ^ 1)
+
+    def update_result(self):
+        position = self.position
+        if not self.legal_moves:
+            if position.checkers:
+                self.finish(CHECKMATE, position.side_to_move ^ 1)
+            else:
+                self.finish(STALEMATE)
+        elif position.is_repetition(3):
+            self.finish(THREEFOLD_REPETITION)
+        elif position.is_fifty_moves():
+            self.finish(FIFTY_MOVES)
+        elif position.is_insufficient_material():
+            self.finish(INSUFFICIENT_MATERIAL)
+        elif self.tablebases is not None:
+            hit = self.tablebases.probe(position)
+            if hit is not None:
+                self.tablebase_hit = hit
+                if hit[0] == DRAW:
+                    self.finish(TABLEBASE)
+                else:
+                    self.finish(TABLEBASE, position.side_to_move if hit[0] == WIN else position.side_to_move ^ 1)
+
+    def finish(self, termination, winner=None):
+        self.termination = termination
+        if winner is None:
+            self.result = '1/2-1/2'
+        else:
+            self.result = '1-0' if winner == WHITE else '0-1'
+
+    def tick(self, seconds):
+        """
+        Odejmuje czas stronie na posunięciu; zwraca True gdy jej czas się skończył.
+        """
+        side = self.position.side_to_move
+        if self.is_over() or self.clock[side] is None:
+            return False
+        self.clock[side] -= seconds
+        if self.clock[side] <= 0:
+            self.clock[side] = 0
+            self.finish(TIME_FORFEIT, side ^ 1)
+            return True
+        return False
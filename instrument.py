@@ -0,0 +1,311 @@
+"""
+Pomiary czasu i profilowanie: liczniki z histogramami dla generowania ruchów, sprawdzania
+legalności, wykrywania szacha, rysowania i obsługi zdarzeń.
+
+Wyłączone pomiary nic nie kosztują: mierzone funkcje (METRICS.hook) są podmieniane na wersje
+z pomiarem dopiero przy włączeniu i przywracane przy wyłączeniu, więc bez pomiarów wywoływane
+są oryginały. Komunikaty diagnostyczne idą przez logging (logger "chess") z argumentami
+formatowanymi dopiero wtedy, gdy poziom DEBUG jest włączony.
+
+Zmienne środowiskowe:
+    CHESS_METRICS=1              pomiary od uruchomienia (w GUI przełączane klawiszem F5)
+    CHESS_PROFILE=cprofile       do tego cProfile; "sample" - próbkowanie stosu głównego wątku (F6)
+    CHESS_METRICS_REPORT=PATH    raport JSON zapisywany przy wyjściu (domyślnie chess_metrics.json)
+    CHESS_LOG=DEBUG              poziom logowania
+
+Użycie:
+    CHESS_METRICS=1 CHESS_PROFILE=sample python chess_game.py
+    python instrument.py chess_metrics.json      # podsumowanie zapisanego raportu
+"""
+import argparse
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = (None, 'cprofile', 'sample')
+DEFAULT_REPORT = 'chess_metrics.json'
+SAMPLE_INTERVAL = 0.002  # Sekundy między próbkami stosu
+REPORT_FUNCTIONS = 30  # Tyle najdroższych funkcji trafia do raportu profilu
+
+
+class Timer:  # Liczba wywołań, suma, minimum, maksimum i histogram czasów (kubełki potęg dwójki w mikrosekundach)
+    def __init__(self, name):  # Bez blokady - mierzone funkcje powinny być wołane z jednego wątku (GUI)
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * 40  # Kubełek k: czasy poniżej 2**k µs
+
+    def record(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), len(self.buckets) - 1)
+        self.count += 1
+        self.total += seconds
+        self.buckets[bucket] += 1
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """
+        Górna granica kubełka (µs), do którego sięga dany ułamek wywołań.
+        """
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return 2 ** bucket
+        return 0
+
+    def report(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_us': round(self.total / self.count * 1e6, 2) if self.count else 0,
+            'min_us': round((self.min or 0) * 1e6, 2),
+            'max_us': round(self.max * 1e6, 2),
+            'p50_us': self.percentile(0.5),
+            'p90_us': self.percentile(0.9),
+            'p99_us': self.percentile(0.99),
+            'histogram_us': {f"<{2 ** bucket}": count for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+def _timed(function, timer):
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.record(perf_counter() - start)
+    return wrapper
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+
+class Sampler(threading.Thread):  # Profil próbkowany: co SAMPLE_INTERVAL zapisuje stos wybranego wątku
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.own = Counter()  # Funkcja na szczycie stosu
+        self.inclusive = Counter()  # Funkcja gdziekolwiek na stosie
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.own[_frame_name(frame)] += 1
+            seen = set()
+            while frame is not None:
+                name = _frame_name(frame)
+                if name not in seen:  # Rekurencja liczy się raz na próbkę
+                    seen.add(name)
+                    self.inclusive[name] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def report(self):
+        def top(counter):
+            return [{'function': name, 'samples': count, 'fraction': round(count / self.samples, 4)}
+                    for name, count in counter.most_common(REPORT_FUNCTIONS)]
+        return {'mode': 'sample', 'interval_ms': self.interval * 1000, 'samples': self.samples,
+                'top_self': top(self.own) if self.samples else [],
+                'top_inclusive': top(self.inclusive) if self.samples else []}
+
+
+def _cprofile_report(profiler):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:REPORT_FUNCTIONS]
+    return {'mode': 'cprofile', 'functions': [
+        {'function': f"{os.path.basename(path)}:{line}({name})", 'calls': calls, 'self_ms': round(own * 1000, 3),
+         'cumulative_ms': round(cumulative * 1000, 3)}
+        for (path, line, name), (_, calls, own, cumulative, _) in rows]}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.timers = {}
+        self.hooks = []  # (klasa lub moduł, nazwa atrybutu, oryginał, Timer)
+        self.profile_mode = None
+        self.profiler = None  # cProfile.Profile albo Sampler
+        self.profiles = []  # Raporty zakończonych sesji profilowania
+        self.enabled_time = 0.0
+        self.enabled_since = None
+
+    def timer(self, name):
+        if name not in self.timers:
+            self.timers[name] = Timer(name)
+        return self.timers[name]
+
+    def hook(self, owner, attribute, name):
+        """
+        Rejestruje funkcję (albo właściwość) owner.attribute do pomiaru pod nazwą name. Podmieniany jest
+        atrybut klasy, więc mierzone są wywołania ze wszystkich wątków - rejestrować należy funkcje GUI,
+        nie używane przez wyszukiwanie silnika.
+        """
+        original = owner.__dict__[attribute]
+        self.hooks.append((owner, attribute, original, self.timer(name)))
+        if self.enabled:
+            self._install(owner, attribute, original, self.timers[name])
+
+    @staticmethod
+    def _install(owner, attribute, original, timer):
+        if isinstance(original, property):
+            setattr(owner, attribute, property(_timed(original.fget, timer), original.fset, original.fdel, original.__doc__))
+        else:
+            setattr(owner, attribute, _timed(original, timer))
+
+    def enable(self):
+        if self.enabled:
+            return
+        for owner, attribute, original, timer in self.hooks:
+            self._install(owner, attribute, original, timer)
+        self.enabled = True
+        self.enabled_since = time.perf_counter()
+        logging.getLogger('chess').info("Pomiary czasu włączone (%d funkcji)", len(self.hooks))
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for owner, attribute, original, _ in self.hooks:
+            setattr(owner, attribute, original)
+        self.enabled = False
+        self.enabled_time += time.perf_counter() - self.enabled_since
+        self.enabled_since = None
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def start_profile(self, mode):
+        """
+        Uruchamia profilowanie głównego wątku: 'cprofile' albo 'sample'; None zatrzymuje.
+        """
+        self.stop_profile()
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif mode == 'sample':
+            self.profiler = Sampler(threading.main_thread().ident)
+            self.profiler.start()
+        elif mode is not None:
+            raise ValueError(f"Nieznany tryb profilowania: {mode}")
+        self.profile_mode = mode
+
+    def stop_profile(self):
+        if self.profiler is None:
+            return
+        if self.profile_mode == 'cprofile':
+            self.profiler.disable()
+            self.profiles.append(_cprofile_report(self.profiler))
+        else:
+            self.profiler.stop()
+            self.profiles.append(self.profiler.report())
+        self.profiler = None
+        self.profile_mode = None
+
+    def next_profile_mode(self):  # Kolejny tryb z PROFILE_MODES (przełączanie z GUI)
+        self.start_profile(PROFILE_MODES[(PROFILE_MODES.index(self.profile_mode) + 1) % len(PROFILE_MODES)])
+        return self.profile_mode
+
+    def report(self):
+        enabled_time = self.enabled_time
+        if self.enabled_since is not None:
+            enabled_time += time.perf_counter() - self.enabled_since
+        return {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'enabled_seconds': round(enabled_time, 3),
+            'timers': {name: timer.report() for name, timer in sorted(self.timers.items()) if timer.count},
+            'profiles': self.profiles,
+        }
+
+    def has_data(self):
+        return self.profiles or any(timer.count for timer in self.timers.values())
+
+    def write_report(self, path):
+        self.stop_profile()
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump(self.report(), stream, indent=2)
+        logging.getLogger('chess').info("Raport pomiarów zapisany do %s", path)
+
+
+METRICS = Metrics()
+
+
+def configure_from_environment(environ=os.environ):
+    """
+    Ustawia logowanie, pomiary i profilowanie według zmiennych CHESS_*; raport JSON zapisywany
+    jest przy wyjściu, jeśli coś zmierzono.
+    """
+    logging.basicConfig(level=environ.get('CHESS_LOG', 'WARNING').upper(), format='%(name)s %(levelname)s: %(message)s')
+    if environ.get('CHESS_METRICS', '') not in ('', '0'):
+        METRICS.enable()
+    if environ.get('CHESS_PROFILE'):
+        METRICS.start_profile(environ['CHESS_PROFILE'].lower())
+    report_path = environ.get('CHESS_METRICS_REPORT', DEFAULT_REPORT)
+
+    def write_at_exit():
+        METRICS.stop_profile()
+        if METRICS.has_data():
+            METRICS.write_report(report_path)
+    atexit.register(write_at_exit)
+
+
+def print_report(report):
+    print(f"Pomiary przez {report['enabled_seconds']}s")
+    print(f"{'timer':<28}{'count':>9}{'total ms':>11}{'mean µs':>10}{'p50':>8}{'p90':>8}{'p99':>8}{'max µs':>10}")
+    for name, timer in report['timers'].items():
+        print(f"{name:<28}{timer['count']:>9}{timer['total_ms']:>11.1f}{timer['mean_us']:>10.1f}{timer['p50_us']:>8}"
+              f"{timer['p90_us']:>8}{timer['p99_us']:>8}{timer['max_us']:>10.0f}")
+    for profile in report['profiles']:
+        print(f"\nProfil ({profile['mode']}):")
+        if profile['mode'] == 'cprofile':
+            for row in profile['functions'][:15]:
+                print(f"  {row['cumulative_ms']:>10.1f} ms  {row['calls']:>8}  {row['function']}")
+        else:
+            for row in profile['top_inclusive'][:15]:
+                print(f"  {row['fraction'] * 100:>6.1f}%  {row['function']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Podsumowanie raportu pomiarów")
+    parser.add_argument('report', nargs='?', default=DEFAULT_REPORT)
+    args = parser.parse_args(argv)
+    with open(args.report, encoding='utf-8') as stream:
+        print_report(json.load(stream))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
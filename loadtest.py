@@ -0,0 +1,155 @@
+"""
+Test obciążenia serwera partii (server.py) przez sieć lokalną.
+
+Każde połączenie prowadzi naraz kilka partii (obiema stronami, kolor both) i gra losowe legalne
+ruchy; dla każdego ruchu mierzony jest czas od wysłania MOVE do odebrania MOVED. Na koniec
+wypisywana jest liczba ruchów na sekundę i percentyle opóźnień.
+
+Użycie:
+    python loadtest.py --spawn --games 200 --connections 20      # uruchamia też server.py
+    python loadtest.py --host 127.0.0.1 --port 8765 --games 500 --moves 80
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import deque
+
+from position import Position, move_uci
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class LoadClient:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.new_waiters = deque()  # Odpowiedzi GAME przychodzą w kolejności komend NEW
+        self.pending = {}  # Id partii -> future czekający na MOVED / OVER / ERROR
+        self.finished = set()  # Partie, które serwer zakończył
+        self.latencies = []
+
+    async def read_loop(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            words = line.decode().split()
+            kind = words[0]
+            if kind == 'GAME':
+                self.new_waiters.popleft().set_result(int(words[1]))
+            elif kind in ('MOVED', 'OVER', 'ERROR') and words[1].isdigit():
+                game_id = int(words[1])
+                if kind == 'OVER':
+                    self.finished.add(game_id)
+                future = self.pending.pop(game_id, None)
+                if future is not None:
+                    future.set_result(kind)
+        for future in list(self.new_waiters) + list(self.pending.values()):
+            future.cancel()
+
+    def send(self, line):
+        self.writer.write(line.encode() + b'\n')
+
+    async def new_game(self, base_time, increment):
+        future = asyncio.get_running_loop().create_future()
+        self.new_waiters.append(future)
+        self.send(f"NEW {base_time} {increment} both")
+        return await future
+
+    async def play_game(self, rng, moves, base_time, increment):
+        game_id = await self.new_game(base_time, increment)
+        position = Position.starting()
+        for _ in range(moves):
+            legal_moves = position.legal_moves()
+            if game_id in self.finished or not legal_moves:
+                return
+            move = rng.choice(legal_moves)
+            future = asyncio.get_running_loop().create_future()
+            self.pending[game_id] = future
+            start = time.perf_counter()
+            self.send(f"MOVE {game_id} {move_uci(move)}")
+            if await future != 'MOVED':
+                return
+            self.latencies.append(time.perf_counter() - start)
+            position.make_move(move)
+        if game_id not in self.finished:  # Partia kończona poddaniem, żeby serwer nie trzymał jej po rozłączeniu
+            future = asyncio.get_running_loop().create_future()
+            self.pending[game_id] = future
+            self.send(f"RESIGN {game_id}")
+            await future
+
+
+async def run_load_test(host, port, games, connections, moves, base_time, increment, seed):
+    clients = []
+    for _ in range(connections):
+        reader, writer = await asyncio.open_connection(host, port)
+        clients.append(LoadClient(reader, writer))
+    readers = [asyncio.create_task(client.read_loop()) for client in clients]
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(clients[number % connections].play_game(random.Random(rng.random()), moves, base_time,
+                                                                   increment) for number in range(games)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.writer.close()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    if len(latencies) < 2:
+        print("Za mało ruchów do pomiaru")
+        return
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{games} games on {connections} connections: {len(latencies)} moves in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} moves/s)")
+    print(f"latency ms  p50 {percentiles[49] * 1000:.2f}  p90 {percentiles[89] * 1000:.2f}  "
+          f"p99 {percentiles[98] * 1000:.2f}  max {latencies[-1] * 1000:.2f}")
+
+
+async def wait_for_server(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążenia serwera partii")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--spawn', action='store_true', help="uruchom server.py w osobnym procesie")
+    parser.add_argument('--games', type=int, default=200, help="liczba partii granych naraz")
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--moves', type=int, default=60, help="najwięcej półruchów w partii")
+    parser.add_argument('--time', type=float, default=600.0, help="czas każdej strony w sekundach")
+    parser.add_argument('--increment', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+        server = subprocess.Popen([sys.executable, server_path, '--host', args.host, '--port', str(args.port)],
+                                  stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_server(args.host, args.port))
+        asyncio.run(run_load_test(args.host, args.port, args.games, args.connections, args.moves, args.time,
+                                  args.increment, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
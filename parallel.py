@@ -0,0 +1,165 @@
+"""
+Równoległe wyszukiwanie (Lazy SMP) na kilku procesach.
+
+Każdy proces przeszukuje tę samą pozycję własnym wątkiem iteracyjnego pogłębiania, a wyniki
+dzielą przez wspólną tablicę transpozycji w multiprocessing.shared_memory. Procesy pomocnicze
+zaczynają od różnych głębokości, żeby nie powtarzać dokładnie tej samej pracy.
+
+Użycie:
+    python parallel.py --workers 4 --depth 5 --fen "<FEN>"
+    python parallel.py --bench                   # przyspieszenie dla 1, 2, 4 i 8 procesów
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+from engine import Search, SearchLimits
+from position import Position, STARTING_FEN, move_uci
+from transposition import TranspositionTable, table_bytes
+
+BENCHMARK_POSITIONS = [
+    STARTING_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+]
+
+
+def _position_payload(position):  # FEN pozycji wyjściowej i ruchy - żeby procesy znały historię powtórzeń
+    root = position.copy()
+    while root.move_stack:
+        root.unmake_move()
+    return root.fen(), list(position.move_stack)
+
+
+def _worker_main(worker_id, shm_name, hash_mb, jobs, results, stop_event):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    search = Search(TranspositionTable(hash_mb, shm.buf), stop_event=stop_event)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        fen, moves, limits = job
+        position = Position.from_fen(fen)
+        for move in moves:
+            position.make_move(move)
+        info_callback = None
+        if worker_id == 0:  # Informacje o postępie wysyła tylko proces główny
+            info_callback = lambda info: results.put(('info', worker_id, info))
+        move, score = search.search(position, limits, info_callback, start_depth=1 + worker_id % 2)
+        results.put(('done', worker_id, (move, score, search.completed_depth, search.nodes)))
+    del search
+    shm.close()
+
+
+class ParallelSearch:
+    def __init__(self, workers=None, hash_mb=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb
+        self.nodes = 0
+        self.completed_depth = 0
+        # spawn zamiast fork - proces GUI ma już działające wątki Qt
+        context = multiprocessing.get_context('spawn')
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=table_bytes(hash_mb))
+        self.stop_event = context.Event()
+        self.results = context.Queue()
+        self.job_queues = [context.Queue() for _ in range(self.workers)]
+        self.processes = [context.Process(target=_worker_main, daemon=True,
+                                          args=(worker_id, self.shared_memory.name, hash_mb, self.job_queues[worker_id],
+                                                self.results, self.stop_event))
+                          for worker_id in range(self.workers)]
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def clear(self):
+        tt = TranspositionTable(self.hash_mb, self.shared_memory.buf)
+        tt.clear()
+        tt.table.release()
+
+    def search(self, position, limits, info_callback=None):
+        """
+        Ten sam interfejs co engine.Search.search. Wynik pochodzi z procesu, który ukończył
+        najgłębszą iterację (przy remisie - z procesu głównego).
+        """
+        fen, moves = _position_payload(position)
+        self.stop_event.clear()
+        for jobs in self.job_queues:
+            jobs.put((fen, moves, limits))
+
+        finished = {}
+        while len(finished) < self.workers:
+            kind, worker_id, payload = self.results.get()
+            if kind == 'info':
+                if info_callback is not None:
+                    info_callback(payload)
+                continue
+            finished[worker_id] = payload
+            if worker_id == 0:  # Proces główny skończył - pomocnicze nie są już potrzebne
+                self.stop_event.set()
+
+        self.nodes = sum(result[3] for result in finished.values())
+        best_id = max(finished, key=lambda worker_id: (finished[worker_id][2], worker_id == 0))
+        move, score, self.completed_depth, _ = finished[best_id]
+        return move, score
+
+    def close(self):
+        self.stop_event.set()
+        for jobs in self.job_queues:
+            jobs.put(None)
+        for process in self.processes:
+            process.join()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+def run_benchmark(worker_counts=(1, 2, 4, 8), depth=4, hash_mb=64):
+    baseline = None
+    for workers in worker_counts:
+        searcher = ParallelSearch(workers, hash_mb)
+        total_nodes = 0
+        start = time.perf_counter()
+        for fen in BENCHMARK_POSITIONS:
+            searcher.clear()
+            searcher.search(Position.from_fen(fen), SearchLimits(depth=depth))
+            total_nodes += searcher.nodes
+        elapsed = time.perf_counter() - start
+        searcher.close()
+        baseline = baseline or elapsed
+        print(f"workers {workers:>2}  time {elapsed:7.2f}s  nodes {total_nodes:>9}  nps {total_nodes / elapsed:>9.0f}  "
+              f"speedup {baseline / elapsed:5.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Równoległe wyszukiwanie Lazy SMP")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--hash', type=int, default=64, help="rozmiar wspólnej tablicy transpozycji w MB")
+    parser.add_argument('--depth', type=int, default=None, help="głębokość (domyślnie 5, dla --bench 4)")
+    parser.add_argument('--movetime', type=float, default=None, help="czas na ruch w sekundach")
+    parser.add_argument('--fen', default=STARTING_FEN)
+    parser.add_argument('--bench', action='store_true', help="zmierz przyspieszenie dla 1, 2, 4 i 8 procesów")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        run_benchmark(depth=args.depth or 4, hash_mb=args.hash)
+        return 0
+
+    searcher = ParallelSearch(args.workers, args.hash)
+    limits = SearchLimits(depth=None if args.movetime else args.depth or 5, movetime=args.movetime)
+    move, score = searcher.search(
+        Position.from_fen(args.fen), limits,
+        lambda info: print(f"depth {info['depth']} score {info['score']} nodes {info['nodes']} nps {info['nps']} "
+                           f"pv {' '.join(info['pv'])}"))
+    print(f"bestmove {move_uci(move)}  depth {searcher.completed_depth}  nodes {searcher.nodes}")
+    searcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
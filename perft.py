@@ -0,0 +1,93 @@
+"""
+Perft - liczenie liści drzewa legalnych ruchów do zadanej głębokości.
+
+Użycie:
+    python perft.py 4                      # perft z pozycji początkowej
+    python perft.py 3 --fen "<FEN>" --divide
+    python perft.py --bench                # zestaw pozycji wzorcowych z pomiarem węzłów na sekundę
+"""
+import argparse
+import sys
+import time
+
+from position import Position, STARTING_FEN, move_uci
+
+# (nazwa, FEN, głębokość, oczekiwana liczba węzłów) - wartości referencyjne z chessprogramming.org
+BENCHMARK_POSITIONS = [
+    ('startpos', STARTING_FEN, 5, 4865609),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', 4, 4085603),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', 5, 674624),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', 4, 422333),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', 4, 2103487),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', 4, 3894594),
+]
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    results = {}
+    for move in position.legal_moves():
+        position.make_move(move)
+        results[move_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return results
+
+
+def run_benchmark(positions=BENCHMARK_POSITIONS):
+    total_nodes = 0
+    total_time = 0.0
+    failed = False
+    for name, fen, depth, expected in positions:
+        position = Position.from_fen(fen)
+        start = time.perf_counter()
+        nodes = perft(position, depth)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        status = 'OK' if nodes == expected else f'BŁĄD (oczekiwano {expected})'
+        failed = failed or nodes != expected
+        print(f"{name:<10} depth {depth}  nodes {nodes:>9}  time {elapsed:7.2f}s  nps {nodes / elapsed:>9.0f}  {status}")
+    print(f"{'total':<10}          nodes {total_nodes:>9}  time {total_time:7.2f}s  nps {total_nodes / total_time:>9.0f}")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft dla generatora ruchów")
+    parser.add_argument('depth', type=int, nargs='?', default=3)
+    parser.add_argument('--fen', default=STARTING_FEN)
+    parser.add_argument('--divide', action='store_true', help="wypisz liczbę węzłów dla każdego ruchu z korzenia")
+    parser.add_argument('--bench', action='store_true', help="uruchom zestaw pozycji wzorcowych")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        return 0 if run_benchmark() else 1
+
+    position = Position.from_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        results = divide(position, args.depth)
+        for move, nodes in sorted(results.items()):
+            print(f"{move}: {nodes}")
+        nodes = sum(results.values())
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"nodes {nodes}  time {elapsed:.2f}s  nps {nodes / elapsed if elapsed else 0:.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Zapis i odczyt partii w formacie PGN razem z notacją algebraiczną (SAN).
+
+Czytnik przetwarza plik partia po partii (generator), więc pamięć zależy od długości jednej
+partii, a nie od rozmiaru pliku. Duże pliki można dzielić na fragmenty i parsować w puli procesów.
+
+Użycie:
+    python pgn.py games.pgn                  # liczba partii i szybkość parsowania
+    python pgn.py games.pgn --workers 8      # parsowanie fragmentów pliku w 8 procesach
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import time
+from array import array
+from collections import deque
+from multiprocessing import Pool
+
+from position import Position, STARTING_FEN, PAWN, QUEEN, PROMOTION, EN_PASSANT, CASTLING, PIECE_SYMBOLS, \
+    square_name, square_file, square_rank, parse_square, move_promotion
+
+SAN_RE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+TOKEN_RE = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\(|\)|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s(){};]+')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.*$')
+HEADER_RE = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+ESCAPE_RE = re.compile(r'\\(.)')  # \" i \\ w wartościach nagłówków
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+
+def san(position, move, legal_moves=None):
+    """
+    Zapis ruchu w notacji SAN, np. "Nbd7", "exd6", "e8=Q+", "O-O-O#".
+    """
+    if legal_moves is None:
+        legal_moves = position.legal_moves()
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    flag = move >> 14
+    if flag == CASTLING:
+        text = 'O-O' if square_file(to_sq) == 6 else 'O-O-O'
+    else:
+        piece_type = position.mailbox[from_sq][1]
+        capture = position.mailbox[to_sq] is not None or flag == EN_PASSANT
+        target = square_name(to_sq).lower()
+        if piece_type == PAWN:
+            text = (square_name(from_sq)[0].lower() + 'x' if capture else '') + target
+            if flag == PROMOTION:
+                text += '=' + PIECE_SYMBOLS[move_promotion(move)].upper()
+        else:
+            rivals = [other & 63 for other in legal_moves if other != move and (other >> 6) & 63 == to_sq and
+                      position.mailbox[other & 63][1] == piece_type]
+            disambiguation = ''
+            if rivals:  # Ta sama figura może wejść na pole docelowe z innego pola
+                if all(square_file(sq) != square_file(from_sq) for sq in rivals):
+                    disambiguation = square_name(from_sq)[0].lower()
+                elif all(square_rank(sq) != square_rank(from_sq) for sq in rivals):
+                    disambiguation = square_name(from_sq)[1]
+                else:
+                    disambiguation = square_name(from_sq).lower()
+            text = PIECE_SYMBOLS[piece_type].upper() + disambiguation + ('x' if capture else '') + target
+
+    position.make_move(move)
+    if position.checkers:
+        text += '#' if not position.legal_moves() else '+'
+    position.unmake_move()
+    return text
+
+
+def parse_san(position, text, legal_moves=None):
+    """
+    Zamienia ruch w notacji SAN na ruch legalny w danej pozycji; ValueError gdy ruch jest
+    nielegalny lub niejednoznaczny.
+    """
+    if legal_moves is None:
+        legal_moves = position.legal_moves()
+    clean = text.rstrip('+#!?')
+    if clean in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        target_file = 6 if len(clean) == 3 else 2
+        for move in legal_moves:
+            if move >> 14 == CASTLING and square_file((move >> 6) & 63) == target_file:
+                return move
+        raise ValueError(f"Nielegalna roszada: {text}")
+
+    match = SAN_RE.match(clean)
+    if match is None:
+        raise ValueError(f"Niepoprawny zapis ruchu: {text}")
+    piece_letter, from_file, from_rank, target, promotion = match.groups()
+    piece_type = PIECE_SYMBOLS.index(piece_letter.lower()) if piece_letter else PAWN
+    to_sq = parse_square(target)
+    promotion_type = PIECE_SYMBOLS.index(promotion.lower()) if promotion else None
+
+    candidates = []
+    for move in legal_moves:
+        from_sq = move & 63
+        if (move >> 6) & 63 != to_sq or position.mailbox[from_sq][1] != piece_type or move >> 14 == CASTLING:
+            continue
+        if from_file and square_file(from_sq) != ord(from_file) - ord('a'):
+            continue
+        if from_rank and square_rank(from_sq) != int(from_rank) - 1:
+            continue
+        if move >> 14 == PROMOTION and move_promotion(move) != (promotion_type or QUEEN):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'Niejednoznaczny' if candidates else 'Nielegalny'} ruch: {text}")
+    return candidates[0]
+
+
+def root_position(position):  # Pozycja, od której zaczęła się partia (przed pierwszym ruchem ze stosu)
+    root = position.copy()
+    while root.move_stack:
+        root.unmake_move()
+    root.move_stack, root.state_stack, root.key_history = [], [], []
+    return root
+
+
+class PgnGame:
+    def __init__(self, headers=None, san_moves=None, result='*'):
+        self.headers = headers if headers is not None else {}
+        self.san_moves = san_moves if san_moves is not None else []
+        self.result = result
+
+    def initial_position(self):
+        return Position.from_fen(self.headers.get('FEN', STARTING_FEN))
+
+    def moves(self):
+        """
+        Ruchy partii jako tablica 16-bitowych ruchów; ValueError przy nielegalnym ruchu.
+        """
+        position = self.initial_position()
+        moves = array('H')
+        for text in self.san_moves:
+            move = parse_san(position, text)
+            position.make_move(move)
+            moves.append(move)
+        return moves
+
+    def replay(self):
+        """
+        Pozycja końcowa z pełną historią ruchów (można ją cofać ruch po ruchu).
+        """
+        position = self.initial_position()
+        for move in self.moves():
+            position.make_move(move)
+        return position
+
+
+def _parse_movetext(text):
+    san_moves = []
+    result = '*'
+    depth = 0  # Głębokość wariantów w nawiasach - warianty są pomijane
+    for token in TOKEN_RE.findall(text):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(0, depth - 1)
+        elif depth or token[0] in '{;$' or MOVE_NUMBER_RE.match(token):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            san_moves.append(token)
+    return san_moves, result
+
+
+def read_games(stream):
+    """
+    Generator kolejnych partii (PgnGame) z otwartego pliku tekstowego PGN.
+    """
+    headers = {}
+    movetext = []
+    for line in stream:
+        stripped = line.strip()
+        if stripped.startswith('[') and movetext:  # Nagłówek po części z ruchami zaczyna nową partię
+            san_moves, result = _parse_movetext(''.join(movetext))
+            yield PgnGame(headers, san_moves, headers.get('Result', result) if result == '*' else result)
+            headers, movetext = {}, []
+        if stripped.startswith('['):
+            match = HEADER_RE.match(stripped)
+            if match:
+                headers[match.group(1)] = ESCAPE_RE.sub(r'\1', match.group(2))
+        elif stripped and not stripped.startswith('%'):
+            movetext.append(line)
+    if headers or movetext:
+        san_moves, result = _parse_movetext(''.join(movetext))
+        yield PgnGame(headers, san_moves, headers.get('Result', result) if result == '*' else result)
+
+
+def write_game(stream, moves, headers=None, result='*', initial_position=None):
+    """
+    Zapisuje partię (lista ruchów od initial_position, domyślnie od pozycji początkowej) w formacie PGN.
+    """
+    position = initial_position.copy() if initial_position is not None else Position.starting()
+    tags = {tag: '?' for tag in SEVEN_TAG_ROSTER}
+    tags.update(headers or {})
+    tags['Result'] = result
+    start_fen = position.fen()
+    if start_fen != STARTING_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = start_fen
+    for tag, value in tags.items():
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        stream.write(f'[{tag} "{escaped}"]\n')
+    stream.write('\n')
+
+    tokens = []
+    for index, move in enumerate(moves):
+        if position.side_to_move == 0:
+            tokens.append(f"{position.fullmove_number}.")
+        elif index == 0:
+            tokens.append(f"{position.fullmove_number}...")
+        tokens.append(san(position, move))
+        position.make_move(move)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:  # Linie ruchów nie dłuższe niż 80 znaków
+        if line and len(line) + 1 + len(token) > 80:
+            stream.write(line + '\n')
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    stream.write(line + '\n\n')
+
+
+def write_position_game(stream, position, headers=None, result='*'):
+    """
+    Zapisuje partię prowadzącą do podanej pozycji (ruchy z jej stosu ruchów).
+    """
+    write_game(stream, position.move_stack, headers, result, root_position(position))
+
+
+def _chunk_offsets(path, chunk_bytes):
+    """
+    Dzieli plik na fragmenty o granicach na początku partii (linia zaczynająca się od "[Event ").
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as stream:
+        while offsets[-1] + chunk_bytes < size:
+            stream.seek(offsets[-1] + chunk_bytes)
+            stream.readline()
+            while True:
+                position = stream.tell()
+                line = stream.readline()
+                if not line:
+                    position = size
+                    break
+                if line.startswith(b'[Event '):
+                    break
+            if position >= size:
+                break
+            offsets.append(position)
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+
+def _parse_chunk(task):
+    path, start, end = task
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        data = stream.read(end - start)
+    games = []
+    for game in read_games(io.StringIO(data.decode('utf-8', errors='replace'))):
+        try:
+            moves = game.moves()
+        except ValueError:
+            moves = None  # Partia z nielegalnym ruchem - zwracamy nagłówki, ale bez ruchów
+        games.append((game.headers, moves, game.result))
+    return games
+
+
+def parse_file_parallel(path, workers=None, chunk_bytes=8 * 1024 * 1024):
+    """
+    Generator (nagłówki, ruchy, wynik) dla każdej partii w pliku; fragmenty pliku parsowane są
+    w puli procesów. Zleconych (parsowanych albo czekających na odbiór) jest naraz najwyżej
+    dwa fragmenty na proces, więc przy wolnym odbiorcy wyniki nie gromadzą się w pamięci.
+    """
+    tasks = [(path, start, end) for start, end in _chunk_offsets(path, chunk_bytes)]
+    window = 2 * (workers or os.cpu_count() or 1)
+    with Pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= window:  # Następny fragment dopiero po odebraniu najstarszego
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(_parse_chunk, (task,)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parsowanie plików PGN")
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=1, help="liczba procesów parsujących")
+    parser.add_argument('--chunk-mb', type=int, default=8, help="rozmiar fragmentu pliku dla jednego procesu")
+    args = parser.parse_args(argv)
+
+    games = moves = illegal = 0
+    start = time.perf_counter()
+    if args.workers > 1:
+        for _, game_moves, _ in parse_file_parallel(args.path, args.workers, args.chunk_mb * 1024 * 1024):
+            games += 1
+            if game_moves is None:
+                illegal += 1
+            else:
+                moves += len(game_moves)
+    else:
+        with open(args.path, encoding='utf-8', errors='replace') as stream:
+            for game in read_games(stream):
+                games += 1
+                try:
+                    moves += len(game.moves())
+                except ValueError:
+                    illegal += 1
+    elapsed = time.perf_counter() - start
+    print(f"{games} games, {moves} moves, {illegal} with illegal moves in {elapsed:.2f}s "
+          f"({games / elapsed if elapsed else 0:.1f} games/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
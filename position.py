@@ -0,0 +1,724 @@
+"""
+Model pozycji szachowej niezależny od PyQt5.
+
+Plansza trzymana jest jako bitboardy (64-bitowe liczby, po jednej na typ figury i kolor)
+oraz tablica mailbox pole -> figura. Pole 0 to A1, pole 63 to H8.
+"""
+import random
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+COLOR_NAMES = ('White', 'Black')
+PIECE_NAMES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+PIECE_SYMBOLS = 'pnbrqk'
+
+# Mailbox przechowuje współdzielone krotki (kolor, typ figury), żeby nie tworzyć ich przy każdym ruchu
+PIECES = [[(color, piece_type) for piece_type in range(6)] for color in (WHITE, BLACK)]
+
+BB_SQUARES = [1 << sq for sq in range(64)]
+BB_FILE_A = 0x0101010101010101
+BB_FILE_H = BB_FILE_A << 7
+BB_RANK_1 = 0xFF
+BB_RANK_3 = BB_RANK_1 << 16
+BB_RANK_6 = BB_RANK_1 << 40
+BB_RANK_8 = BB_RANK_1 << 56
+BB_ALL = (1 << 64) - 1
+
+# Ruch zakodowany w 16 bitach: pole startowe (6), pole docelowe (6), figura promocji (2), rodzaj ruchu (2)
+NORMAL, PROMOTION, EN_PASSANT, CASTLING = range(4)
+
+WHITE_OO, WHITE_OOO, BLACK_OO, BLACK_OOO = 1, 2, 4, 8
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def square(file, rank):
+    return rank * 8 + file
+
+
+def square_file(sq):
+    return sq & 7
+
+
+def square_rank(sq):
+    return sq >> 3
+
+
+def square_from_row_col(row, col):  # Wiersz 0 w GUI to ósmy rząd planszy
+    return (7 - row) * 8 + col
+
+
+def row_col_from_square(sq):
+    return 7 - (sq >> 3), sq & 7
+
+
+def square_name(sq):
+    return f"{chr(ord('A') + (sq & 7))}{(sq >> 3) + 1}"
+
+
+def parse_square(name):
+    if len(name) != 2 or name[0].lower() not in 'abcdefgh' or name[1] not in '12345678':
+        return None
+    return square(ord(name[0].lower()) - ord('a'), int(name[1]) - 1)
+
+
+def iter_squares(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def encode_move(from_sq, to_sq, flag=NORMAL, promotion=KNIGHT):
+    return from_sq | (to_sq << 6) | ((promotion - KNIGHT) << 12) | (flag << 14)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_flag(move):
+    return move >> 14
+
+
+def move_promotion(move):
+    return KNIGHT + ((move >> 12) & 3)
+
+
+def move_uci(move):
+    text = square_name(move & 63).lower() + square_name((move >> 6) & 63).lower()
+    if move >> 14 == PROMOTION:
+        text += PIECE_SYMBOLS[move_promotion(move)]
+    return text
+
+
+def move_squares(move):
+    """
+    Pola, których zawartość zmienia ruch (i jego cofnięcie): start, cel, pole pionka bitego w przelocie,
+    pola wieży przy roszadzie.
+    """
+    from_sq, to_sq, flag = move & 63, (move >> 6) & 63, move >> 14
+    if flag == EN_PASSANT:
+        return from_sq, to_sq, to_sq ^ 8  # Bity pionek stoi o rząd za polem docelowym
+    if flag == CASTLING:
+        return (from_sq, to_sq) + CASTLING_MOVES[to_sq][1]
+    return from_sq, to_sq
+
+
+def _step_attacks(sq, deltas):
+    file, rank = square_file(sq), square_rank(sq)
+    bb = 0
+    for df, dr in deltas:
+        f, r = file + df, rank + dr
+        if 0 <= f < 8 and 0 <= r < 8:
+            bb |= BB_SQUARES[square(f, r)]
+    return bb
+
+
+KNIGHT_DELTAS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_DELTAS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+ROOK_DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (-1, 1), (-1, -1), (1, -1))
+
+KNIGHT_ATTACKS = [_step_attacks(sq, KNIGHT_DELTAS) for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, KING_DELTAS) for sq in range(64)]
+PAWN_ATTACKS = [[_step_attacks(sq, ((-1, 1), (1, 1))) for sq in range(64)],
+                [_step_attacks(sq, ((-1, -1), (1, -1))) for sq in range(64)]]
+
+
+def _ray(sq, df, dr):
+    f, r = square_file(sq) + df, square_rank(sq) + dr
+    squares = []
+    while 0 <= f < 8 and 0 <= r < 8:
+        squares.append(square(f, r))
+        f, r = f + df, r + dr
+    return squares
+
+
+def _between_tables():
+    between = [[0] * 64 for _ in range(64)]
+    rook_aligned = [[False] * 64 for _ in range(64)]
+    bishop_aligned = [[False] * 64 for _ in range(64)]
+    for sq in range(64):
+        for directions, aligned in ((ROOK_DIRECTIONS, rook_aligned), (BISHOP_DIRECTIONS, bishop_aligned)):
+            for df, dr in directions:
+                path = 0
+                for target in _ray(sq, df, dr):
+                    between[sq][target] = path
+                    aligned[sq][target] = True
+                    path |= BB_SQUARES[target]
+    return between, rook_aligned, bishop_aligned
+
+
+def _line_tables():
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for df, dr in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            full_line = BB_SQUARES[sq]
+            for target in _ray(sq, df, dr) + _ray(sq, -df, -dr):
+                full_line |= BB_SQUARES[target]
+            for target in _ray(sq, df, dr):
+                line[sq][target] = full_line
+    return line
+
+
+# BETWEEN[a][b] to pola leżące ściśle pomiędzy a i b na wspólnej linii (0 jeśli nie leżą na jednej linii)
+BETWEEN, ROOK_ALIGNED, BISHOP_ALIGNED = _between_tables()
+# LINE[a][b] to cała linia przechodząca przez a i b - związana figura może poruszać się tylko po niej
+LINE = _line_tables()
+
+
+def _line_table(sq, df, dr):
+    """
+    Tablica ataków wzdłuż jednej linii (w obu kierunkach) dla każdego układu blokujących figur.
+    Maska pomija pola brzegowe, bo ich zajętość nie zmienia ataku.
+    """
+    rays = (_ray(sq, df, dr), _ray(sq, -df, -dr))
+    mask = 0
+    for ray in rays:
+        for target in ray[:-1]:
+            mask |= BB_SQUARES[target]
+    table = {}
+    subset = 0
+    while True:
+        attacks = 0
+        for ray in rays:
+            for target in ray:
+                attacks |= BB_SQUARES[target]
+                if subset & BB_SQUARES[target]:
+                    break
+        table[subset] = attacks
+        subset = (subset - mask) & mask
+        if not subset:
+            break
+    return mask, table
+
+
+def _slider_tables(directions):
+    masks = ([], [])
+    tables = ([], [])
+    for sq in range(64):
+        for i, (df, dr) in enumerate(directions[:2]):
+            mask, table = _line_table(sq, df, dr)
+            masks[i].append(mask)
+            tables[i].append(table)
+    return masks + tables
+
+
+# Ataki figur dalekobieżnych: osobna tablica dla każdej z dwóch linii przechodzących przez pole
+RANK_MASKS, FILE_MASKS, RANK_ATTACKS, FILE_ATTACKS = _slider_tables(ROOK_DIRECTIONS)
+DIAGONAL_MASKS, ANTI_DIAGONAL_MASKS, DIAGONAL_ATTACKS, ANTI_DIAGONAL_ATTACKS = _slider_tables(BISHOP_DIRECTIONS)
+
+
+def rook_attacks(sq, occupied):
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return DIAGONAL_ATTACKS[sq][occupied & DIAGONAL_MASKS[sq]] | \
+        ANTI_DIAGONAL_ATTACKS[sq][occupied & ANTI_DIAGONAL_MASKS[sq]]
+
+
+CASTLING_RIGHTS_MASK = [15] * 64
+CASTLING_RIGHTS_MASK[square(4, 0)] = 15 ^ (WHITE_OO | WHITE_OOO)
+CASTLING_RIGHTS_MASK[square(7, 0)] = 15 ^ WHITE_OO
+CASTLING_RIGHTS_MASK[square(0, 0)] = 15 ^ WHITE_OOO
+CASTLING_RIGHTS_MASK[square(4, 7)] = 15 ^ (BLACK_OO | BLACK_OOO)
+CASTLING_RIGHTS_MASK[square(7, 7)] = 15 ^ BLACK_OO
+CASTLING_RIGHTS_MASK[square(0, 7)] = 15 ^ BLACK_OOO
+
+# Pole docelowe króla -> (prawo roszady, ruch wieży, pola które muszą być puste, pola których król nie może mijać pod biciem)
+CASTLING_MOVES = {
+    square(6, 0): (WHITE_OO, (square(7, 0), square(5, 0)), BB_SQUARES[5] | BB_SQUARES[6], (4, 5, 6)),
+    square(2, 0): (WHITE_OOO, (square(0, 0), square(3, 0)), BB_SQUARES[1] | BB_SQUARES[2] | BB_SQUARES[3], (4, 3, 2)),
+    square(6, 7): (BLACK_OO, (square(7, 7), square(5, 7)), BB_SQUARES[61] | BB_SQUARES[62], (60, 61, 62)),
+    square(2, 7): (BLACK_OOO, (square(0, 7), square(3, 7)), BB_SQUARES[57] | BB_SQUARES[58] | BB_SQUARES[59],
+                   (60, 59, 58)),
+}
+CASTLING_KING_TARGETS = ((square(6, 0), square(2, 0)), (square(6, 7), square(2, 7)))
+
+# Klucze Zobrista - stałe ziarno, żeby klucze były takie same w każdym procesie i przy każdym uruchomieniu
+_zobrist_random = random.Random(0x5A0B815)
+ZOBRIST_PIECES = [[[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+
+
+class Position:
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.mailbox = [None] * 64
+        self.side_to_move = WHITE
+        self.castling_rights = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.checkers = 0  # Figury przeciwnika szachujące króla strony na posunięciu
+        self.pinned = 0  # Figury strony na posunięciu związane z własnym królem
+        self.key = ZOBRIST_CASTLING[0]  # Klucz Zobrista aktualizowany przy każdej zmianie pozycji
+        self.move_stack = []
+        self.state_stack = []
+        self.key_history = []  # Klucze pozycji poprzedzających aktualną, do wykrywania powtórzeń
+
+    def copy(self):
+        """
+        Niezależna kopia pozycji razem z historią ruchów (np. dla wyszukiwania w osobnym wątku).
+        """
+        position = Position.__new__(Position)
+        position.__dict__.update(self.__dict__)
+        position.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        position.occupied = self.occupied[:]
+        position.mailbox = self.mailbox[:]
+        position.move_stack = self.move_stack[:]
+        position.state_stack = self.state_stack[:]
+        position.key_history = self.key_history[:]
+        return position
+
+    @classmethod
+    def starting(cls):
+        return cls.from_fen(STARTING_FEN)
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Niepoprawny FEN: {fen}")
+        position = cls()
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"Niepoprawny FEN: {fen}")
+        for rank_index, rank_text in enumerate(ranks):
+            file = 0
+            for char in rank_text:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in PIECE_SYMBOLS and file < 8:
+                    color = WHITE if char.isupper() else BLACK
+                    position.put_piece(square(file, 7 - rank_index), color, PIECE_SYMBOLS.index(char.lower()))
+                    file += 1
+                else:
+                    raise ValueError(f"Niepoprawny FEN: {fen}")
+            if file != 8:
+                raise ValueError(f"Niepoprawny FEN: {fen}")
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Niepoprawny FEN: {fen}")
+        position.side_to_move = WHITE if fields[1] == 'w' else BLACK
+        for flag, char in ((WHITE_OO, 'K'), (WHITE_OOO, 'Q'), (BLACK_OO, 'k'), (BLACK_OOO, 'q')):
+            if char in fields[2]:
+                position.castling_rights |= flag
+        position.key ^= ZOBRIST_CASTLING[0] ^ ZOBRIST_CASTLING[position.castling_rights]
+        if position.side_to_move == BLACK:
+            position.key ^= ZOBRIST_SIDE
+        if fields[3] != '-':
+            ep_square = parse_square(fields[3])
+            if ep_square is None:
+                raise ValueError(f"Niepoprawny FEN: {fen}")
+            # Pole bicia w przelocie zapamiętujemy tylko gdy bicie jest w ogóle możliwe
+            if PAWN_ATTACKS[position.side_to_move ^ 1][ep_square] & position.pieces[position.side_to_move][PAWN]:
+                position.ep_square = ep_square
+                position.key ^= ZOBRIST_EP_FILE[ep_square & 7]
+        try:  # Liczniki są opcjonalne i niezależne od siebie
+            if len(fields) > 4:
+                position.halfmove_clock = int(fields[4])
+            if len(fields) > 5:
+                position.fullmove_number = int(fields[5])
+        except ValueError:
+            raise ValueError(f"Niepoprawny FEN: {fen}") from None
+        if position.halfmove_clock < 0 or position.fullmove_number < 1:
+            raise ValueError(f"Niepoprawny FEN: {fen}")
+        if popcount(position.pieces[WHITE][KING]) != 1 or popcount(position.pieces[BLACK][KING]) != 1:
+            raise ValueError(f"Niepoprawny FEN (każda strona musi mieć jednego króla): {fen}")
+        if position.in_check(position.side_to_move ^ 1):  # Inaczej strona na posunięciu mogłaby zbić króla
+            raise ValueError(f"Niepoprawny FEN (szachowany król strony, która nie ma ruchu): {fen}")
+        position.update_check_info()
+        return position
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                piece = self.mailbox[square(file, rank)]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = PIECE_SYMBOLS[piece[1]]
+                row += symbol.upper() if piece[0] == WHITE else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = ''.join(char for flag, char in ((WHITE_OO, 'K'), (WHITE_OOO, 'Q'), (BLACK_OO, 'k'),
+                                                   (BLACK_OOO, 'q')) if self.castling_rights & flag) or '-'
+        ep = square_name(self.ep_square).lower() if self.ep_square is not None else '-'
+        side = 'w' if self.side_to_move == WHITE else 'b'
+        return f"{'/'.join(rows)} {side} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    @property
+    def all_occupied(self):
+        return self.occupied[WHITE] | self.occupied[BLACK]
+
+    def piece_at(self, sq):
+        return self.mailbox[sq]
+
+    def put_piece(self, sq, color, piece_type):
+        bit = BB_SQUARES[sq]
+        self.pieces[color][piece_type] |= bit
+        self.occupied[color] |= bit
+        self.mailbox[sq] = PIECES[color][piece_type]
+        self.key ^= ZOBRIST_PIECES[color][piece_type][sq]
+
+    def remove_piece(self, sq):
+        piece = self.mailbox[sq]
+        if piece is not None:
+            color, piece_type = piece
+            bit = BB_SQUARES[sq]
+            self.pieces[color][piece_type] ^= bit
+            self.occupied[color] ^= bit
+            self.mailbox[sq] = None
+            self.key ^= ZOBRIST_PIECES[color][piece_type][sq]
+        return piece
+
+    def move_piece(self, from_sq, to_sq):
+        """
+        Przenosi figurę z from_sq na to_sq i zwraca zbitą figurę (lub None).
+        """
+        captured = self.remove_piece(to_sq)
+        color, piece_type = self.remove_piece(from_sq)
+        self.put_piece(to_sq, color, piece_type)
+        return captured
+
+    def king_square(self, color):
+        king = self.pieces[color][KING]
+        return king.bit_length() - 1 if king else None
+
+    def is_path_clear(self, from_sq, to_sq):
+        return not BETWEEN[from_sq][to_sq] & self.all_occupied
+
+    def attackers_to(self, sq, color, occupied=None):
+        if occupied is None:
+            occupied = self.all_occupied
+        pieces = self.pieces[color]
+        return (KNIGHT_ATTACKS[sq] & pieces[KNIGHT]) | (KING_ATTACKS[sq] & pieces[KING]) | \
+            (PAWN_ATTACKS[color ^ 1][sq] & pieces[PAWN]) | \
+            (rook_attacks(sq, occupied) & (pieces[ROOK] | pieces[QUEEN])) | \
+            (bishop_attacks(sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+
+    def is_square_attacked(self, sq, by_color):
+        return self.attackers_to(sq, by_color) != 0
+
+    def in_check(self, color=None):
+        if color is None or color == self.side_to_move:
+            return self.checkers != 0
+        king = self.king_square(color)
+        return king is not None and self.is_square_attacked(king, color ^ 1)
+
+    def update_check_info(self):
+        """
+        Wyznacza figury szachujące i związane dla strony na posunięciu.
+        Wywoływane raz po każdym ruchu; cofnięcie ruchu przywraca zapamiętane wartości ze stosu.
+        """
+        us = self.side_to_move
+        them = us ^ 1
+        king = self.king_square(us)
+        if king is None:
+            self.checkers = self.pinned = 0
+            return
+        occupied = self.all_occupied
+        self.checkers = self.attackers_to(king, them, occupied)
+        their = self.pieces[them]
+        snipers = (rook_attacks(king, 0) & (their[ROOK] | their[QUEEN])) | \
+            (bishop_attacks(king, 0) & (their[BISHOP] | their[QUEEN]))
+        pinned = 0
+        own = self.occupied[us]
+        for sniper in iter_squares(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+        self.pinned = pinned
+
+    def pseudo_legal_moves(self):
+        us = self.side_to_move
+        them = us ^ 1
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        empty = ~occupied & BB_ALL
+        pieces = self.pieces[us]
+        moves = []
+        append = moves.append
+
+        for from_sq in iter_squares(pieces[KNIGHT]):
+            for to_sq in iter_squares(KNIGHT_ATTACKS[from_sq] & ~own):
+                append(from_sq | (to_sq << 6))
+        for from_sq in iter_squares(pieces[BISHOP] | pieces[QUEEN]):
+            for to_sq in iter_squares(bishop_attacks(from_sq, occupied) & ~own):
+                append(from_sq | (to_sq << 6))
+        for from_sq in iter_squares(pieces[ROOK] | pieces[QUEEN]):
+            for to_sq in iter_squares(rook_attacks(from_sq, occupied) & ~own):
+                append(from_sq | (to_sq << 6))
+        king = self.king_square(us)
+        if king is not None:
+            for to_sq in iter_squares(KING_ATTACKS[king] & ~own):
+                append(king | (to_sq << 6))
+            self._castling_moves(king, occupied, moves)
+        self._pawn_moves(pieces[PAWN], enemy, empty, moves)
+        return moves
+
+    def _pawn_moves(self, pawns, enemy, empty, moves):
+        append = moves.append
+        if self.side_to_move == WHITE:
+            single = (pawns << 8) & empty
+            double = (((pawns << 8) & ~self.all_occupied & BB_RANK_3) << 8) & empty
+            left = ((pawns & ~BB_FILE_A) << 7) & enemy
+            right = ((pawns & ~BB_FILE_H) << 9) & enemy
+            push, left_step, right_step, promotion_rank = 8, 7, 9, BB_RANK_8
+        else:
+            single = (pawns >> 8) & empty
+            double = (((pawns >> 8) & ~self.all_occupied & BB_RANK_6) >> 8) & empty
+            left = ((pawns & ~BB_FILE_A) >> 9) & enemy
+            right = ((pawns & ~BB_FILE_H) >> 7) & enemy
+            push, left_step, right_step, promotion_rank = -8, -9, -7, BB_RANK_1
+
+        for targets, step in ((single, push), (left, left_step), (right, right_step)):
+            for to_sq in iter_squares(targets & ~promotion_rank):
+                append((to_sq - step) | (to_sq << 6))
+            for to_sq in iter_squares(targets & promotion_rank):
+                base = (to_sq - step) | (to_sq << 6) | (PROMOTION << 14)
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    append(base | ((promotion - KNIGHT) << 12))
+        for to_sq in iter_squares(double):
+            append((to_sq - 2 * push) | (to_sq << 6))
+        if self.ep_square is not None:
+            for from_sq in iter_squares(PAWN_ATTACKS[self.side_to_move ^ 1][self.ep_square] & pawns):
+                append(from_sq | (self.ep_square << 6) | (EN_PASSANT << 14))
+
+    def _castling_moves(self, king, occupied, moves):
+        us = self.side_to_move
+        for to_sq in CASTLING_KING_TARGETS[us]:
+            right, _, empty_squares, king_path = CASTLING_MOVES[to_sq]
+            if self.castling_rights & right and not occupied & empty_squares:
+                if not any(self.is_square_attacked(sq, us ^ 1) for sq in king_path):
+                    moves.append(king | (to_sq << 6) | (CASTLING << 14))
+
+    def legal_moves(self):
+        """
+        Generuje wszystkie legalne ruchy korzystając z figur szachujących i związanych,
+        bez wykonywania ruchów na próbę (poza rzadkim biciem w przelocie).
+        """
+        us = self.side_to_move
+        them = us ^ 1
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        pieces = self.pieces[us]
+        king = self.king_square(us)
+        moves = []
+        append = moves.append
+        if king is None:
+            return moves
+
+        without_king = occupied ^ BB_SQUARES[king]
+        for to_sq in iter_squares(KING_ATTACKS[king] & ~own):
+            if not self.attackers_to(to_sq, them, without_king):
+                append(king | (to_sq << 6))
+
+        checkers = self.checkers
+        if checkers & (checkers - 1):  # Podwójny szach - tylko król może się ruszyć
+            return moves
+        if checkers:
+            target = BETWEEN[king][checkers.bit_length() - 1] | checkers
+        else:
+            target = ~own & BB_ALL
+            self._castling_moves(king, occupied, moves)
+
+        pinned = self.pinned
+        line = LINE[king]
+        for from_sq in iter_squares(pieces[KNIGHT] & ~pinned):
+            for to_sq in iter_squares(KNIGHT_ATTACKS[from_sq] & target):
+                append(from_sq | (to_sq << 6))
+        for from_sq in iter_squares(pieces[BISHOP] | pieces[QUEEN]):
+            targets = bishop_attacks(from_sq, occupied) & target
+            if pinned & BB_SQUARES[from_sq]:
+                targets &= line[from_sq]
+            for to_sq in iter_squares(targets):
+                append(from_sq | (to_sq << 6))
+        for from_sq in iter_squares(pieces[ROOK] | pieces[QUEEN]):
+            targets = rook_attacks(from_sq, occupied) & target
+            if pinned & BB_SQUARES[from_sq]:
+                targets &= line[from_sq]
+            for to_sq in iter_squares(targets):
+                append(from_sq | (to_sq << 6))
+
+        pawn_moves = []
+        self._pawn_moves(pieces[PAWN], enemy & target, ~occupied & target, pawn_moves)
+        for move in pawn_moves:
+            from_sq = move & 63
+            if move >> 14 == EN_PASSANT:
+                self.make_move(move)
+                legal = not self.is_square_attacked(king, them)
+                self.unmake_move()
+                if legal:
+                    append(move)
+            elif not pinned & BB_SQUARES[from_sq] or line[from_sq] & BB_SQUARES[(move >> 6) & 63]:
+                append(move)
+        return moves
+
+    def make_move(self, move):
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flag = move >> 14
+        us = self.side_to_move
+        them = us ^ 1
+        piece_type = self.mailbox[from_sq][1]
+        capture_sq = to_sq
+        if flag == EN_PASSANT:
+            capture_sq = to_sq - 8 if us == WHITE else to_sq + 8
+        captured = self.mailbox[capture_sq]
+
+        self.move_stack.append(move)
+        self.state_stack.append((captured, self.castling_rights, self.ep_square, self.halfmove_clock,
+                                 self.checkers, self.pinned))
+        self.key_history.append(self.key)
+
+        if captured is not None:
+            self.remove_piece(capture_sq)
+        self.remove_piece(from_sq)
+        self.put_piece(to_sq, us, KNIGHT + ((move >> 12) & 3) if flag == PROMOTION else piece_type)
+        if flag == CASTLING:
+            rook_from, rook_to = CASTLING_MOVES[to_sq][1]
+            self.remove_piece(rook_from)
+            self.put_piece(rook_to, us, ROOK)
+
+        key = self.key ^ ZOBRIST_SIDE ^ ZOBRIST_CASTLING[self.castling_rights]
+        self.castling_rights &= CASTLING_RIGHTS_MASK[from_sq] & CASTLING_RIGHTS_MASK[to_sq]
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        self.ep_square = None
+        if piece_type == PAWN:
+            self.halfmove_clock = 0
+            if to_sq - from_sq in (16, -16):
+                ep_square = (from_sq + to_sq) >> 1
+                if PAWN_ATTACKS[us][ep_square] & self.pieces[them][PAWN]:
+                    self.ep_square = ep_square
+                    key ^= ZOBRIST_EP_FILE[ep_square & 7]
+        elif captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.side_to_move = them
+        self.key = key
+        self.update_check_info()
+        return captured
+
+    def unmake_move(self):
+        move = self.move_stack.pop()
+        captured, self.castling_rights, self.ep_square, self.halfmove_clock, self.checkers, self.pinned = \
+            self.state_stack.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flag = move >> 14
+        self.side_to_move ^= 1
+        us = self.side_to_move
+        if us == BLACK:
+            self.fullmove_number -= 1
+
+        piece_type = self.remove_piece(to_sq)[1]
+        self.put_piece(from_sq, us, PAWN if flag == PROMOTION else piece_type)
+        if flag == CASTLING:
+            rook_from, rook_to = CASTLING_MOVES[to_sq][1]
+            self.remove_piece(rook_to)
+            self.put_piece(rook_from, us, ROOK)
+        if captured is not None:
+            capture_sq = to_sq
+            if flag == EN_PASSANT:
+                capture_sq = to_sq - 8 if us == WHITE else to_sq + 8
+            self.put_piece(capture_sq, *captured)
+        self.key = self.key_history.pop()
+        return move
+
+    def repetition_count(self):
+        """
+        Liczba wystąpień aktualnej pozycji w partii (wliczając aktualną).
+        Sprawdzane są tylko pozycje od ostatniego ruchu pionem lub bicia, co drugi półruch.
+        """
+        count = 1
+        history = self.key_history
+        last = len(history) - min(self.halfmove_clock, len(history))
+        for index in range(len(history) - 2, last - 1, -2):
+            if history[index] == self.key:
+                count += 1
+        return count
+
+    def is_repetition(self, count=3):
+        return self.repetition_count() >= count
+
+    def is_fifty_moves(self):
+        return self.halfmove_clock >= 100
+
+    def is_insufficient_material(self):
+        """
+        Żadna ze stron nie może dać mata: same króle albo król z jednym lekkim kawalerem przeciwko królowi.
+        """
+        white, black = self.pieces
+        if white[PAWN] | black[PAWN] | white[ROOK] | black[ROOK] | white[QUEEN] | black[QUEEN]:
+            return False
+        return popcount(white[KNIGHT] | white[BISHOP] | black[KNIGHT] | black[BISHOP]) <= 1
+
+    def find_move(self, from_sq, to_sq, promotion=QUEEN, legal_moves=None):
+        """
+        Zwraca legalny ruch z from_sq na to_sq (dla promocji - na wskazaną figurę) albo None.
+        Można przekazać wygenerowaną wcześniej listę legalnych ruchów, żeby nie liczyć jej ponownie.
+        """
+        if legal_moves is None:
+            legal_moves = self.legal_moves()
+        for move in legal_moves:
+            if move & 63 == from_sq and (move >> 6) & 63 == to_sq:
+                if move >> 14 != PROMOTION or move_promotion(move) == promotion:
+                    return move
+        return None
+
+    def parse_uci(self, text):
+        from_sq, to_sq = parse_square(text[0:2]), parse_square(text[2:4])
+        if from_sq is None or to_sq is None or len(text) not in (4, 5):
+            return None
+        promotion = PIECE_SYMBOLS.index(text[4].lower()) if len(text) == 5 and text[4].lower() in 'nbrq' else QUEEN
+        return self.find_move(from_sq, to_sq, promotion)
+
+    def can_reach(self, from_sq, to_sq):
+        """
+        Sprawdza, czy figura z from_sq może wejść na to_sq według zasad ruchu figur (bez sprawdzania szacha).
+        """
+        piece = self.mailbox[from_sq]
+        if piece is None:
+            return False
+        saved_side, saved_ep = self.side_to_move, self.ep_square
+        if piece[0] != saved_side:  # Pole bicia w przelocie dotyczy tylko strony na posunięciu
+            self.side_to_move, self.ep_square = piece[0], None
+        reachable = any(move & 63 == from_sq and (move >> 6) & 63 == to_sq for move in self.pseudo_legal_moves())
+        self.side_to_move, self.ep_square = saved_side, saved_ep
+        return reachable
+
+    def is_legal_move(self, from_sq, to_sq):
+        piece = self.mailbox[from_sq]
+        return piece is not None and piece[0] == self.side_to_move and self.find_move(from_sq, to_sq) is not None
+
+    def has_legal_move(self):
+        return len(self.legal_moves()) > 0
@@ -0,0 +1,359 @@
+"""
+Generator tablic końcówek (KQK, KRK, KPK, KBNK) metodą analizy wstecznej, zwektoryzowany w NumPy.
+
+Zaczynamy od pozycji matowych, a potem na zmianę: pozycje białych, z których istnieje ruch do
+przegranej pozycji czarnych, są wygrane (ruchy wsteczne z ostatnio znalezionych przegranych), a
+pozycje czarnych, w których każdy ruch prowadzi do wygranej białych, są przegrane. Kolejne
+iteracje dają odległość do mata w półruchach. Wszystkie kroki działają na całych tablicach
+indeksów naraz. KPK korzysta z gotowych KQK i KRK przy promocji.
+
+Użycie:
+    python retrograde.py                     # generuje tablebases.bin obok modułu
+    python retrograde.py --bench             # czas generowania i czas sondowania
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from position import Position, WHITE, BLACK, PAWN, KNIGHT, KING, KNIGHT_DELTAS, KING_DELTAS, ROOK_DIRECTIONS, \
+    BISHOP_DIRECTIONS, BETWEEN, ROOK_ALIGNED, BISHOP_ALIGNED, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, \
+    BB_SQUARES, QUEEN, ROOK, BISHOP
+from tablebase import TABLES, DEFAULT_PATH, Tablebases, write_file
+
+NO_SQUARE = 64  # Pole "poza planszą" albo zbita figura; wszystkie tablice mają dla niego dodatkowy wiersz
+
+
+def _step_table(deltas):
+    table = np.full((65, len(deltas)), NO_SQUARE, dtype=np.int64)
+    for sq in range(64):
+        for index, (df, dr) in enumerate(deltas):
+            f, r = (sq & 7) + df, (sq >> 3) + dr
+            if 0 <= f < 8 and 0 <= r < 8:
+                table[sq, index] = r * 8 + f
+    return table
+
+
+def _bitboard_table(bitboards):
+    table = np.zeros((65, 65), dtype=bool)
+    for sq in range(64):
+        for target in range(64):
+            table[sq, target] = bool(bitboards[sq] & BB_SQUARES[target])
+    return table
+
+
+def _aligned_table(aligned):
+    table = np.zeros((65, 65), dtype=bool)
+    table[:64, :64] = aligned
+    return table
+
+
+KING_STEPS = _step_table(KING_DELTAS)
+KNIGHT_STEPS = _step_table(KNIGHT_DELTAS)
+KING_ADJACENT = _bitboard_table(KING_ATTACKS)
+LEAPER_ATTACKS = {KNIGHT: _bitboard_table(KNIGHT_ATTACKS), PAWN: _bitboard_table(PAWN_ATTACKS[WHITE])}
+SLIDER_ALIGNED = {ROOK: _aligned_table(ROOK_ALIGNED), BISHOP: _aligned_table(BISHOP_ALIGNED),
+                  QUEEN: _aligned_table(ROOK_ALIGNED) | _aligned_table(BISHOP_ALIGNED)}
+SLIDER_DIRECTIONS = {ROOK: ROOK_DIRECTIONS, BISHOP: BISHOP_DIRECTIONS, QUEEN: ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# BETWEEN_SQUARES[a, b, c] - czy pole c leży ściśle pomiędzy a i b
+BETWEEN_SQUARES = np.zeros((65, 65, 65), dtype=bool)
+for _a in range(64):
+    for _b in range(64):
+        for _c in range(64):
+            BETWEEN_SQUARES[_a, _b, _c] = bool(BETWEEN[_a][_b] & BB_SQUARES[_c])
+# RAYS[sq, kierunek] - kolejne pola promienia (NO_SQUARE za krawędzią planszy)
+RAYS = {}
+for _df, _dr in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+    _rays = np.full((65, 7), NO_SQUARE, dtype=np.int64)
+    for _sq in range(64):
+        for _step in range(7):
+            _f, _r = (_sq & 7) + _df * (_step + 1), (_sq >> 3) + _dr * (_step + 1)
+            if not (0 <= _f < 8 and 0 <= _r < 8):
+                break
+            _rays[_sq, _step] = _r * 8 + _f
+    RAYS[(_df, _dr)] = _rays
+
+
+class Generator:
+    def __init__(self, spec, solved=None):
+        """
+        solved - słownik nazwa tablicy -> gotowe wartości (potrzebne KPK do oceny promocji).
+        """
+        self.spec = spec
+        self.solved = solved or {}
+        self.king_index = np.full(65, -1, dtype=np.int64)
+        self.king_index[spec.king_squares] = np.arange(len(spec.king_squares))
+        self.values = np.zeros(spec.size, dtype=np.uint8)
+        self.legal = None
+
+    def canonical(self, squares, pawns=None):
+        pawns = self.spec.pawns if pawns is None else pawns
+        flip = (squares[0] & 7) > 3
+        squares = [np.where(flip, sq ^ 7, sq) for sq in squares]
+        if pawns:
+            return squares
+        flip = squares[0] > 31
+        squares = [np.where(flip, sq ^ 56, sq) for sq in squares]
+        transpose = np.zeros(squares[0].shape, dtype=bool)
+        decided = np.zeros(squares[0].shape, dtype=bool)
+        for sq in squares:  # Jak TableSpec.canonical: pierwsze pole poza przekątną rozstrzyga o odbiciu
+            rank, file = sq >> 3, sq & 7
+            transpose |= ~decided & (rank > file)
+            decided |= rank != file
+        return [np.where(transpose, ((sq & 7) << 3) | (sq >> 3), sq) for sq in squares]
+
+    def encode(self, side, squares, spec=None, king_index=None):
+        spec = spec or self.spec
+        king_index = self.king_index if king_index is None else king_index
+        squares = self.canonical(squares, spec.pawns)
+        index = side * len(spec.king_squares) + king_index[squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index
+
+    def decode(self, index):
+        squares = []
+        for _ in self.spec.piece_types:
+            squares.append(index % 64)
+            index = index // 64
+        bk = index % 64
+        index = index // 64
+        count = len(self.spec.king_squares)
+        king = np.asarray(self.spec.king_squares, dtype=np.int64)[index % count]
+        return index // count, [king, bk] + squares[::-1]
+
+    def attacked(self, target, wk, pieces):
+        """
+        Czy pole target jest atakowane przez białe. Figura na polu NO_SQUARE (zbita) nie atakuje;
+        linie mogą zasłaniać król białych i pozostałe figury.
+        """
+        hit = KING_ADJACENT[wk, target]
+        for sq, piece_type in zip(pieces, self.spec.piece_types):
+            if piece_type in LEAPER_ATTACKS:
+                hit = hit | LEAPER_ATTACKS[piece_type][sq, target]
+            else:
+                line = SLIDER_ALIGNED[piece_type][sq, target]
+                for blocker in [wk] + pieces:
+                    line = line & ~BETWEEN_SQUARES[sq, target, blocker]
+                hit = hit | line
+        return hit
+
+    def black_moves(self, wk, bk, pieces):
+        """
+        Ruchy króla czarnych w 8 kierunkach: lista (legalny, bicie, pole docelowe).
+        """
+        moves = []
+        for direction in range(8):
+            target = KING_STEPS[bk, direction]
+            legal = (target != NO_SQUARE) & (target != wk) & ~KING_ADJACENT[wk, target]
+            capture = np.zeros(target.shape, dtype=bool)
+            remaining = []
+            for sq in pieces:
+                taken = sq == target
+                capture |= taken
+                remaining.append(np.where(taken, NO_SQUARE, sq))
+            legal &= ~self.attacked(target, wk, remaining)
+            moves.append((legal, capture & legal, target))
+        return moves
+
+    def compute_legal(self):
+        side, squares = self.decode(np.arange(self.spec.size, dtype=np.int64))
+        wk, bk, pieces = squares[0], squares[1], squares[2:]
+        legal = ~KING_ADJACENT[wk, bk]
+        for first in range(len(squares)):
+            for second in range(first + 1, len(squares)):
+                legal &= squares[first] != squares[second]
+        for sq, piece_type in zip(pieces, self.spec.piece_types):
+            if piece_type == PAWN:
+                legal &= (sq >= 8) & (sq < 56)
+        for sq, canonical in zip(squares, self.canonical(squares)):
+            legal &= sq == canonical  # Każda pozycja ma w tablicy dokładnie jeden indeks
+        legal &= ~((side == 0) & self.attacked(bk, wk, pieces))  # Król czarnych szachowany przy ruchu białych
+        self.legal = legal
+
+    def is_lost(self, index):
+        """
+        Pozycje czarnych (index), w których każdy legalny ruch prowadzi do wygranej białych.
+        """
+        _, squares = self.decode(index)
+        wk, bk, pieces = squares[0], squares[1], squares[2:]
+        has_move = np.zeros(index.shape, dtype=bool)
+        escape = np.zeros(index.shape, dtype=bool)
+        for legal, capture, target in self.black_moves(wk, bk, pieces):
+            has_move |= legal
+            escape |= capture  # Bicie figury kończy się remisem
+            quiet = legal & ~capture
+            successor = self.encode(0, [wk, np.where(quiet, target, bk)] + pieces)
+            escape |= quiet & (self.values[successor] == 0)
+        return has_move & ~escape
+
+    def white_predecessors(self, index):
+        """
+        Pozycje białych (bez bicia), z których jednym ruchem dochodzi się do pozycji index.
+        """
+        _, squares = self.decode(index)
+        occupied = squares
+        result = []
+
+        def add(mover, origin, valid):
+            moved = list(squares)
+            moved[mover] = np.where(valid, origin, squares[mover])
+            predecessor = self.encode(0, moved)
+            result.append(predecessor[valid & self.legal[predecessor]])
+
+        def empty(sq):
+            free = sq != NO_SQUARE
+            for other in occupied:
+                free &= sq != other
+            return free
+
+        for direction in range(8):
+            origin = KING_STEPS[squares[0], direction]
+            add(0, origin, empty(origin))
+        for mover, piece_type in enumerate(self.spec.piece_types, 2):
+            sq = squares[mover]
+            if piece_type == KNIGHT:
+                for direction in range(8):
+                    origin = KNIGHT_STEPS[sq, direction]
+                    add(mover, origin, empty(origin))
+            elif piece_type == PAWN:
+                single = empty(sq - 8) & (sq - 8 >= 8)
+                add(mover, sq - 8, single)
+                add(mover, sq - 16, single & (sq >> 3 == 3) & empty(sq - 16))
+            else:
+                for direction in SLIDER_DIRECTIONS[piece_type]:
+                    valid = np.ones(sq.shape, dtype=bool)
+                    for step in range(7):
+                        origin = RAYS[direction][sq, step]
+                        valid &= empty(origin)
+                        if not valid.any():
+                            break
+                        add(mover, origin, valid)
+        return np.unique(np.concatenate(result)) if result else np.zeros(0, dtype=np.int64)
+
+    def black_predecessors(self, index):
+        _, squares = self.decode(index)
+        result = []
+        for direction in range(8):
+            origin = KING_STEPS[squares[1], direction]
+            valid = origin != NO_SQUARE
+            for other in squares:
+                valid &= origin != other
+            predecessor = self.encode(1, [squares[0], np.where(valid, origin, squares[1])] + squares[2:])
+            result.append(predecessor[valid & self.legal[predecessor]])
+        return np.unique(np.concatenate(result))
+
+    def promotion_seeds(self):
+        """
+        Dla KPK: wartość pozycji białych, w których promocja prowadzi do wygranej KQK albo KRK.
+        """
+        seeds = np.zeros(self.spec.size, dtype=np.uint8)
+        index = np.flatnonzero(self.legal[:self.spec.size // 2])
+        _, squares = self.decode(index)
+        wk, bk, pawn = squares
+        target = pawn + 8
+        valid = (pawn >= 48) & (target != wk) & (target != bk)
+        index, wk, bk, target = index[valid], wk[valid], bk[valid], target[valid]
+        for name in ('KQK', 'KRK'):
+            spec = next(spec for spec in TABLES if spec.name == name)
+            king_index = np.full(65, -1, dtype=np.int64)
+            king_index[spec.king_squares] = np.arange(len(spec.king_squares))
+            child = self.solved[name][self.encode(1, [wk, bk, target], spec, king_index)]
+            better = (child > 0) & ((seeds[index] == 0) | (child + 1 < seeds[index]))
+            seeds[index[better]] = child[better] + 1
+        return seeds
+
+    def generate(self):
+        self.compute_legal()
+        half = self.spec.size // 2
+        black = np.flatnonzero(self.legal[half:]) + half
+        _, squares = self.decode(black)
+        wk, bk, pieces = squares[0], squares[1], squares[2:]
+        has_move = np.zeros(black.shape, dtype=bool)
+        for legal, _, _ in self.black_moves(wk, bk, pieces):
+            has_move |= legal
+        mates = black[~has_move & self.attacked(bk, wk, pieces)]
+        self.values[mates] = 1
+
+        seeds = self.promotion_seeds() if self.spec.pawns else None
+        pending_seeds = seeds is not None and seeds.any()
+        frontier = mates
+        plies = 1
+        while len(frontier) or pending_seeds:
+            won = self.white_predecessors(frontier) if len(frontier) else np.zeros(0, dtype=np.int64)
+            if pending_seeds:
+                won = np.union1d(won, np.flatnonzero(seeds == plies + 1))
+                pending_seeds = bool((seeds > plies + 1).any())
+            won = won[self.values[won] == 0]
+            self.values[won] = plies + 1
+            candidates = self.black_predecessors(won) if len(won) else np.zeros(0, dtype=np.int64)
+            candidates = candidates[self.values[candidates] == 0]
+            frontier = candidates[self.is_lost(candidates)] if len(candidates) else candidates
+            self.values[frontier] = plies + 2
+            plies += 2
+        return self.values
+
+
+def generate_all(path=DEFAULT_PATH, report=print):
+    solved = {}
+    for spec in TABLES:
+        start = time.perf_counter()
+        values = Generator(spec, solved).generate()
+        solved[spec.name] = values
+        half = spec.size // 2
+        report(f"{spec.name:5} {spec.size:>9} positions  {time.perf_counter() - start:6.2f}s  "
+               f"white wins {np.count_nonzero(values[:half]):>8}  longest mate {int(values.max()) - 1} plies")
+    write_file(path, [(spec.name, solved[spec.name].tobytes()) for spec in TABLES])
+    return solved
+
+
+def _random_position(spec, rng):
+    while True:
+        squares = rng.sample(range(64), 2 + len(spec.piece_types))
+        if any(piece_type == PAWN and not 8 <= sq < 56 for sq, piece_type in zip(squares[2:], spec.piece_types)):
+            continue
+        position = Position()
+        strong = rng.choice((WHITE, BLACK))
+        for sq, piece_type in zip(squares, (KING, KING) + spec.piece_types):
+            color = BLACK if sq == squares[1] else WHITE
+            if strong == BLACK:  # Odbicie z zamianą kolorów - pion czarnych musi iść w dół planszy
+                color, sq = color ^ 1, sq ^ 56
+            position.put_piece(sq, color, piece_type)
+        position.side_to_move = rng.choice((WHITE, BLACK))
+        if position.in_check(position.side_to_move ^ 1):
+            continue
+        return Position.from_fen(position.fen())  # Klucz i informacje o szachach liczone od nowa
+
+
+def run_benchmark(path=DEFAULT_PATH, probes=100000):
+    start = time.perf_counter()
+    generate_all(path)
+    print(f"generation total {time.perf_counter() - start:.2f}s")
+    tablebases = Tablebases(path)
+    rng = random.Random(1)
+    for spec in TABLES:
+        positions = [_random_position(spec, rng) for _ in range(1000)]
+        start = time.perf_counter()
+        for number in range(probes):
+            tablebases.probe(positions[number % len(positions)])
+        elapsed = time.perf_counter() - start
+        print(f"{spec.name:5} probe {elapsed / probes * 1e6:6.2f} us")
+    tablebases.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generowanie tablic końcówek analizą wsteczną")
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    parser.add_argument('--bench', action='store_true', help="zmierz czas generowania i sondowania")
+    args = parser.parse_args(argv)
+    if args.bench:
+        run_benchmark(args.output)
+    else:
+        generate_all(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Rozgrywanie wielu partii bez GUI (silnik kontra silnik albo gracze skryptowi) na puli procesów.
+
+Procesy robocze importują tylko position/game/engine, bez PyQt5, więc startują w milisekundach.
+Wyniki zapisywane są jako zwarty strumień binarny: nagłówek partii i jej ruchy po 16 bitów.
+
+Użycie:
+    python selfplay.py --games 1000 --white random --black engine --depth 2 --workers 8 --output games.bin
+    python selfplay.py --read games.bin          # podsumowanie zapisanego strumienia
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from multiprocessing import Pool
+
+from engine import Search, SearchLimits
+from game import Game, RESULTS, TERMINATIONS
+from position import Position, STARTING_FEN, WHITE, BLACK
+from tablebase import load_default as load_tablebases
+
+PLAYERS = ('engine', 'random')
+# Nagłówek: numer partii, wynik, sposób zakończenia, liczba półruchów
+RECORD_HEADER = struct.Struct('<IBBH')
+
+_engine_players = None  # Silnik każdej strony, tworzony raz na proces roboczy (init_worker)
+
+
+def write_record(stream, index, result, termination, moves):
+    moves = array('H', moves)  # Kopia - zamiana kolejności bajtów nie może zmienić tablicy wywołującego
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    stream.write(RECORD_HEADER.pack(index, RESULTS.index(result), TERMINATIONS.index(termination), len(moves)))
+    stream.write(moves.tobytes())
+
+
+def read_records(stream):
+    """
+    Generator (numer partii, wynik, sposób zakończenia, ruchy) czytający strumień rekord po rekordzie.
+    """
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        index, result, termination, plies = RECORD_HEADER.unpack(header)
+        moves = array('H')
+        moves.frombytes(stream.read(plies * 2))
+        if sys.byteorder == 'big':
+            moves.byteswap()
+        yield index, RESULTS[result], TERMINATIONS[termination], moves
+
+
+class RandomPlayer:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def choose(self, game):
+        return self.random.choice(game.legal_moves)
+
+
+class EnginePlayer:
+    def __init__(self, depth=None, nodes=None, movetime=None, hash_mb=4, tablebases=None):
+        self.search = Search(hash_mb=hash_mb, tablebases=tablebases)
+        self.limits = SearchLimits(depth=depth, nodes=nodes, movetime=movetime)
+
+    def new_game(self):  # Pusta tablica transpozycji - wynik partii nie zależy od partii rozegranych wcześniej w procesie
+        self.search.tt.clear()
+
+    def choose(self, game):
+        self.search.stop_event.clear()  # Wyszukiwanie zatrzymane limitem zostawia ustawiony stop_event
+        move, _ = self.search.search(game.position.copy(), self.limits)
+        return move
+
+
+def init_worker(options):
+    """
+    Inicjalizacja procesu roboczego: silniki obu stron (z tablicami transpozycji i wspólnymi
+    tablicami końcówek) tworzone są raz i używane we wszystkich partiach procesu.
+    """
+    global _engine_players
+    tablebases = load_tablebases()
+    _engine_players = [EnginePlayer(options['depth'], options['nodes'], options['movetime'], options['hash'], tablebases)
+                       for _ in (WHITE, BLACK)]
+
+
+def make_player(kind, color, seed):
+    if kind == 'random':
+        return RandomPlayer(seed)
+    player = _engine_players[color]
+    player.new_game()
+    return player
+
+
+def play_game(task):
+    index, white, black, fen, max_plies, seed = task
+    game = Game(Position.from_fen(fen))
+    players = (make_player(white, WHITE, seed), make_player(black, BLACK, seed + 1))
+    while not game.is_over() and len(game.moves) < max_plies:
+        game.play(players[game.side_to_move].choose(game))
+    return index, game.result, game.termination, array('H', game.moves)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partie silnik kontra silnik bez GUI")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--white', choices=PLAYERS, default='engine')
+    parser.add_argument('--black', choices=PLAYERS, default='engine')
+    parser.add_argument('--depth', type=int, default=None, help="głębokość wyszukiwania silnika")
+    parser.add_argument('--nodes', type=int, default=None, help="limit węzłów na ruch silnika")
+    parser.add_argument('--movetime', type=float, default=None, help="czas na ruch silnika w sekundach")
+    parser.add_argument('--hash', type=int, default=4, help="tablica transpozycji silnika w MB")
+    parser.add_argument('--fen', default=STARTING_FEN)
+    parser.add_argument('--max-plies', type=int, default=400, help="po tylu półruchach partia jest przerywana")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='-', help="plik wynikowy ('-' oznacza standardowe wyjście)")
+    parser.add_argument('--read', metavar='FILE', help="wypisz podsumowanie zapisanego strumienia i zakończ")
+    args = parser.parse_args(argv)
+
+    if args.read:
+        counts = {}
+        with open(args.read, 'rb') as stream:
+            for _, result, _, _ in read_records(stream):
+                counts[result] = counts.get(result, 0) + 1
+        print(' '.join(f"{result}: {count}" for result, count in sorted(counts.items())))
+        return 0
+
+    if args.depth is None and args.nodes is None and args.movetime is None:
+        args.depth = 2
+    options = {'depth': args.depth, 'nodes': args.nodes, 'movetime': args.movetime, 'hash': args.hash}
+    tasks = [(index, args.white, args.black, args.fen, args.max_plies, args.seed + 2 * index)
+             for index in range(args.games)]
+
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    counts = {}
+    start = time.perf_counter()
+    with Pool(args.workers, initializer=init_worker, initargs=(options,)) as pool:
+        for index, result, termination, moves in pool.imap_unordered(play_game, tasks, chunksize=4):
+            write_record(output, index, result, termination, moves)
+            counts[result] = counts.get(result, 0) + 1
+    elapsed = time.perf_counter() - start
+    if output is not sys.stdout.buffer:
+        output.close()
+    summary = ' '.join(f"{result}: {count}" for result, count in sorted(counts.items()))
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.1f} games/s)  {summary}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
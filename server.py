@@ -0,0 +1,273 @@
+"""
+Serwer partii szachowych na asyncio: setki partii w jednym procesie.
+
+Serwer sprawdza każdy ruch (game.Game) i prowadzi zegary na time.monotonic() z dodawaniem czasu
+po ruchu; klienci tylko wyświetlają czasy, które od niego dostają. Protokół jest tekstowy, jedna
+komenda na linię (UTF-8), czasy w milisekundach:
+
+    klient -> serwer                              serwer -> klient
+    NEW <czas s> <dodatek s> [white|black|both]   GAME <id> <white|black|both>
+    JOIN <id>                                     GAME <id> <kolor>
+                                                  START <id> <czas białych> <czas czarnych> <FEN>
+    MOVE <id> <ruch>                              MOVED <id> <ruch UCI> <czas białych> <czas czarnych>
+    RESIGN <id>                                   OVER <id> <wynik> <sposób zakończenia>
+    STATE <id>                                    STATE <id> <wynik> <czas białych> <czas czarnych> <FEN>
+    LIST                                          GAMES <id> <id> ...  (partie czekające na przeciwnika)
+                                                  ERROR <id lub -> <opis>
+
+Ruch podaje się w UCI ("e2e4", "e7e8q") albo tak jak w polu tekstowym GUI ("Pawn E2 E4").
+Partia z kolorem both (obie strony przy jednym połączeniu) zaczyna się od razu, inne - gdy
+dołączy przeciwnik. Rozłączenie gracza w trakcie partii oznacza poddanie.
+
+Użycie:
+    python server.py                          # nasłuchuje na 127.0.0.1:8765
+    python server.py --host 0.0.0.0 --port 9000
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+
+from game import Game, IllegalMoveError
+from position import WHITE, BLACK, COLOR_NAMES, move_uci
+from tablebase import load_default as load_tablebases
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+SEATS = {'white': (WHITE,), 'black': (BLACK,), 'both': (WHITE, BLACK)}
+MAX_TIME = 24 * 3600.0  # Najdłuższy czas i dodatek w sekundach przyjmowany w NEW
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()  # Id partii, w których to połączenie jest graczem
+
+    def send(self, line):
+        if not self.writer.is_closing():  # Np. OVER po poddaniu przez rozłączenie
+            self.writer.write(line.encode() + b'\n')
+
+
+class ServerGame:
+    def __init__(self, game_id, game):
+        self.id = game_id
+        self.game = game
+        self.players = [None, None]  # Połączenie grające białymi i czarnymi
+        self.started = False
+        self.turn_start = None  # time.monotonic() od początku bieżącego posunięcia
+        self.flag_timer = None  # asyncio.TimerHandle sprawdzający przekroczenie czasu strony na posunięciu
+
+    def clock_ms(self):
+        """
+        Czasy (białe, czarne) w ms, z czasem bieżącego posunięcia odjętym stronie na posunięciu.
+        """
+        clock = list(self.game.clock)
+        if self.turn_start is not None and not self.game.is_over():
+            side = self.game.side_to_move
+            clock[side] = max(0.0, clock[side] - (time.monotonic() - self.turn_start))
+        return [round(seconds * 1000) for seconds in clock]
+
+    def connections(self):
+        return {player for player in self.players if player is not None}
+
+    def broadcast(self, line):
+        for connection in self.connections():
+            connection.send(line)
+
+
+class GameServer:
+    def __init__(self, tablebases=None):
+        self.tablebases = tablebases
+        self.games = {}
+        self.next_id = 1
+        self.moves_played = 0
+
+    async def handle_client(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.dispatch(connection, line.decode('utf-8', errors='replace').split())
+                except ProtocolError as error:
+                    game_id, message = error.args if len(error.args) == 2 else ('-', error.args[0])
+                    connection.send(f"ERROR {game_id} {message}")
+                await writer.drain()  # Wolny klient spowalnia tylko własne połączenie
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in list(connection.games):
+                server_game = self.games[game_id]
+                if server_game.started:
+                    self.resign(server_game, connection)
+                else:  # Nikt jeszcze nie dołączył - partia po prostu znika
+                    del self.games[game_id]
+            writer.close()
+
+    def dispatch(self, connection, words):
+        if not words:
+            return
+        command, args = words[0].upper(), words[1:]
+        if command == 'NEW':
+            self.new_game(connection, args)
+        elif command == 'LIST':
+            waiting = [str(game_id) for game_id, server_game in self.games.items() if not server_game.started]
+            connection.send(' '.join(['GAMES'] + waiting))
+        elif command in ('JOIN', 'MOVE', 'RESIGN', 'STATE'):
+            if not args or not args[0].isdigit() or int(args[0]) not in self.games:
+                raise ProtocolError(args[0] if args else '-', "Nie ma takiej partii")
+            server_game = self.games[int(args[0])]
+            if command == 'JOIN':
+                self.join(server_game, connection)
+            elif command == 'MOVE':
+                self.move(server_game, connection, ' '.join(args[1:]))
+            elif command == 'RESIGN':
+                if connection not in server_game.connections():
+                    raise ProtocolError(server_game.id, "Nie grasz w tej partii")
+                self.resign(server_game, connection)
+            else:
+                white_ms, black_ms = server_game.clock_ms()
+                connection.send(f"STATE {server_game.id} {server_game.game.result} {white_ms} {black_ms} "
+                                f"{server_game.game.position.fen()}")
+        else:
+            raise ProtocolError(f"Nieznana komenda: {words[0]}")
+
+    def new_game(self, connection, args):
+        try:
+            base_time = float(args[0]) if args else 300.0
+            increment = float(args[1]) if len(args) > 1 else 0.0
+        except ValueError:
+            raise ProtocolError("NEW <czas s> <dodatek s> [white|black|both]") from None
+        seat = args[2].lower() if len(args) > 2 else 'white'
+        if seat not in SEATS or not (math.isfinite(base_time) and math.isfinite(increment)) or \
+                not 0 < base_time <= MAX_TIME or not 0 <= increment <= MAX_TIME:  # nan / inf psułyby zegary
+            raise ProtocolError("NEW <czas s> <dodatek s> [white|black|both]")
+        server_game = ServerGame(self.next_id, Game(base_time=base_time, increment=increment, tablebases=self.tablebases))
+        self.next_id += 1
+        self.games[server_game.id] = server_game
+        for color in SEATS[seat]:
+            server_game.players[color] = connection
+        connection.games.add(server_game.id)
+        connection.send(f"GAME {server_game.id} {seat}")
+        if seat == 'both':
+            self.start(server_game)
+
+    def join(self, server_game, connection):
+        if server_game.started:
+            raise ProtocolError(server_game.id, "Partia już trwa")
+        color = WHITE if server_game.players[WHITE] is None else BLACK
+        server_game.players[color] = connection
+        connection.games.add(server_game.id)
+        connection.send(f"GAME {server_game.id} {COLOR_NAMES[color].lower()}")
+        self.start(server_game)
+
+    def start(self, server_game):
+        server_game.started = True
+        server_game.turn_start = time.monotonic()
+        white_ms, black_ms = server_game.clock_ms()
+        server_game.broadcast(f"START {server_game.id} {white_ms} {black_ms} {server_game.game.position.fen()}")
+        self.schedule_flag(server_game)
+
+    def move(self, server_game, connection, text):
+        game = server_game.game
+        if not server_game.started:
+            raise ProtocolError(server_game.id, "Partia jeszcze się nie zaczęła")
+        if game.is_over():
+            raise ProtocolError(server_game.id, "Partia jest już zakończona")
+        if server_game.players[game.side_to_move] is not connection:
+            raise ProtocolError(server_game.id, "Teraz nie twój ruch")
+        try:
+            move = game.parse_text(text)
+        except IllegalMoveError as error:
+            raise ProtocolError(server_game.id, str(error)) from None
+        if self.charge_clock(server_game):  # Czas skończył się przed nadejściem ruchu
+            return
+        game.play(move)
+        self.moves_played += 1
+        white_ms, black_ms = server_game.clock_ms()
+        server_game.broadcast(f"MOVED {server_game.id} {move_uci(move)} {white_ms} {black_ms}")
+        if game.is_over():
+            self.finish(server_game)
+        else:
+            self.schedule_flag(server_game)
+
+    def charge_clock(self, server_game):
+        """
+        Odejmuje stronie na posunięciu czas od początku posunięcia; True gdy partia skończyła się na czas.
+        """
+        if server_game.turn_start is None:  # Zegary ruszają dopiero od START
+            return False
+        now = time.monotonic()
+        flagged = server_game.game.tick(now - server_game.turn_start)
+        server_game.turn_start = now
+        if flagged:
+            self.finish(server_game)
+        return flagged
+
+    def schedule_flag(self, server_game):
+        if server_game.flag_timer is not None:
+            server_game.flag_timer.cancel()
+        remaining = server_game.game.clock[server_game.game.side_to_move]
+        server_game.flag_timer = asyncio.get_running_loop().call_later(remaining, self.check_flag, server_game)
+
+    def check_flag(self, server_game):
+        server_game.flag_timer = None
+        if server_game.game.is_over():
+            return
+        if not self.charge_clock(server_game):  # Zegar pętli obudził nas odrobinę za wcześnie
+            self.schedule_flag(server_game)
+
+    def resign(self, server_game, connection):
+        game = server_game.game
+        if not server_game.started:  # Niechcianą partię bez przeciwnika usuwa rozłączenie
+            raise ProtocolError(server_game.id, "Partia jeszcze się nie zaczęła")
+        if game.is_over():
+            raise ProtocolError(server_game.id, "Partia jest już zakończona")
+        if not self.charge_clock(server_game):
+            # Przy grze obiema stronami poddaje się strona na posunięciu
+            color = game.side_to_move if server_game.players[game.side_to_move] is connection else \
+                game.side_to_move ^ 1
+            game.resign(color)
+            self.finish(server_game)
+
+    def finish(self, server_game):
+        if server_game.flag_timer is not None:
+            server_game.flag_timer.cancel()
+            server_game.flag_timer = None
+        game = server_game.game
+        server_game.broadcast(f"OVER {server_game.id} {game.result} {game.termination}")
+        for connection in server_game.connections():
+            connection.games.discard(server_game.id)
+        del self.games[server_game.id]
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, tablebases=None):
+    game_server = GameServer(tablebases)
+    server = await asyncio.start_server(game_server.handle_client, host, port)
+    print(f"Serwer partii nasłuchuje na {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serwer partii szachowych")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--no-tablebases', action='store_true', help="nie rozstrzygaj partii tablicami końcówek")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, None if args.no_tablebases else load_tablebases()))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Sondowanie tablic końcówek (KQK, KRK, KPK, KBNK) zapisanych przez retrograde.py.
+
+Plik jest mapowany w pamięć (mmap), więc otwarcie jest natychmiastowe, a kilka procesów silnika
+dzieli te same strony pamięci. Każda pozycja zajmuje jeden bajt: 0 oznacza remis, n > 0 - mat
+w n - 1 półruchach (przy posunięciu silniejszej strony wygrywa ona, przy posunięciu słabszej -
+słabsza przegrywa).
+
+Silniejsza strona jest w tablicach zawsze biała; pozycje z silniejszymi czarnymi odbijane są
+pionowo z zamianą kolorów. Bez pionów król silniejszej strony sprowadzany jest symetrią do
+trójkąta a1-d1-d4, z pionem - odbiciem poziomym na linie a-d.
+"""
+import mmap
+import os
+import struct
+
+from position import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, iter_squares, popcount
+
+MAGIC = b'CGTB'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHH')  # Sygnatura, wersja, liczba tablic
+TABLE_ENTRY = struct.Struct('<8sQQ')  # Nazwa, przesunięcie danych w pliku, liczba pozycji
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases.bin')
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+
+class TableSpec:
+    """
+    Układ indeksu tablicy: (strona na posunięciu, król silniejszej strony, król słabszej strony,
+    figury silniejszej strony w kolejności piece_types).
+    """
+    def __init__(self, name, piece_types):
+        self.name = name
+        self.piece_types = piece_types
+        self.pawns = PAWN in piece_types
+        if self.pawns:
+            self.king_squares = [sq for sq in range(64) if sq & 7 <= 3]
+        else:
+            self.king_squares = [sq for sq in range(64) if sq >> 3 <= sq & 7 <= 3]
+        self.king_index = [-1] * 64
+        for index, sq in enumerate(self.king_squares):
+            self.king_index[sq] = index
+        self.size = 2 * len(self.king_squares) * 64 ** (1 + len(piece_types))
+
+    def canonical(self, squares):
+        """
+        Pola (król silniejszej strony pierwszy) po symetrii sprowadzającej pozycję do postaci kanonicznej.
+        """
+        if squares[0] & 7 > 3:
+            squares = [sq ^ 7 for sq in squares]
+        if self.pawns:
+            return squares
+        if squares[0] > 31:
+            squares = [sq ^ 56 for sq in squares]
+        for sq in squares:  # Pierwsze pole poza przekątną a1-h8 rozstrzyga o odbiciu względem niej
+            if sq >> 3 != sq & 7:
+                if sq >> 3 > sq & 7:
+                    squares = [((sq & 7) << 3) | (sq >> 3) for sq in squares]
+                break
+        return squares
+
+    def index_of(self, side, squares):
+        """
+        side - 0 gdy na posunięciu jest silniejsza strona; squares - [król silniejszej, król słabszej, figury...].
+        """
+        squares = self.canonical(squares)
+        index = side * len(self.king_squares) + self.king_index[squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index
+
+
+TABLES = [TableSpec('KQK', (QUEEN,)), TableSpec('KRK', (ROOK,)), TableSpec('KPK', (PAWN,)),
+          TableSpec('KBNK', (BISHOP, KNIGHT))]
+TABLES_BY_MATERIAL = {tuple(sorted(spec.piece_types)): spec for spec in TABLES}
+
+
+def write_file(path, tables):
+    """
+    tables - lista (nazwa, bajty) w kolejności zapisu.
+    """
+    offset = FILE_HEADER.size + TABLE_ENTRY.size * len(tables)
+    with open(path, 'wb') as stream:
+        stream.write(FILE_HEADER.pack(MAGIC, VERSION, len(tables)))
+        for name, data in tables:
+            stream.write(TABLE_ENTRY.pack(name.encode(), offset, len(data)))
+            offset += len(data)
+        for _, data in tables:
+            stream.write(data)
+
+
+class Tablebases:
+    def __init__(self, path=DEFAULT_PATH):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Niepoprawny plik tablic końcówek: {path}")
+        self.offsets = {}
+        for number in range(count):
+            name, offset, size = TABLE_ENTRY.unpack_from(self.data, FILE_HEADER.size + number * TABLE_ENTRY.size)
+            self.offsets[name.rstrip(b'\0').decode()] = offset
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def probe(self, position):
+        """
+        (wynik, półruchy do mata) z punktu widzenia strony na posunięciu - wynik to WIN, DRAW albo LOSS;
+        None gdy pozycji nie ma w tablicach.
+        """
+        if position.castling_rights or popcount(position.all_occupied) > 4:
+            return None
+        if popcount(position.pieces[WHITE][KING]) != 1 or popcount(position.pieces[BLACK][KING]) != 1:
+            return None  # Tablice znają tylko pozycje z jednym królem każdej strony
+        extra = [position.occupied[color] & ~position.pieces[color][KING] for color in (WHITE, BLACK)]
+        if extra[WHITE] and extra[BLACK] or not (extra[WHITE] or extra[BLACK]):
+            return None
+        strong = WHITE if extra[WHITE] else BLACK
+        pieces = sorted((position.mailbox[sq][1], sq) for sq in iter_squares(extra[strong]))
+        spec = TABLES_BY_MATERIAL.get(tuple(piece_type for piece_type, _ in pieces))
+        if spec is None or spec.name not in self.offsets:
+            return None
+        by_type = dict(pieces)
+        squares = [position.king_square(strong), position.king_square(strong ^ 1)] + \
+            [by_type[piece_type] for piece_type in spec.piece_types]
+        if strong == BLACK:  # Tablice liczone są dla silniejszych białych
+            squares = [sq ^ 56 for sq in squares]
+        side = 0 if position.side_to_move == strong else 1
+        value = self.data[self.offsets[spec.name] + spec.index_of(side, squares)]
+        if not value:
+            return DRAW, 0
+        return (WIN if side == 0 else LOSS), value - 1
+
+    def best_move(self, position):
+        """
+        Ruch najlepszy według tablic: (ruch, wynik, półruchy do mata); None gdy pozycji nie ma w tablicach.
+        Wygrywając wybiera najkrótszą drogę do mata, przegrywając - najdłuższą.
+        """
+        if self.probe(position) is None:
+            return None
+        best, best_rank = None, None
+        for move in position.legal_moves():
+            position.make_move(move)
+            child = self.probe(position)
+            if child is None and position.is_insufficient_material():  # Np. bicie ostatniej figury
+                child = (DRAW, 0)
+            position.unmake_move()
+            if child is None:
+                continue
+            result, plies = -child[0], child[1] + 1
+            rank = (result, -plies if result == WIN else plies if result == LOSS else 0)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, result, plies if result != DRAW else 0), rank
+        return best
+
+
+_default = None
+
+
+def load_default():
+    """
+    Tablice z pliku obok modułu (wczytane raz na proces); None gdy plik nie został wygenerowany.
+    """
+    global _default
+    if _default is None and os.path.exists(DEFAULT_PATH):
+        _default = Tablebases(DEFAULT_PATH)
+    return _default
@@ -0,0 +1,31 @@
+import pytest
+
+from perft import BENCHMARK_POSITIONS, perft
+from position import Position
+
+# Pozycje z BENCHMARK_POSITIONS o jeden półruch płycej (wartości z chessprogramming.org), żeby testy trwały sekundy
+SHALLOW_NODES = {
+    'startpos': (4, 197281),
+    'kiwipete': (3, 97862),
+    'position3': (4, 43238),
+    'position4': (3, 9467),
+    'position5': (3, 62379),
+    'position6': (3, 89890),
+}
+
+
+@pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, _, _ in BENCHMARK_POSITIONS])
+def test_perft_node_counts(name, fen):
+    depth, nodes = SHALLOW_NODES[name]
+    position = Position.from_fen(fen)
+    assert perft(position, depth) == nodes
+
+
+@pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, _, _ in BENCHMARK_POSITIONS])
+def test_perft_restores_position(name, fen):
+    position = Position.from_fen(fen)
+    key = position.key
+    perft(position, 2)
+    assert position.fen() == fen
+    assert position.key == key
+    assert position.move_stack == []
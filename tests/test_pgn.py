@@ -0,0 +1,88 @@
+import io
+import random
+
+import pytest
+
+from pgn import read_games, write_game, san, parse_san, parse_file_parallel
+from position import Position
+
+OPERA_GAME = """[Event "Paris"]
+[White "Paul Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {komentarz} 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7
+8. Nc3 c6 9. Bg5 b5 (9... Qb4+ 10. Qxb4) 10. Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8
+13. Rxd7 Rxd7 14. Rd1 Qe6 15. Bxd7+ Nxd7 16. Qb8+ Nxb8 17. Rd8# 1-0
+"""
+
+# Pozycje z roszadami, biciem w przelocie i promocjami - partie losowe od nich przechodzą przez te przypadki SAN
+START_FENS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+    '4k3/1P6/8/3pP3/8/8/6p1/4K3 w - d6 0 40',
+]
+
+
+def random_game(fen, seed, plies=60):
+    rng = random.Random(seed)
+    position = Position.from_fen(fen)
+    moves = []
+    for _ in range(plies):
+        legal_moves = position.legal_moves()
+        if not legal_moves:
+            break
+        move = rng.choice(legal_moves)
+        position.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def test_opera_game():
+    game = next(read_games(io.StringIO(OPERA_GAME)))
+    assert game.headers['White'] == 'Paul Morphy'
+    assert game.result == '1-0'
+    assert len(game.san_moves) == 33  # Komentarz i wariant pominięte
+    position = game.replay()
+    assert position.checkers and not position.legal_moves()  # 17. Rd8#
+    replayed = Position.starting()
+    for text, move in zip(game.san_moves, position.move_stack):
+        assert san(replayed, move) == text
+        replayed.make_move(move)
+
+
+@pytest.mark.parametrize('fen', START_FENS)
+@pytest.mark.parametrize('seed', range(3))
+def test_write_read_round_trip(fen, seed):
+    moves = random_game(fen, seed)
+    stream = io.StringIO()
+    headers = {'Event': 'Test', 'Site': 'C:\\games\\"club"\\', 'White': 'A "quoted" name'}
+    write_game(stream, moves, headers, '1/2-1/2', Position.from_fen(fen))
+    game = next(read_games(io.StringIO(stream.getvalue())))
+    assert list(game.moves()) == moves
+    assert game.result == '1/2-1/2'
+    assert game.headers['White'] == 'A "quoted" name'
+    assert game.headers['Site'] == 'C:\\games\\"club"\\'
+    assert game.initial_position().fen() == fen
+
+
+def test_parse_san_rejects_illegal_and_ambiguous():
+    position = Position.from_fen('4k3/8/8/R7/8/8/8/R3K3 w - - 0 1')
+    with pytest.raises(ValueError):
+        parse_san(position, 'Ra3')  # Obie wieże mogą wejść na a3
+    with pytest.raises(ValueError):
+        parse_san(position, 'O-O')  # Brak praw do roszady
+    assert san(position, parse_san(position, 'R1a3')) == 'R1a3'
+
+
+def test_parse_file_parallel_matches_read_games(tmp_path):
+    path = tmp_path / 'games.pgn'
+    with open(path, 'w', encoding='utf-8') as stream:
+        for index in range(12):
+            fen = START_FENS[index % len(START_FENS)]
+            write_game(stream, random_game(fen, index), {'Event': f'Game {index}'}, '*', Position.from_fen(fen))
+    with open(path, encoding='utf-8') as stream:
+        expected = [(game.headers, list(game.moves())) for game in read_games(stream)]
+    parsed = [(headers, list(moves)) for headers, moves, _ in parse_file_parallel(str(path), workers=2, chunk_bytes=512)]
+    assert parsed == expected
@@ -0,0 +1,29 @@
+import pytest
+
+from position import Position, STARTING_FEN
+
+
+@pytest.mark.parametrize('fen', [
+    '8/8/8/8/8/8/8/Q3K3 w - - 0 1',  # Brak czarnego króla
+    '4k3/8/8/8/8/8/8/8 b - - 0 1',  # Brak białego króla
+    '4k3/8/8/8/8/8/8/K3K3 w - - 0 1',  # Dwa białe króle
+    '4kk2/8/8/8/8/8/8/4K3 w - - 0 1',  # Dwa czarne króle
+    '4k3/8/8/8/8/8/8/4R1K1 w - - 0 1',  # Czarny król szachowany, a ruch mają białe
+    '4k3/8/8/8/8/5n2/8/4K3 b - - 0 1',  # Biały król szachowany, a ruch mają czarne
+    '8/8/8/8/8/8/8/3kK3 w - - 0 1',  # Króle obok siebie
+    '4k3/8/8/8/8/8/8/4K3 x - - 0 1',
+    '4k3/8/8/8/8/8/8/4K3 w - - -1 1',
+    '4k3/8/8/8/8/8/8/4K3 w - - 0 0',
+])
+def test_from_fen_rejects_illegal_positions(fen):
+    with pytest.raises(ValueError):
+        Position.from_fen(fen)
+
+
+@pytest.mark.parametrize('fen', [
+    STARTING_FEN,
+    '4k3/8/8/8/8/8/8/4R1K1 b - - 0 1',  # Szach dla strony na posunięciu jest w porządku
+    '4k3/8/8/8/8/8/8/4K3 w - - 5 40',
+])
+def test_from_fen_accepts_legal_positions(fen):
+    assert Position.from_fen(fen).fen() == fen
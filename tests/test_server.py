@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from server import GameServer, Connection, ProtocolError
+
+
+class FakeWriter:
+    def __init__(self):
+        self.lines = []
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.lines.append(data.decode().strip())
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def new_connection():
+    return Connection(FakeWriter())
+
+
+@pytest.mark.parametrize('args', [
+    ['nan', '0', 'both'], ['inf', '0'], ['-inf', '0'], ['1e300', '0'], ['0', '0'], ['-5', '0'],
+    ['60', 'nan'], ['60', 'inf'], ['60', '-1'], ['sixty'], ['60', '0', 'red'],
+])
+def test_new_rejects_bad_arguments(args):
+    async def scenario():
+        server = GameServer()
+        with pytest.raises(ProtocolError):
+            server.dispatch(new_connection(), ['NEW'] + args)
+        assert server.games == {}
+    run(scenario())
+
+
+def test_new_both_starts_game():
+    async def scenario():
+        server, connection = GameServer(), new_connection()
+        server.dispatch(connection, ['NEW', '60', '2', 'both'])
+        assert connection.writer.lines[0] == 'GAME 1 both'
+        assert connection.writer.lines[1].startswith('START 1 60000 60000 ')
+        assert server.games[1].started
+    run(scenario())
+
+
+def test_move_validation():
+    async def scenario():
+        server, white, black = GameServer(), new_connection(), new_connection()
+        server.dispatch(white, ['NEW', '60', '0', 'white'])
+        with pytest.raises(ProtocolError, match="nie zaczęła"):
+            server.dispatch(white, ['MOVE', '1', 'e2e4'])
+        server.dispatch(black, ['JOIN', '1'])
+        with pytest.raises(ProtocolError, match="Nie ma takiej partii"):
+            server.dispatch(white, ['MOVE', '7', 'e2e4'])
+        with pytest.raises(ProtocolError, match="nie twój ruch"):
+            server.dispatch(black, ['MOVE', '1', 'e7e5'])
+        with pytest.raises(ProtocolError):
+            server.dispatch(white, ['MOVE', '1', 'e2e5'])
+        with pytest.raises(ProtocolError):
+            server.dispatch(white, ['MOVE', '1', 'Knight', 'E2', 'E4'])  # Na e2 stoi pionek
+        server.dispatch(white, ['MOVE', '1', 'Pawn', 'E2', 'E4'])
+        assert black.writer.lines[-1].startswith('MOVED 1 e2e4 ')
+        server.dispatch(black, ['MOVE', '1', 'e7e5'])
+        assert server.moves_played == 2
+    run(scenario())
+
+
+def test_resign_before_start():
+    async def scenario():
+        server, white, black = GameServer(), new_connection(), new_connection()
+        server.dispatch(white, ['NEW', '60', '0', 'white'])
+        with pytest.raises(ProtocolError, match="nie zaczęła"):
+            server.dispatch(white, ['RESIGN', '1'])
+        assert not server.games[1].game.is_over()
+        server.dispatch(black, ['JOIN', '1'])
+        server.dispatch(white, ['RESIGN', '1'])
+        assert black.writer.lines[-1] == 'OVER 1 0-1 resignation'
+        assert server.games == {}
+    run(scenario())
+
+
+def test_bad_new_keeps_connection_open():
+    async def scenario():
+        server = GameServer()
+        listener = await asyncio.start_server(server.handle_client, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'NEW 60 0 both\nNEW nan 0 both\nSTATE 1\n')
+        lines = [(await asyncio.wait_for(reader.readline(), 5)).decode().split() for _ in range(4)]
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return lines
+    lines = run(scenario())
+    assert [words[0] for words in lines] == ['GAME', 'START', 'ERROR', 'STATE']
+    assert lines[3][2] == '*'  # Partia nadal trwa - nie została poddana po błędzie
@@ -0,0 +1,93 @@
+"""
+Tablica transpozycji o stałym rozmiarze, trzymana w płaskiej tablicy 64-bitowych słów.
+
+Każdy wpis to dwa słowa: (klucz XOR dane, dane). Dzięki temu uszkodzony wpis (np. zapisany
+równolegle przez dwa procesy w pamięci współdzielonej) nie przejdzie sprawdzenia klucza.
+Wpisy zgrupowane są w kubełki po dwa: pierwszy zastępowany według głębokości i wieku,
+drugi zawsze nadpisywany.
+"""
+from array import array
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+
+ENTRY_BYTES = 16
+BUCKET_ENTRIES = 2
+SCORE_OFFSET = 1 << 15
+VALID_BIT = 1 << 48
+
+
+def table_bytes(size_mb):
+    """
+    Rozmiar tablicy w bajtach - największa potęga dwójki liczby kubełków mieszcząca się w size_mb.
+    """
+    buckets = max(1, size_mb * 1024 * 1024 // (ENTRY_BYTES * BUCKET_ENTRIES))
+    return (1 << (buckets.bit_length() - 1)) * ENTRY_BYTES * BUCKET_ENTRIES
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, buffer=None):
+        """
+        buffer pozwala umieścić tablicę w cudzej pamięci (np. multiprocessing.shared_memory);
+        musi mieć rozmiar zwrócony przez table_bytes(size_mb).
+        """
+        size = table_bytes(size_mb)
+        if buffer is None:
+            self.table = array('Q', bytes(size))
+        else:
+            self.table = memoryview(buffer)[:size].cast('Q')
+        self.bucket_mask = size // (ENTRY_BYTES * BUCKET_ENTRIES) - 1
+        self.generation = 0
+
+    def __len__(self):
+        return (self.bucket_mask + 1) * BUCKET_ENTRIES
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 63
+
+    def clear(self):
+        self.table[:] = array('Q', bytes(len(self.table) * 8))
+
+    def probe(self, key):
+        """
+        Zwraca (ruch, głębokość, rodzaj oceny, ocena) albo None gdy pozycji nie ma w tablicy.
+        """
+        table = self.table
+        index = (key & self.bucket_mask) * (2 * BUCKET_ENTRIES)
+        for slot in (index, index + 2):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                return (data & 0xFFFF, (data >> 32) & 0xFF, (data >> 40) & 3,
+                        ((data >> 16) & 0xFFFF) - SCORE_OFFSET)
+        return None
+
+    def store(self, key, move, depth, bound, score):
+        table = self.table
+        index = (key & self.bucket_mask) * (2 * BUCKET_ENTRIES)
+        generation = self.generation
+        data = move | ((score + SCORE_OFFSET) << 16) | (max(depth, 0) << 32) | (bound << 40) | \
+            (generation << 42) | VALID_BIT
+
+        for slot in (index, index + 2):
+            existing = table[slot + 1]
+            if existing and table[slot] ^ existing == key:
+                if not move:  # Nie gubimy najlepszego ruchu z wcześniejszego przeszukania tej samej pozycji
+                    data |= existing & 0xFFFF
+                break
+        else:
+            existing = table[index + 1]
+            if not existing or (existing >> 42) & 63 != generation or depth >= (existing >> 32) & 0xFF:
+                slot = index
+            else:
+                slot = index + 2
+        table[slot] = key ^ data
+        table[slot + 1] = data
+
+    def hashfull(self):
+        """
+        Zapełnienie tablicy w promilach (na podstawie pierwszego tysiąca wpisów, jak w UCI).
+        """
+        table = self.table
+        sample = min(1000, len(self))
+        used = sum(1 for entry in range(sample)
+                   if table[entry * 2 + 1] and (table[entry * 2 + 1] >> 42) & 63 == self.generation)
+        return used * 1000 // sample
@@ -0,0 +1,238 @@
+"""
+Protokół UCI: wbudowany silnik jako silnik UCI oraz wspólne funkcje dla adaptera w GUI.
+
+Uruchomiony jako program czyta komendy UCI ze standardowego wejścia, więc silnik można
+porównywać z innymi w narzędziach takich jak cutechess-cli. Wyszukiwanie działa w osobnym
+wątku - stop, ponderhit i isready są obsługiwane w trakcie liczenia. Obsługiwane są go
+(depth, nodes, movetime, wtime/btime/winc/binc/movestogo, infinite, ponder), opcje Hash i Ponder.
+
+Użycie:
+    python uci.py
+    cutechess-cli -engine cmd="python uci.py" -engine cmd=stockfish -each proto=uci tc=40/60 -games 20
+"""
+import sys
+import threading
+
+from engine import Search, SearchLimits
+from position import Position, STARTING_FEN, move_uci
+
+ENGINE_NAME = 'chess_game'
+DEFAULT_HASH_MB = 16
+INFO_INT_FIELDS = ('depth', 'seldepth', 'multipv', 'nodes', 'nps', 'hashfull', 'tbhits', 'currmovenumber')
+
+
+def parse_info(line):
+    """
+    Słownik z linii "info ..." w tym samym formacie, co Search.info (czas w sekundach, pv jako lista ruchów UCI).
+    """
+    words = line.split()
+    info = {}
+    index = 1
+    while index < len(words):
+        word = words[index]
+        if word in INFO_INT_FIELDS and index + 1 < len(words):
+            info[word] = int(words[index + 1])
+            index += 2
+        elif word == 'time' and index + 1 < len(words):
+            info['time'] = int(words[index + 1]) / 1000
+            index += 2
+        elif word == 'score' and index + 2 < len(words):
+            info['score' if words[index + 1] == 'cp' else 'mate'] = int(words[index + 2])
+            index += 3
+        elif word == 'pv':
+            info['pv'] = words[index + 1:]
+            break
+        elif word == 'string':
+            info['string'] = ' '.join(words[index + 1:])
+            break
+        else:  # currmove, lowerbound, upperbound i inne pola bez znaczenia dla GUI
+            index += 1
+    return info
+
+
+def format_info(info):
+    score = f"mate {info['mate']}" if 'mate' in info else f"cp {info['score']}"
+    return (f"info depth {info['depth']} score {score} nodes {info['nodes']} nps {info['nps']} "
+            f"time {int(info['time'] * 1000)} hashfull {info['hashfull']} pv {' '.join(info['pv'])}").rstrip()
+
+
+def go_command(limits, ponder=False, infinite=False):
+    """
+    Komenda "go" dla SearchLimits (czasy w sekundach zamieniane na ms).
+    """
+    words = ['go']
+    if ponder:
+        words.append('ponder')
+    if infinite:
+        words.append('infinite')
+    for name, value in (('wtime', limits.white_time), ('btime', limits.black_time)):
+        if value is not None:
+            words += [name, str(int(value * 1000))]
+    for name, value in (('winc', limits.white_increment), ('binc', limits.black_increment)):
+        if value:
+            words += [name, str(int(value * 1000))]
+    for name, value in (('movestogo', limits.moves_to_go), ('depth', limits.depth), ('nodes', limits.nodes)):
+        if value is not None:
+            words += [name, str(value)]
+    if limits.movetime is not None:
+        words += ['movetime', str(int(limits.movetime * 1000))]
+    return ' '.join(words)
+
+
+def parse_go(words):
+    """
+    (SearchLimits, ponder, infinite) z komendy "go ...".
+    """
+    limits = SearchLimits()
+    ponder = 'ponder' in words
+    infinite = 'infinite' in words
+    fields = {'wtime': 'white_time', 'btime': 'black_time', 'winc': 'white_increment', 'binc': 'black_increment',
+              'movetime': 'movetime'}
+    for index, word in enumerate(words[:-1]):
+        value = words[index + 1]
+        if word in fields:
+            setattr(limits, fields[word], int(value) / 1000)
+        elif word in ('depth', 'nodes', 'movestogo'):
+            setattr(limits, 'moves_to_go' if word == 'movestogo' else word, int(value))
+    return limits, ponder, infinite
+
+
+def position_command(position):
+    """
+    Komenda "position" z pozycją początkową partii i wszystkimi ruchami (silnik widzi powtórzenia).
+    """
+    root = position.copy()
+    while root.move_stack:
+        root.unmake_move()
+    fen = root.fen()
+    start = 'startpos' if fen == STARTING_FEN else f"fen {fen}"
+    moves = ' '.join(move_uci(move) for move in position.move_stack)
+    return f"position {start} moves {moves}" if moves else f"position {start}"
+
+
+def parse_position(words):
+    if len(words) > 1 and words[1] == 'fen':
+        end = words.index('moves') if 'moves' in words else len(words)
+        position = Position.from_fen(' '.join(words[2:end]))
+    else:
+        position = Position.starting()
+    if 'moves' in words:
+        for text in words[words.index('moves') + 1:]:
+            move = position.parse_uci(text)
+            if move is None:
+                raise ValueError(f"Nielegalny ruch: {text}")
+            position.make_move(move)
+    return position
+
+
+class UciSession:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.hash_mb = DEFAULT_HASH_MB
+        self.search = Search(hash_mb=self.hash_mb)
+        self.position = Position.starting()
+        self.thread = None
+        self.release = threading.Event()  # Przy go infinite / ponder bestmove dopiero po stop albo ponderhit
+        self.ponder_limits = None  # Prawdziwe limity czasu, obowiązujące od ponderhit
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def handle(self, line):
+        """
+        Wykonuje jedną komendę; zwraca False po "quit".
+        """
+        words = line.split()
+        if not words:
+            return True
+        command = words[0]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("id author chess_game")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 1024")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption' and len(words) >= 5 and words[2].lower() == 'hash':
+            self.wait()
+            self.hash_mb = int(words[4])
+            self.search = Search(hash_mb=self.hash_mb)
+        elif command == 'ucinewgame':
+            self.wait()
+            self.search = Search(hash_mb=self.hash_mb)
+        elif command == 'position':
+            self.wait()
+            try:
+                self.position = parse_position(words)
+            except ValueError as error:
+                self.send(f"info string {error}")
+        elif command == 'go':
+            self.wait()
+            self.go(*parse_go(words))
+        elif command == 'stop':
+            self.search.stop()
+            self.release.set()
+            self.wait()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            self.search.stop()
+            self.release.set()
+            self.wait()
+            return False
+        return True
+
+    def go(self, limits, ponder, infinite):
+        self.release.clear()
+        self.search.pending_limits = None  # Wątek wyszukiwania jeszcze nie działa
+        self.search.stop_event.clear()  # Przed startem wątku - stop zaraz po go nie może zginąć
+        if ponder:  # Do ponderhit liczymy bez limitu czasu
+            self.ponder_limits = limits
+            limits = SearchLimits(depth=limits.depth, nodes=limits.nodes)
+        self.thread = threading.Thread(target=self.run_search, args=(self.position.copy(), limits, ponder or infinite),
+                                       daemon=True)
+        self.thread.start()
+
+    def ponderhit(self):
+        if self.ponder_limits is not None:  # Od teraz obowiązuje czas przewidziany na ruch
+            self.search.set_limits(self.ponder_limits, self.position.side_to_move)
+            self.ponder_limits = None
+        self.release.set()
+
+    def run_search(self, position, limits, hold):
+        last_pv = []
+
+        def report(info):
+            last_pv[:] = info['pv']
+            self.send(format_info(info))
+
+        move, _ = self.search.search(position, limits, report)
+        if hold:  # Przy go infinite / ponder bestmove nie może wyprzedzić stop ani ponderhit
+            self.release.wait()
+        if not move:
+            self.send("bestmove 0000")
+        elif len(last_pv) > 1 and last_pv[0] == move_uci(move):
+            self.send(f"bestmove {move_uci(move)} ponder {last_pv[1]}")
+        else:
+            self.send(f"bestmove {move_uci(move)}")
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def main(argv=None):
+    session = UciSession()
+    for line in sys.stdin:
+        if not session.handle(line):
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())